@@ -0,0 +1,455 @@
+import argparse
+import logging
+import math
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+from adaptive_rate import AdaptiveRate
+from alarms import EVENT_CLEARED, EVENT_RAISED
+from batch_stats import BatchAverager
+from channels import ChannelRegistry, SampleStore
+from logs import LOG_FILE, configure_logging
+from metrics import Metrics
+from recorder import FORMAT_BINARY, FORMAT_CSV, RECORDINGS_DIR, SampleRecorder, export_batch_csv, new_recording_path
+from replay import ReplaySource
+from sample_filter import SMOOTHING_EMA, SMOOTHING_KALMAN
+from timebase import NS_PER_SECOND, Timebase
+
+log = logging.getLogger(__name__)
+
+ALARM_EVENTS = (EVENT_RAISED, EVENT_CLEARED)
+
+# Seconds between samples taken by the acquisition engine
+SAMPLE_INTERVAL = 1.0
+
+# Samples averaged into one plotted point
+BATCH_VALUE = 10
+
+# On-disk format of the crash-safe run recording ('bin' or 'csv')
+RECORD_FORMAT = FORMAT_BINARY
+
+# Let the signal set the sampling interval, between these bounds (seconds), instead of SAMPLE_INTERVAL
+ADAPTIVE_SAMPLING = False
+ADAPTIVE_MIN_INTERVAL = 0.25
+ADAPTIVE_MAX_INTERVAL = 4.0
+
+# Also keep every live row in the indexed time-series store (series_store.py) next to the
+# recordings. Off unless asked for, like publishing: the store keeps a week of raw rows on disk
+STORE_SERIES = False
+
+# How often the daemon drains queued samples (seconds)
+DRAIN_INTERVAL = 0.1
+
+# Seconds between metrics dumps when the daemon is given --metrics
+METRICS_INTERVAL = 10.0
+
+
+class AcquisitionCore:
+    # Everything a logging station does except drawing: one engine per logger, alignment onto
+    # a common time grid, batch statistics and the crash-safe recording. The Qt window and the
+    # headless daemon below both drive one of these; neither touches the ports directly.
+
+    def __init__(self, interval=SAMPLE_INTERVAL, batch_value=BATCH_VALUE, record_format=RECORD_FORMAT,
+                 recordings_dir=RECORDINGS_DIR, calibration_file=None, smoothing=None,
+                 adaptive=ADAPTIVE_SAMPLING, min_interval=ADAPTIVE_MIN_INTERVAL, max_interval=ADAPTIVE_MAX_INTERVAL,
+                 store_series=STORE_SERIES, alarms_file=None):
+        self.interval = interval
+        self.batch_value = batch_value
+        self.record_format = record_format
+        self.recordings_dir = recordings_dir
+        self.calibration_file = calibration_file  # None: calibration.CALIBRATION_FILE
+        self.calibration = None  # Loaded on the first attach; hot-reloaded by the engines
+        self.alarms_file = alarms_file  # None: alarms.ALARMS_FILE
+        self.alarms = None  # Alarm rules, loaded and reloaded like the calibration
+        # Called on the engine threads the moment an alarm is raised or cleared, whatever the
+        # front end is doing: listener(channel name, stamp, kind, fields)
+        self.alarm_listeners = []
+        self.smoothing = smoothing  # sample_filter.SMOOTHING_* applied to every channel
+        self.adaptive = adaptive
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.store_series = store_series
+        self.scheduler = None  # AdaptiveRate shared by the engines while adaptive sampling runs
+        self.events = []  # Events recorded since the front end last took them, see take_events
+        # Latencies and counters of the whole pipeline; cheap enough to be always on
+        self.metrics = Metrics()
+        self.batch_latency = self.metrics.histogram('batch_averaging_seconds', "Adding one row to the batch statistics")
+
+        self.registry = None  # One acquisition engine per logger, alive from connection until stop
+        self.store = None  # Aligns the channels onto one time grid
+        self.channel_names = []
+        self.recorder = None  # Streams every raw sample row to disk
+        self.series = None  # Keeps every live row with 1 s / 1 min / 1 h rollups, across runs
+        self.replay = None  # Plays a recorded run back through the same pipeline
+        self.publisher = None  # Streams live rows to remote subscribers, see start_publisher
+        self.timebase = None  # Maps the monotonic ns stamps of the run to wall-clock time
+        self.start_ns = None  # Stamp of the start of the run, elapsed times count from here
+        self.start_time = None  # The same instant on the wall clock
+        self.reset_data()
+
+    def reset_data(self):
+        channel_count = max(len(self.channel_names), 1)
+        self.batches = BatchAverager(self.batch_value, channel_count)
+        self.plot_data = []  # One (elapsed seconds, [running mean per channel]) per batch
+
+    def attach(self, found_ports):
+        # Take over the open connections from discovery. Returns True when the set of channels
+        # changed, i.e. earlier data no longer lines up with the new rows.
+        if self.calibration is None:
+            # numpy is only needed once loggers are attached, not to show the window
+            from calibration import CALIBRATION_FILE, CalibrationSet
+            self.calibration = CalibrationSet(self.calibration_file or CALIBRATION_FILE)
+        if self.alarms is None:
+            from alarms import ALARMS_FILE, AlarmSet
+            self.alarms = AlarmSet(self.alarms_file or ALARMS_FILE)
+        self.scheduler = AdaptiveRate(self.min_interval, self.max_interval) if self.adaptive else None
+        self.registry = ChannelRegistry(interval=self.interval, calibration=self.calibration, smoothing=self.smoothing,
+                                        scheduler=self.scheduler, metrics=self.metrics, alarms=self.alarms,
+                                        alarm_listener=self.notify_alarm)
+        for found in found_ports:
+            # The engine reopens the same logger by itself if the port fails
+            self.registry.add_device(found.device, found.connection, found.port_info.serial_number, found.reopen)
+
+        changed = self.registry.names() != self.channel_names
+        if changed:
+            for name in set(self.channel_names) - set(self.registry.names()):
+                self.metrics.remove(channel=name)
+            self.channel_names = self.registry.names()
+            self.reset_data()
+        if self.timebase is None:
+            self.timebase = Timebase()
+            self.start_ns = self.timebase.monotonic_ns
+            self.start_time = self.timebase.wall_datetime(self.start_ns)
+        if self.recorder is None or self.recorder.channel_names != self.channel_names:
+            self.start_recording()
+            if self.publisher is not None:
+                self.publisher.set_channels(self.channel_names, self.start_time)
+        if self.store_series and self.series is None:
+            self.start_series()
+        if self.series is not None:
+            self.series.set_channels(self.registry.keys(), self.channel_names)
+        if self.scheduler is not None:
+            # Rows are aligned on the finest grid the engines can tick on, from the same instant;
+            # the engines stamp each sample with its grid point. A row waits for a channel that
+            # is still reading for up to two of the slowest intervals, not two of the finest.
+            origin = time.monotonic_ns()
+            self.scheduler.origin = origin / NS_PER_SECOND
+            self.store = SampleStore(len(self.registry), interval=self.min_interval, max_delay=2 * self.max_interval,
+                                     origin=origin)
+            self.record_event(origin, 'rate', interval=self.scheduler.interval, reason="start")
+        else:
+            self.store = SampleStore(len(self.registry), interval=self.interval)
+        return changed
+
+    def start(self):
+        # The engines own the ports from here until stop()
+        self.registry.start_all()
+
+    def start_recording(self):
+        if self.recorder is not None:
+            self.recorder.stop()
+        path = new_recording_path(datetime.now(), self.record_format, self.recordings_dir)
+        self.recorder = SampleRecorder(path, self.channel_names, self.start_time, record_format=self.record_format,
+                                       timebase=self.timebase)
+        self.recorder.instrument(self.metrics)
+        self.recorder.start()
+        return self.recorder.path  # With a suffix if a run of the same second has the name
+
+    def start_series(self):
+        # sqlite3 is only needed once loggers are attached, not to show the window
+        import sqlite3
+        from series_store import SERIES_FILE_NAME, SeriesStore
+        path = os.path.join(self.recordings_dir, SERIES_FILE_NAME)
+        try:
+            series = SeriesStore(path).start()
+        except sqlite3.Error as e:
+            log.warning(f"Time-series store {path} not available: {e}")
+            return None
+        series.instrument(self.metrics)
+        self.series = series
+        return series
+
+    def start_publisher(self, host='127.0.0.1', port=8765):
+        # Serve the live rows and events to remote subscribers (see publisher.py); replayed
+        # runs are not published. Only this machine unless `host` says otherwise, e.g. 0.0.0.0.
+        # asyncio is only needed once something is published, not to show the window
+        from publisher import SamplePublisher
+        publisher = SamplePublisher(self.channel_names, self.start_time or datetime.now(), host, port).start()
+        publisher.instrument(self.metrics)
+        self.publisher = publisher
+        return publisher
+
+    def start_replay(self, path, speed=1.0, offset=0.0):
+        # Play a recording through the same pipeline. Replayed rows are not recorded again;
+        # the next live run starts a fresh recording.
+        if self.replay is not None:
+            self.stop_replay()
+        replay = ReplaySource(path, speed=speed)
+        if offset:
+            replay.seek(datetime.fromtimestamp(replay.start_time.timestamp() + offset))
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
+        self.replay = replay
+        self.timebase = replay.timebase
+        self.start_ns = replay.timebase.monotonic_ns
+        self.start_time = replay.start_time
+        self.channel_names = list(replay.channel_names)
+        self.reset_data()
+        replay.start()
+        return replay
+
+    def stop_replay(self):
+        if self.replay is not None:
+            self.replay.stop()
+            self.replay = None
+            # The replayed run's time base and rows mean nothing to the next live run, even
+            # when its loggers get the same channel names
+            self.timebase = self.start_ns = self.start_time = None
+            self.channel_names = []
+            self.reset_data()
+
+    def poll(self):
+        # Consume whatever the engines (or the replay) have produced so far, without blocking.
+        # Returns the processed rows, see process_row.
+        if self.replay is not None:
+            rows = self.replay.drain()
+        elif self.registry is not None:
+            for channel, timestamp, value in self.registry.drain():
+                self.store.add(channel, timestamp, value)
+            for name, timestamp, kind, fields in self.registry.drain_events():
+                # Alarms were published as they were raised, see notify_alarm
+                self.record_event(timestamp, kind, publish=kind not in ALARM_EVENTS, channel=name, **fields)
+            rows = self.store.pop_ready()
+            if self.scheduler is not None:
+                for timestamp, interval, reason in self.scheduler.drain_changes():
+                    self.record_event(timestamp, 'rate', interval=interval, reason=reason)
+        else:
+            return []
+        processed = [self.process_row(timestamp, temperatures) for timestamp, temperatures in rows]
+        self.publish(processed)
+        return processed
+
+    def publish(self, processed):
+        # Hand live rows to the publisher; it encodes and sends them on its own thread
+        if self.publisher is not None and self.replay is None and processed:
+            self.publisher.publish([(self.timebase.wall_time(row[0]), row[1]) for row in processed])
+
+    def notify_alarm(self, name, timestamp, kind, fields):
+        # On the engine thread of channel `name`, as the alarm is raised or cleared
+        if self.publisher is not None and self.replay is None:
+            self.publisher.publish_event(dict(time=self.timebase.wall_time(timestamp), kind=kind, channel=name, **fields))
+        for listener in list(self.alarm_listeners):
+            try:
+                listener(name, timestamp, kind, fields)
+            except Exception as e:
+                log.exception(f"Alarm listener failed: {e}")
+
+    def record_event(self, timestamp, kind, publish=True, **fields):
+        # Written next to the samples of the run, and kept for the front end to show
+        if self.recorder is not None:
+            self.recorder.record_event(timestamp, kind, **fields)
+        if publish and self.publisher is not None and self.replay is None:
+            self.publisher.publish_event(dict(time=self.timebase.wall_time(timestamp), kind=kind, **fields))
+        self.events.append((timestamp, kind, fields))
+
+    def take_events(self):
+        events, self.events = self.events, []
+        return events
+
+    def process_row(self, timestamp, calibrated_temps):
+        # Rows arrive calibrated: the engines apply the calibration file to every raw reading
+
+        # Raw rows are kept by the recording, not in memory
+        if self.recorder is not None:
+            self.recorder.record(timestamp, calibrated_temps)
+        if self.series is not None and self.replay is None:
+            self.series.record(self.timebase.wall_time(timestamp), calibrated_temps)
+
+        # Determine sample time in seconds since start, from the stamps taken on arrival
+        elapsed_time = (timestamp - self.start_ns) / NS_PER_SECOND
+
+        # Update the running statistics of the current batch in O(1), per channel
+        batch_start = time.perf_counter_ns()
+        batch_index, batch_stats = self.batches.add(calibrated_temps)
+        running_avg_temps = [stats.mean for stats in batch_stats]
+        self.batch_latency.observe(time.perf_counter_ns() - batch_start)
+
+        # Ensure there's a plot data point for each batch, including the current incomplete one
+        if len(self.plot_data) <= batch_index:
+            self.plot_data.append((elapsed_time, running_avg_temps))
+        else:
+            self.plot_data[batch_index] = (elapsed_time, running_avg_temps)
+        return timestamp, calibrated_temps, batch_index, elapsed_time, running_avg_temps
+
+    def stop(self):
+        # Stop the engines and return the rows acquired before the stop, including rows still
+        # waiting for a slow channel
+        if self.registry is None:
+            return []
+        self.registry.stop_all()
+        processed = self.poll()
+        tail = [self.process_row(timestamp, temperatures) for timestamp, temperatures in self.store.pop_ready(now=math.inf)]
+        self.publish(tail)
+        return processed + tail
+
+    def link_summaries(self):
+        if self.registry is None:
+            return []
+        return [(channel.name, f"{channel.engine.link_summary()}; {channel.engine.filter.summary()}")
+                for channel in self.registry.channels]
+
+    def stats_line(self):
+        return self.metrics.stats_line()
+
+    def write_metrics(self, path):
+        # Prometheus text for *.prom, JSON otherwise
+        self.metrics.write(path)
+
+    def open_channels(self):
+        # Names of the channels whose thermocouple is currently reported open
+        if self.registry is None:
+            return []
+        return [channel.name for channel in self.registry.channels if channel.engine.filter.open_thermocouple]
+
+    def release(self):
+        # Forget the stopped engines; the recording and the data stay for the next start
+        self.registry = None
+
+    def export_csv(self, out_path):
+        # Everything is already on disk; make sure the tail is written, then export from the file
+        if self.recorder is None:
+            return None
+        self.recorder.flush()
+        return export_batch_csv(self.recorder.path, out_path, self.batch_value, self.start_time)
+
+    def close(self):
+        self.stop()
+        self.release()
+        self.stop_replay()
+        if self.recorder is not None:
+            self.recorder.stop()
+        if self.series is not None:
+            self.series.stop()
+            self.series = None
+        if self.publisher is not None:
+            self.publisher.stop()
+            self.publisher = None
+
+
+def open_ports(devices, baud_rate, timeout):
+    # Probe explicitly named ports (e.g. /dev/ttyACM0) instead of scanning every port
+    from serial.tools.list_ports_common import ListPortInfo
+    from port_discovery import probe_port
+
+    found = []
+    for device in devices:
+        result = probe_port(ListPortInfo(device), baud_rate, timeout)
+        if result is None:
+            log.warning(f"No logger answered on {device}")
+        else:
+            found.append(result)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless temperature logger: acquire, record and export without a GUI")
+    parser.add_argument('--port', action='append', default=[], help="serial port to use (repeatable); default: scan all")
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--timeout', type=float, default=5.0, help="seconds to wait for each logger to answer")
+    parser.add_argument('--interval', type=float, default=SAMPLE_INTERVAL, help="seconds between samples")
+    parser.add_argument('--batch', type=int, default=BATCH_VALUE, help="samples averaged into one exported point")
+    parser.add_argument('--format', choices=[FORMAT_BINARY, FORMAT_CSV], default=RECORD_FORMAT, help="recording format")
+    parser.add_argument('--dir', default=RECORDINGS_DIR, help="directory for recordings")
+    parser.add_argument('--calibration', help="calibration file (default ~/.temperature_daq_calibration.json)")
+    parser.add_argument('--alarms', help="alarm rules file (default ~/.temperature_daq_alarms.json)")
+    parser.add_argument('--smoothing', choices=[SMOOTHING_EMA, SMOOTHING_KALMAN], help="smooth every channel")
+    parser.add_argument('--adaptive', action='store_true', help="let the signal set the sampling rate")
+    parser.add_argument('--min-interval', type=float, default=ADAPTIVE_MIN_INTERVAL, help="fastest adaptive interval")
+    parser.add_argument('--max-interval', type=float, default=ADAPTIVE_MAX_INTERVAL, help="slowest adaptive interval")
+    parser.add_argument('--csv', help="export the batch averages to this CSV file on exit")
+    parser.add_argument('--status-every', type=float, default=10.0, help="seconds between status lines, 0 for none")
+    parser.add_argument('--stats-every', type=float, default=60.0,
+                        help="seconds between pipeline latency lines, 0 for none")
+    parser.add_argument('--series', action='store_true', help="also keep rows in the time-series store")
+    parser.add_argument('--serve', metavar='[HOST:]PORT', help="publish live rows to subscribers on this TCP port, on 127.0.0.1 unless HOST "
+                             "is given (0.0.0.0 for every interface)")
+    parser.add_argument('--metrics', help="keep pipeline metrics in this file (Prometheus text if *.prom, else JSON)")
+    parser.add_argument('--log-file', default=LOG_FILE, help="rotating log file, '' for none")
+    parser.add_argument('--duration', type=float, default=0.0, help="stop after this many seconds, 0 to run until stopped")
+    args = parser.parse_args()
+    configure_logging(args.log_file or None)
+
+    if args.port:
+        found = open_ports(args.port, args.baud, args.timeout)
+    else:
+        from port_discovery import discover_ports
+        found = discover_ports(args.baud, args.timeout)
+    if not found:
+        print("No logger found")
+        return 1
+
+    core = AcquisitionCore(interval=args.interval, batch_value=args.batch, record_format=args.format,
+                           recordings_dir=args.dir, calibration_file=args.calibration,
+                           smoothing=args.smoothing, adaptive=args.adaptive, min_interval=args.min_interval,
+                           max_interval=args.max_interval, store_series=args.series,
+                           alarms_file=args.alarms)
+    core.attach(found)
+    if args.serve:
+        host, _, port = args.serve.rpartition(':')
+        core.start_publisher(host or '127.0.0.1', int(port))
+        print(f"Publishing live rows on {core.publisher.host}:{core.publisher.port}", flush=True)
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+    core.start()
+    print(f"Acquiring {', '.join(f'{channel.name}={channel.device}' for channel in core.registry.channels)}, "
+          f"recording to {core.recorder.path}", flush=True)
+
+    started = time.monotonic()
+    next_status = started + args.status_every
+    next_stats = started + args.stats_every
+    next_metrics = started
+    last = None
+    while not stopping.wait(DRAIN_INTERVAL):
+        processed = core.poll()
+        if processed:
+            last = processed[-1]
+        for timestamp, kind, fields in core.take_events():
+            when = core.timebase.wall_datetime(timestamp)
+            print(f"{when:%H:%M:%S} {kind}: " + ", ".join(f"{key} {value}" for key, value in fields.items()),
+                  flush=True)
+        now = time.monotonic()
+        if args.status_every and now >= next_status and last is not None:
+            when, temperatures = core.timebase.wall_datetime(last[0]), last[1]
+            print(f"{when:%H:%M:%S} " + "  ".join(f"{name}: {value:.2f}" for name, value in
+                                                  zip(core.channel_names, temperatures)), flush=True)
+            next_status += args.status_every
+        if args.stats_every and now >= next_stats:
+            print(f"stats: {core.stats_line()}", flush=True)
+            next_stats += args.stats_every
+        if args.metrics and now >= next_metrics:
+            core.write_metrics(args.metrics)
+            next_metrics += METRICS_INTERVAL
+        if args.duration and now - started >= args.duration:
+            break
+
+    core.stop()
+    for name, summary in core.link_summaries():
+        print(f"{name}: {summary}")
+    print(f"stats: {core.stats_line()}")
+    if args.metrics:
+        core.write_metrics(args.metrics)
+    if args.csv:
+        points = core.export_csv(args.csv)
+        print(f"Exported {points} points to {args.csv}")
+    core.close()
+    print(f"Recorded {core.recorder.rows_written} rows to {core.recorder.path}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
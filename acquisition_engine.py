@@ -0,0 +1,390 @@
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+from alarms import EVENT_CLEARED, EVENT_RAISED, AlarmTable
+from protocol import MIN_BATCH, MODE_BATCH, SampleProtocol, fresh_readings
+from metrics import COUNTER, GAUGE
+from sample_filter import SampleFilter
+from serial_reader import FrameReader
+from timebase import NS_PER_SECOND, ClockDrift
+
+log = logging.getLogger(__name__)
+
+# Waits between attempts to reopen a lost port: doubling from the first to the last
+RECONNECT_MIN_DELAY = 0.2
+RECONNECT_MAX_DELAY = 2.0
+
+
+class AcquisitionEngine:
+    # One long-lived reader that owns the serial port for the whole measurement.
+    # Samples are pushed as (timestamp, value) into a bounded queue; the GUI only drains it.
+    # The timestamp is time.monotonic_ns() of the frame that completed the sample, as the
+    # reader saw it arrive, so however late the GUI drains, the time axis is the link's. With a
+    # shared AdaptiveRate it is the grid point the sample was read for instead, see _run.
+    # When the port fails (cable blip, board reset by re-enumeration) and `reopen` is given,
+    # the engine reconnects by itself; see _reconnect. Alarms are evaluated here too, on
+    # every sample before it is queued, so they never wait for the front end.
+
+    def __init__(self, serial_conn, interval=1.0, iterations=2, max_queue=1000, batch_size=10, window=1,
+                 calibration=None, calibration_keys=(), sample_filter=None, scheduler=None,
+                 clock_probe_interval=10.0, device=None, reopen=None, alarms=None, on_alarm=None):
+        self.serial_conn = serial_conn
+        self.device = device  # Port name, for messages
+        self.reopen = reopen  # reopen(cancel_event) -> the same logger's port opened again, or None
+        self.interval = interval  # Seconds between samples
+        self.iterations = iterations  # Readings averaged into one sample
+        self.calibration = calibration  # CalibrationSet applied to every raw reading, or None for raw values
+        self.calibration_keys = calibration_keys  # Names this device may be listed under in the calibration file
+        self.alarms = alarms  # Shared AlarmSet, looked up by calibration_keys too; None for no alarms
+        self.on_alarm = on_alarm  # on_alarm(stamp, kind, fields), on this thread, as an alarm is raised or cleared
+        self.alarm_table = None  # This device's rules of `alarms`, compiled; rebuilt when the file changes
+        self.filter = sample_filter or SampleFilter()  # Outlier rejection and optional smoothing
+        self.scheduler = scheduler  # Shared AdaptiveRate setting the interval, or None for a fixed interval
+        self.clock_probe_interval = clock_probe_interval  # Seconds between device clock probes
+        self.clock = ClockDrift()  # Device clock against the host's, if the firmware has one
+        self.samples = queue.Queue(maxsize=max_queue)
+        self.serial_lock = threading.Lock()
+        self.reader = FrameReader(serial_conn)
+        self.protocol = SampleProtocol(serial_conn, self.reader, batch_size=batch_size, window=window)
+
+        self.dropped_samples = 0  # Samples discarded because the queue was full
+        self.missed_ticks = 0  # Ticks skipped because a read took longer than the interval
+        self.read_durations = deque(maxlen=10000)  # Seconds per request/response cycle, most recent last
+        self.averaging_latency = None  # Histogram of filter + calibration + mean per sample, see instrument
+        self.reconnect_latency = None  # Histogram of port lost until it answered again, see instrument
+        self.alarm_latency = None  # Histogram of frame received until its alarm was raised, see instrument
+        self.alarms_raised = 0
+        self.failed_clock_probes = 0  # "*T#" probes that went unanswered or could not be sent
+        self.outages = deque(maxlen=1000)  # (ns lost, ns answering again, reopen attempts) per reconnect
+        self.events = deque()  # (monotonic ns, kind, fields) of link and alarm events not yet taken, see drain_events
+        self._link_error = None  # Error of the last failed port operation, until handled
+        self._alarm_generation = None  # AlarmSet.generation the table was compiled from
+
+        self._stop_event = threading.Event()
+        self._paused = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._paused.clear()
+        self._thread = threading.Thread(target=self._run, name="AcquisitionEngine", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self.serial_lock:
+            self._close_port()
+
+    def pause(self):
+        self._paused.set()
+
+    def resume(self):
+        self._paused.clear()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_paused(self):
+        return self._paused.is_set()
+
+    def drain(self, max_items=None):
+        # Return every queued sample without blocking
+        items = []
+        while max_items is None or len(items) < max_items:
+            try:
+                items.append(self.samples.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def drain_events(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+    def instrument(self, metrics, **labels):
+        # Report into a metrics.Metrics; the counters this engine keeps anyway are read on demand
+        self.protocol.round_trip = metrics.histogram(
+            'serial_round_trip_seconds', "Request written until its answer frame arrived", **labels)
+        self.protocol.parse_latency = metrics.histogram(
+            'parse_seconds', "Parsing one answer frame into readings", **labels)
+        self.averaging_latency = metrics.histogram(
+            'sample_averaging_seconds', "Filtering, calibrating and averaging the readings of one sample", **labels)
+        self.reconnect_latency = metrics.histogram(
+            'reconnect_seconds', "Port lost until the reopened logger answered", **labels)
+        self.alarm_latency = metrics.histogram(
+            'alarm_seconds', "Frame received until the alarm it set off was raised", **labels)
+        metrics.callback('alarms_total', COUNTER, "Alarms raised", lambda: self.alarms_raised, **labels)
+        metrics.callback('queue_depth', GAUGE, "Samples waiting for the front end", self.samples.qsize, **labels)
+        metrics.callback('missed_ticks_total', COUNTER, "Ticks skipped because a read overran the interval",
+                         lambda: self.missed_ticks, **labels)
+        metrics.callback('failed_clock_probes_total', COUNTER, "Device clock probes that got no answer",
+                         lambda: self.failed_clock_probes, **labels)
+        metrics.callback('dropped_samples_total', COUNTER, "Samples dropped because the queue was full",
+                         lambda: self.dropped_samples, **labels)
+        metrics.callback('lost_requests_total', COUNTER, "Requests that were never answered",
+                         lambda: self.protocol.lost_requests, **labels)
+        metrics.callback('rejected_readings_total', COUNTER, "Readings dropped as outliers, open or invalid",
+                         self.filter.rejected, **labels)
+        metrics.callback('frame_cpu_seconds_total', COUNTER, "CPU time spent reading and splitting frames",
+                         lambda: self.reader.cpu_time, **labels)
+        metrics.callback('reconnects_total', COUNTER, "Times the port was lost and reopened",
+                         lambda: len(self.outages), **labels)
+
+    def _run(self):
+        self.negotiate()
+
+        # Schedule against absolute deadlines so the cadence does not drift with read time
+        next_tick = self._first_tick()
+        next_probe = time.monotonic()
+        while not self._stop_event.is_set():
+            if not self._paused.is_set():
+                tick_ns = round(next_tick * NS_PER_SECOND)
+                read_start = time.monotonic()
+                value = self.read_data_average(self.readings_per_sample())
+                self.read_durations.append(time.monotonic() - read_start)
+                if self._link_error is not None:
+                    if self.reopen is None:
+                        # Nothing to reopen the port with: stop rather than keep reading a dead port
+                        self._link_lost()
+                        log.error(f"{self.device}: connection lost, acquisition stopped")
+                        break
+                    if not self._reconnect():
+                        break
+                    next_tick = self._first_tick()
+                    next_probe = time.monotonic()
+                    continue
+                self._link_error = None
+                # No frame at all (timeout, error): the sample is as old as the give-up
+                stamp = self.protocol.last_sample_ns or time.monotonic_ns()
+                if self.alarms is not None:
+                    self.check_alarms(stamp, value)
+                if self.scheduler is not None:
+                    # A read can outlast half the finest interval, so the arrival would round to
+                    # another grid point than the other channels' samples of the same tick
+                    self._push((tick_ns, value))
+                    self.scheduler.update(self, stamp / NS_PER_SECOND, value)
+                else:
+                    self._push((stamp, value))
+                if self.protocol.clock_supported and time.monotonic() >= next_probe:
+                    self.probe_clock()
+                    next_probe = time.monotonic() + self.clock_probe_interval
+
+            if self.scheduler is not None:
+                # Every engine waits for the same grid point, so the channels stay aligned
+                now = time.monotonic()
+                tick = self.scheduler.next_tick(now)
+                if now - next_tick > self.scheduler.interval:
+                    self.missed_ticks += 1
+                next_tick = tick
+                self._stop_event.wait(tick - now)
+                continue
+
+            if self.interval <= 0:
+                # Free-running: read as fast as the link allows
+                if self._paused.is_set():
+                    self._stop_event.wait(0.05)
+                continue
+
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Skip the ticks we could not serve instead of bursting to catch up
+                missed = int(-delay // self.interval) + 1
+                self.missed_ticks += missed
+                next_tick += missed * self.interval
+                delay = next_tick - time.monotonic()
+            self._stop_event.wait(max(delay, 0))
+
+    def _first_tick(self):
+        # Read at once; on the adaptive grid the sample still belongs to the last grid point
+        now = time.monotonic()
+        return self.scheduler.last_tick(now) if self.scheduler is not None else now
+
+    def _push(self, sample):
+        try:
+            self.samples.put_nowait(sample)
+        except queue.Full:
+            # Drop the oldest sample so the newest reading is always kept
+            try:
+                self.samples.get_nowait()
+                self.dropped_samples += 1
+            except queue.Empty:
+                pass
+            self.samples.put_nowait(sample)
+
+    def negotiate(self, keep_counters=False):
+        with self.serial_lock:
+            try:
+                mode = self.protocol.negotiate(keep_counters)
+            except OSError as e:  # serial.SerialException included
+                self._link_failed(e)
+                return self.protocol.mode
+        if mode == MODE_BATCH:
+            log.info(f"Firmware supports batch frames ({self.protocol.batch_size} samples per frame)")
+        else:
+            log.info("Firmware does not answer batch requests, using *S# requests")
+        return mode
+
+    def probe_clock(self):
+        # A failed probe only costs this clock point: if the port is really gone, the next
+        # sample read finds out and reconnects
+        with self.serial_lock:
+            try:
+                probe = self.protocol.probe_clock()
+            except OSError as e:
+                log.info(f"{self.device}: clock probe failed: {e}")
+                probe = None
+        if probe is None:
+            self.failed_clock_probes += 1
+            return None
+        self.clock.add(*probe)
+        return probe
+
+    def readings_per_sample(self):
+        # `iterations`, but no more than the MAX6675 converts afresh in one interval: the
+        # firmware would only make the sample late waiting for them
+        interval = self.scheduler.interval if self.scheduler is not None else self.interval
+        if interval <= 0:
+            return self.iterations
+        return min(self.iterations, fresh_readings(interval))
+
+    def read_data_average(self, iterations=2):
+        with self.serial_lock:
+            try:
+                readings = self.protocol.request_samples(iterations)
+            except OSError as e:
+                self._link_failed(e)
+                return math.nan
+            except Exception as e:
+                log.exception(f"An unexpected error occurred: {e}")
+                return math.nan
+
+        # NaN, not 0, when nothing valid arrived: the averages and the plot skip NaN
+        averaging_start = time.perf_counter_ns()
+        readings = self.filter.filter(readings)
+        if not readings:
+            return math.nan
+        if self.calibration is not None:
+            # Calibrate each raw reading before averaging, in this thread, as one block
+            value = float(self.calibration.apply(self.calibration_keys, readings).mean())
+        else:
+            value = sum(readings) / len(readings)
+        value = self.filter.smooth(value)
+        if self.averaging_latency is not None:
+            self.averaging_latency.observe(time.perf_counter_ns() - averaging_start)
+        return value
+
+    def check_alarms(self, stamp, value):
+        # Evaluate the compiled rules on one sample; transitions are handed to on_alarm at
+        # once, queued as events for the recording and the front end, and logged
+        self.alarms.reload_if_changed()
+        if self._alarm_generation != self.alarms.generation:
+            self._alarm_generation = self.alarms.generation
+            self.alarm_table = AlarmTable(self.alarms.rules_for(self.calibration_keys), self.alarm_table)
+        for rule, raised, signal in self.alarm_table.evaluate(stamp, value, self.filter.open_thermocouple):
+            if self.alarm_latency is not None:
+                self.alarm_latency.observe(time.monotonic_ns() - stamp)
+            kind = EVENT_RAISED if raised else EVENT_CLEARED
+            fields = {'alarm': rule.name, 'rule': rule.kind, 'limit': rule.limit,
+                      'value': None if math.isnan(signal) else round(signal, 3)}
+            if raised:
+                self.alarms_raised += 1
+            if self.on_alarm is not None:
+                self.on_alarm(stamp, kind, fields)
+            self.events.append((stamp, kind, fields))
+            if raised:
+                log.warning(f"{self.device}: alarm {rule.name} ({fields['value']})")
+            else:
+                log.info(f"{self.device}: alarm {rule.name} cleared ({fields['value']})")
+
+    def _link_failed(self, error):
+        log.warning(f"Serial communication error: {error}")
+        self._link_error = error
+
+    def _close_port(self):
+        self.reader.close()
+        try:
+            if self.serial_conn and self.serial_conn.is_open:
+                self.serial_conn.close()
+        except OSError:
+            pass  # Closing a port that is already gone
+
+    def _link_lost(self):
+        # Queued samples stay queued; a NaN sample where the link was lost breaks the line,
+        # and the 'disconnected' event marks the gap. Returns when that was, in monotonic ns.
+        lost = time.monotonic_ns()
+        error, self._link_error = self._link_error, None
+        self._push((lost, math.nan))
+        self.events.append((lost, 'disconnected', {'error': str(error)}))
+        with self.serial_lock:
+            self._close_port()
+        return lost
+
+    def _reconnect(self):
+        # The port failed: close it and reopen the same logger, waiting RECONNECT_MIN_DELAY
+        # and then twice as long after every failed attempt, up to RECONNECT_MAX_DELAY.
+        # The 'reconnected' event closes the gap _link_lost opened. False when stopped.
+        lost = self._link_lost()
+        log.warning(f"{self.device}: connection lost, reconnecting")
+
+        delay = RECONNECT_MIN_DELAY
+        attempts = 0
+        connection = None
+        while connection is None:
+            if self._stop_event.wait(delay):
+                return False
+            attempts += 1
+            try:
+                connection = self.reopen(self._stop_event)
+            except OSError as e:
+                log.info(f"{self.device}: reconnect attempt {attempts} failed: {e}")
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+        with self.serial_lock:
+            if self._stop_event.is_set():
+                connection.close()
+                return False
+            self.serial_conn = connection
+            self.protocol.serial_conn = connection
+            self.reader.attach(connection)
+        # The board may have been reset or even swapped: ask again what it speaks
+        self.negotiate(keep_counters=True)
+        self.clock.restart()
+        answering = time.monotonic_ns()
+        self.outages.append((lost, answering, attempts))
+        if self.reconnect_latency is not None:
+            self.reconnect_latency.observe(answering - lost)
+        gap = (answering - lost) / NS_PER_SECOND
+        self.events.append((answering, 'reconnected', {'gap': round(gap, 3), 'attempts': attempts}))
+        log.warning(f"{self.device}: reconnected after {gap:.2f} s ({attempts} attempts)")
+        return True
+
+    def link_summary(self):
+        # Bytes on the wire per reading, against what plain "*S#" round trips would cost
+        used = self.protocol.bytes_per_sample()
+        legacy = self.protocol.legacy_bytes_per_sample()
+        if not used:
+            return f"{self.protocol.mode} mode: no samples yet"
+        saving = (1 - used / legacy) * 100 if legacy else 0.0
+        summary = (f"{self.protocol.mode} mode: {used:.1f} bytes/sample "
+                   f"(legacy {legacy:.1f}, saving {saving:.0f}%)")
+        if self.protocol.mode == MODE_BATCH and self.readings_per_sample() < MIN_BATCH:
+            summary = (f"batch mode: {used:.1f} bytes/sample as \"*S#\" "
+                       f"(batch frames only pay from {MIN_BATCH} readings per sample)")
+        if self.protocol.clock_supported:
+            summary += f"; {self.clock.summary()}"
+        if self.outages:
+            longest = max(answering - lost for lost, answering, _ in self.outages) / NS_PER_SECOND
+            summary += f"; {len(self.outages)} reconnects, longest gap {longest:.2f} s"
+        return summary
@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class AdaptiveRate:
+    # Sampling interval shared by all engines of a station, following how fast the signal moves.
+    # Every channel fits a line through its recent samples (the last `window` seconds, and at
+    # least six intervals); a slope above `slope_threshold` (units/s) that stands out of the
+    # noise, a residual variance above `variance_threshold` (units^2) or a step of more than
+    # `jump_threshold` between two samples drops the interval straight to `min_interval`.
+    # After `calm_period` seconds with none of the three, the interval doubles, up to
+    # `max_interval`. Intervals are min_interval * 2^k and ticks sit on one grid from
+    # `origin`, so all channels sample at the same instants.
+
+    def __init__(self, min_interval=0.25, max_interval=4.0, slope_threshold=0.1, variance_threshold=1.0,
+                 jump_threshold=2.0, window=8.0, calm_period=10.0, origin=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.slope_threshold = slope_threshold
+        self.variance_threshold = variance_threshold
+        self.jump_threshold = jump_threshold  # Units between consecutive samples
+        self.window = window
+        self.calm_period = calm_period
+        self.origin = origin  # Monotonic time of grid point 0, set on the first tick if None
+
+        self.interval = max_interval  # Start slow; the first movement speeds it up
+        self.changes = deque()  # (monotonic ns, new interval, reason) not yet taken by the recorder
+        self.change_count = 0
+
+        self._lock = threading.Lock()
+        self._history = {}  # channel key -> deque of (monotonic time, value)
+        self._last_active = None  # Monotonic time some channel last needed the fast rate
+
+    def next_tick(self, now):
+        # Next grid point strictly after `now` at the current interval
+        with self._lock:
+            if self.origin is None:
+                self.origin = now
+            steps = math.floor((now - self.origin) / self.interval) + 1
+            return self.origin + steps * self.interval
+
+    def last_tick(self, now):
+        # Grid point at or before `now` at the current interval
+        with self._lock:
+            if self.origin is None:
+                self.origin = now
+            return self.origin + math.floor((now - self.origin) / self.interval) * self.interval
+
+    def update(self, key, now, value):
+        # Feed one sample of channel `key`; returns the interval to use from now on
+        if math.isnan(value):
+            return self.interval
+        with self._lock:
+            history = self._history.setdefault(key, deque())
+            history.append((now, value))
+            span = max(self.window, 6 * self.interval)
+            while history and now - history[0][0] > span + 1e-9:
+                history.popleft()
+
+            slope, variance, stderr = self._fit(history)
+            # A noise-only fit rarely gives a slope of more than 4 standard errors
+            moving = abs(slope) > self.slope_threshold and abs(slope) > 4 * stderr
+            # A step between two slow samples: react at once rather than after six samples
+            jump = len(history) > 1 and abs(value - history[-2][1]) > self.jump_threshold
+            if moving or jump or variance > self.variance_threshold:
+                self._last_active = now
+                if moving:
+                    reason = f"slope {slope:+.3f}/s"
+                elif jump:
+                    reason = f"jump {value - history[-2][1]:+.2f}"
+                else:
+                    reason = f"variance {variance:.2f}"
+                self._set_interval(self.min_interval, reason)
+            elif self.interval < self.max_interval:
+                calm_since = self._last_active if self._last_active is not None else history[0][0]
+                if now - calm_since >= self.calm_period:
+                    self._last_active = now  # Wait another calm period before the next step
+                    self._set_interval(min(self.interval * 2, self.max_interval), "signal flat")
+            return self.interval
+
+    def drain_changes(self):
+        changes = []
+        while self.changes:
+            changes.append(self.changes.popleft())
+        return changes
+
+    def _set_interval(self, interval, reason):
+        if interval == self.interval:
+            return
+        self.interval = interval
+        self.change_count += 1
+        self.changes.append((time.monotonic_ns(), interval, reason))
+
+    @staticmethod
+    def _fit(history):
+        # Least-squares slope, residual variance and standard error of the slope
+        count = len(history)
+        if count < 6:
+            return 0.0, 0.0, math.inf
+        t0 = history[0][0]
+        mean_t = sum(t - t0 for t, _ in history) / count
+        mean_v = sum(v for _, v in history) / count
+        s_tt = sum((t - t0 - mean_t) ** 2 for t, _ in history)
+        if s_tt <= 0:
+            return 0.0, 0.0, math.inf
+        s_tv = sum((t - t0 - mean_t) * (v - mean_v) for t, v in history)
+        slope = s_tv / s_tt
+        residual = sum((v - mean_v - slope * (t - t0 - mean_t)) ** 2 for t, v in history)
+        variance = residual / (count - 2)
+        return slope, variance, math.sqrt(variance / s_tt)
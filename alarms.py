@@ -0,0 +1,274 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from timebase import NS_PER_SECOND
+
+log = logging.getLogger(__name__)
+
+# Alarm rules per device, e.g.
+#   {
+#     "default": [{"kind": "open", "delay": 2}],
+#     "devices": {
+#       "CH1": [
+#         {"kind": "high", "limit": 250, "hysteresis": 5, "delay": 3, "name": "Oven over-temperature"},
+#         {"kind": "low", "limit": 20, "hysteresis": 2},
+#         {"kind": "rise", "limit": 15, "window": 30}
+#       ]
+#     }
+#   }
+# Kinds: "high" / "low" raise when the temperature is above / below `limit` (°C); "rise" /
+# "fall" when it rises / falls faster than `limit` °C per minute, measured over the last
+# `window` seconds; "open" while the thermocouple is reported open. An alarm clears once the
+# signal is back past the limit by `hysteresis`. Raising and clearing both wait until the
+# condition has held for `delay` seconds (debounce). Devices are looked up by USB serial
+# number, then port, then channel name, as in the calibration file; the "default" rules
+# apply to devices not listed. Without a file there are no alarms.
+ALARMS_FILE = os.path.join(os.path.expanduser('~'), '.temperature_daq_alarms.json')
+
+# Seconds between checks of the file's modification time for hot-reload
+RELOAD_CHECK_INTERVAL = 1.0
+
+# Seconds over which dT/dt is measured unless a rule says otherwise
+RATE_WINDOW = 10.0
+
+KIND_HIGH = 'high'
+KIND_LOW = 'low'
+KIND_RISE = 'rise'
+KIND_FALL = 'fall'
+KIND_OPEN = 'open'
+
+# The signal each kind watches and the direction it raises in
+SIGNALS = {KIND_HIGH: ('value', 1), KIND_LOW: ('value', -1), KIND_RISE: ('rate', 1), KIND_FALL: ('rate', -1),
+           KIND_OPEN: ('open', 1)}
+
+# Event kinds an engine queues for its transitions
+EVENT_RAISED = 'alarm'
+EVENT_CLEARED = 'alarm_cleared'
+
+
+class AlarmRule:
+    __slots__ = ('name', 'kind', 'limit', 'hysteresis', 'delay', 'window')
+
+    def __init__(self, kind, limit=None, hysteresis=0.0, delay=0.0, window=RATE_WINDOW, name=None):
+        if kind not in SIGNALS:
+            raise ValueError(f"unknown alarm kind {kind!r}")
+        if kind == KIND_OPEN:
+            limit, hysteresis = 0.5, 0.0  # The open signal is 1 while open, 0 otherwise
+        elif limit is None:
+            raise ValueError(f"{kind} alarm needs a limit")
+        if hysteresis < 0 or delay < 0 or window <= 0:
+            raise ValueError("hysteresis and delay must not be negative, window must be positive")
+        self.kind = kind
+        self.limit = float(limit)
+        self.hysteresis = float(hysteresis)
+        self.delay = float(delay)
+        self.window = float(window) if kind in (KIND_RISE, KIND_FALL) else None
+        self.name = name or (kind if kind == KIND_OPEN else f"{kind} {self.limit:g}")
+
+    def key(self):
+        return self.kind, self.limit, self.hysteresis, self.delay, self.window, self.name
+
+
+def build_rules(specs):
+    return tuple(AlarmRule(spec['kind'], spec.get('limit'), spec.get('hysteresis', 0.0), spec.get('delay', 0.0),
+                           spec.get('window', RATE_WINDOW), spec.get('name')) for spec in specs)
+
+
+class RateOfChange:
+    # dT/dt in °C per minute between the newest sample and the oldest within `window`
+    # seconds; None until the samples span at least half the window. O(1) per sample.
+
+    def __init__(self, window):
+        self.window_ns = round(window * NS_PER_SECOND)
+        self._samples = deque()
+
+    def add(self, stamp, value):
+        samples = self._samples
+        samples.append((stamp, value))
+        while stamp - samples[0][0] > self.window_ns:
+            samples.popleft()
+        first_stamp, first_value = samples[0]
+        span = stamp - first_stamp
+        if span * 2 < self.window_ns:
+            return None
+        return (value - first_value) * 60 * NS_PER_SECOND / span
+
+
+class Comparator:
+    # All rules on one signal in one direction, compiled into two sorted tables: the raise
+    # thresholds and the clear thresholds. Rule i raises while x > raise_at[i] and clears
+    # while x <= clear_at[i]. Across one sample only the rules whose threshold lies between
+    # the previous x and the new one can change, so evaluation is two bisections plus the
+    # rules actually crossed, however many rules there are.
+
+    def __init__(self, rules, sign, table):
+        self.sign = sign
+        self.table = table
+        by_raise = sorted(rules, key=lambda rule: sign * rule.limit)
+        self.raise_rules = [table.index[id(rule)] for rule in by_raise]
+        self.raise_at = [sign * rule.limit for rule in by_raise]
+        by_clear = sorted(rules, key=lambda rule: sign * rule.limit - rule.hysteresis)
+        self.clear_rules = [table.index[id(rule)] for rule in by_clear]
+        self.clear_at = [sign * rule.limit - rule.hysteresis for rule in by_clear]
+        self._above = None  # Rules with raise_at < x: a prefix of the raise table; None before the first x
+        self._cleared = None  # Rules with clear_at >= x: a suffix of the clear table, from this index
+
+    def update(self, x, stamp):
+        x *= self.sign
+        above = bisect_left(self.raise_at, x)
+        cleared = bisect_left(self.clear_at, x)
+        if self._above is None:
+            # First value: every rule's conditions are new
+            for position, rule in enumerate(self.raise_rules):
+                self.table.condition(rule, position < above, stamp, raising=True)
+            for position, rule in enumerate(self.clear_rules):
+                self.table.condition(rule, position >= cleared, stamp, raising=False)
+            self._above, self._cleared = above, cleared
+            return
+        if above != self._above:
+            for position in range(min(above, self._above), max(above, self._above)):
+                self.table.condition(self.raise_rules[position], position < above, stamp, raising=True)
+            self._above = above
+        if cleared != self._cleared:
+            for position in range(min(cleared, self._cleared), max(cleared, self._cleared)):
+                self.table.condition(self.clear_rules[position], position >= cleared, stamp, raising=False)
+            self._cleared = cleared
+
+
+class AlarmTable:
+    # The compiled alarm rules of one channel, evaluated by its engine on every sample.
+    # Per rule it keeps whether it is active and since when its pending transition has held.
+    # Rules that also exist in `previous` (the table before a reload) keep their state.
+
+    def __init__(self, rules, previous=None):
+        self.rules = list(rules)
+        self.index = {id(rule): position for position, rule in enumerate(self.rules)}
+        self.active = [False] * len(self.rules)
+        self.since = [None] * len(self.rules)  # Stamp the pending transition's condition began
+        self.pending = set()  # Rules whose next transition is waiting for its delay
+
+        groups = {}
+        for rule in self.rules:
+            signal, sign = SIGNALS[rule.kind]
+            groups.setdefault((signal, rule.window, sign), []).append(rule)
+        self.comparators = {}  # (signal, window) -> [Comparator], one per direction
+        for (signal, window, sign), grouped in groups.items():
+            self.comparators.setdefault((signal, window), []).append(Comparator(grouped, sign, self))
+        self.rates = {window: RateOfChange(window) for signal, window in self.comparators if signal == 'rate'}
+
+        if previous is not None:
+            carried = {rule.key(): position for position, rule in enumerate(previous.rules) if previous.active[position]}
+            for position, rule in enumerate(self.rules):
+                if rule.key() in carried:
+                    self.active[position] = True
+            # The next sample derives every condition afresh, see Comparator.update
+
+    def condition(self, position, holds, stamp, raising):
+        # The raise (or clear) condition of a rule started or stopped holding
+        if self.active[position] == raising:
+            return  # Not the transition this rule is waiting for
+        if holds:
+            self.since[position] = stamp
+            self.pending.add(position)
+        else:
+            self.since[position] = None
+            self.pending.discard(position)
+
+    def evaluate(self, stamp, value, sensor_open=False):
+        # One sample: monotonic ns stamp, value (NaN if none) and whether the thermocouple is
+        # open. Returns [(rule, raised, signal value)] for the alarms raised or cleared by it;
+        # the signal value is NaN if the sample had none (a debounce that ran out on a gap).
+        signals = {('open', None): 1.0 if sensor_open else 0.0}
+        if not math.isnan(value):
+            signals[('value', None)] = value
+            for window, rate in self.rates.items():
+                signals[('rate', window)] = rate.add(stamp, value)
+        for signal, x in signals.items():
+            comparators = self.comparators.get(signal)
+            if comparators is None or x is None:
+                continue
+            for comparator in comparators:
+                comparator.update(x, stamp)
+
+        if not self.pending:
+            return []
+        transitions = []
+        for position in list(self.pending):
+            rule = self.rules[position]
+            if stamp - self.since[position] >= rule.delay * NS_PER_SECOND:
+                self.active[position] = not self.active[position]
+                self.since[position] = None
+                self.pending.discard(position)
+                x = signals.get((SIGNALS[rule.kind][0], rule.window))
+                transitions.append((rule, self.active[position], math.nan if x is None else x))
+        return transitions
+
+    def active_rules(self):
+        return [rule for rule, active in zip(self.rules, self.active) if active]
+
+
+class AlarmSet:
+    # Alarm rules for all devices, shared by the acquisition engines like the calibration
+    # set. The file is re-read when it changes; a broken edit is reported and the previous
+    # rules stay in use. `generation` counts the reloads, so engines recompile only then.
+
+    def __init__(self, path=ALARMS_FILE):
+        self.path = path
+        self.rules = {}
+        self.default = ()
+        self.generation = 0
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if self._mtime is not None or self.rules or self.default:
+                self.rules, self.default, self._mtime = {}, (), None
+                self.generation += 1
+            return True
+        try:
+            with open(self.path) as file:
+                config = json.load(file)
+            rules = {key: build_rules(specs) for key, specs in config.get('devices', {}).items()}
+            default = build_rules(config.get('default', []))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning(f"Alarm file {self.path} not applied: {e}")
+            self._mtime = mtime  # Do not retry until it is edited again
+            return False
+        self.rules, self.default, self._mtime = rules, default, mtime
+        self.generation += 1
+        return True
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = now + RELOAD_CHECK_INTERVAL
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self._mtime:
+                return False
+            return self.reload()
+        finally:
+            self._lock.release()
+
+    def rules_for(self, keys):
+        # Rules configured for the first of `keys` (serial number, port, channel name) listed
+        rules = self.rules
+        for key in keys:
+            if key in rules:
+                return rules[key]
+        return self.default
@@ -3,6 +3,19 @@ const int thermoDO = 4; // Data Output from MAX6675
 const int thermoCS = 5; // Chip Select
 const int thermoCLK = 6; // Clock
 
+// Largest batch answered by one "*B<seq>,<count>#" request (must match protocol.py)
+const int MAX_BATCH = 32;
+
+// Sent instead of a reading when no thermocouple is connected (must match protocol.py)
+const int OPEN_THERMOCOUPLE = -1;
+
+// The MAX6675 starts a conversion when CS goes high and needs up to this long for it; reading
+// earlier aborts it and returns the previous result again (must match protocol.py)
+const unsigned long CONVERSION_MS = 220;
+
+// millis() when the conversion now running was started
+unsigned long conversionStart = 0;
+
 void setup() {
   pinMode(thermoCS, OUTPUT);
   pinMode(thermoCLK, OUTPUT);
@@ -13,8 +26,15 @@ void setup() {
   Serial.begin(9600);
 }
 
-uint16_t readMAX6675() {
+int readMAX6675() {
   uint16_t v = 0;
+
+  // Wait for the running conversion, so readings in a batch or back-to-back "*S#" are fresh
+  unsigned long elapsed = millis() - conversionStart;
+  if (elapsed < CONVERSION_MS) {
+    delay(CONVERSION_MS - elapsed);
+  }
+
   digitalWrite(thermoCS, HIGH);
   delay(1);
   digitalWrite(thermoCS, LOW);
@@ -33,12 +53,12 @@ uint16_t readMAX6675() {
   }
 
   digitalWrite(thermoCS, HIGH);
-  
-  // Check if thermocouple is open
-  // if (v & 0x4) {
-  //   // Handle error: No thermocouple connected
-  //   return NAN;
-  // }
+  conversionStart = millis();
+
+  // Bit 2 is set when the thermocouple input is open
+  if (v & 0x4) {
+    return OPEN_THERMOCOUPLE;
+  }
 
   // Convert to temperature in Celsius
   v >>= 3;
@@ -52,7 +72,7 @@ void loop() {
     
     // Check if the received command is "*S#"
     if (incomingData == "*S") {
-      uint16_t temperature = readMAX6675();
+      int temperature = readMAX6675();
       
       // Check if temperature reading was successful
       if (!isnan(temperature)) {
@@ -64,6 +84,37 @@ void loop() {
         // Send an error message if temperature reading failed
         Serial.print("*Error#\n");
       }
+    } else if (incomingData.startsWith("*B")) {
+      // Batch request "*B<seq>,<count>#" is answered with one frame
+      // "*B<seq>:<v1>,<v2>,...,<vn>#" so the host does not pay a round trip per sample
+      int comma = incomingData.indexOf(',');
+      if (comma > 2) {
+        String seq = incomingData.substring(2, comma);
+        int count = incomingData.substring(comma + 1).toInt();
+        if (count < 1) {
+          count = 1;
+        }
+        if (count > MAX_BATCH) {
+          count = MAX_BATCH;
+        }
+
+        Serial.print("*B");
+        Serial.print(seq);
+        Serial.print(":");
+        for (int i = 0; i < count; i++) {
+          if (i > 0) {
+            Serial.print(",");
+          }
+          Serial.print(readMAX6675());
+        }
+        Serial.print("#\n");
+      }
+    } else if (incomingData == "*T") {
+      // Clock probe "*T#" is answered with "*T<millis>#" so the host can track how far
+      // this board's oscillator drifts from its own clock
+      Serial.print("*T");
+      Serial.print(millis());
+      Serial.print("#\n");
     }
   }
 }
@@ -0,0 +1,67 @@
+import math
+
+
+class RunningStats:
+    # Count/sum/min/max/variance updated in O(1) per sample (Welford's algorithm)
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = math.nan
+        self.minimum = math.nan
+        self.maximum = math.nan
+        self._m2 = 0.0
+
+    def add(self, value):
+        if math.isnan(value):
+            return  # A channel that did not report in this slot
+        self.count += 1
+        self.total += value
+        if self.count == 1:
+            self.mean = value
+            self.minimum = value
+            self.maximum = value
+            return
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    @property
+    def variance(self):
+        # Sample variance; NaN until there are two samples
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+
+class BatchAverager:
+    # Groups samples into batches of batch_size and keeps running statistics of the open batch.
+    # Batch 0 holds the first batch_size samples, batch 1 the next batch_size, and so on.
+
+    def __init__(self, batch_size, channel_count=1):
+        self.batch_size = batch_size
+        self.channel_count = channel_count
+        self.sample_count = 0
+        self.batch_index = 0
+        self.current = [RunningStats() for _ in range(channel_count)]
+
+    def add(self, values):
+        # Add one sample row; returns (batch_index, [RunningStats per channel]) for its batch
+        batch_index = self.sample_count // self.batch_size
+        self.sample_count += 1
+        if batch_index != self.batch_index:
+            # Close the previous batch; its statistics are final and no longer touched
+            self.batch_index = batch_index
+            self.current = [RunningStats() for _ in range(self.channel_count)]
+        for stats, value in zip(self.current, values):
+            stats.add(value)
+        return self.batch_index, self.current
+
+    def means(self):
+        return [stats.mean for stats in self.current]
@@ -0,0 +1,163 @@
+# Adaptive sampling against fixed-rate polling on the same input: a simulated run (soak,
+# fast ramp, soak, exponential cool-down) or the first channel of a recording. Sampling is
+# simulated in virtual time with MAX6675-like noise and 0.25 degree quantisation; the signal is
+# reconstructed by linear interpolation and compared with the input. Run from the repository root:
+#   python benchmarks/bench_adaptive_rate.py [recording.bin]
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from acquisition_core import AcquisitionCore  # noqa: E402
+from adaptive_rate import AdaptiveRate  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from port_discovery import DiscoveredPort  # noqa: E402
+from recorder import read_events, read_recording  # noqa: E402
+
+NOISE = 0.25
+RESOLUTION = 0.25
+ITERATIONS = 2  # Readings averaged per sample, as the engine does
+EVAL_STEP = 0.05
+
+
+def simulated_run():
+    # (duration, truth(t)): 10 min soak at 25, ramp at 5 degrees/s to 325 with a damped
+    # overshoot, 10 min soak, quench (5 s time constant) and 19 min soak
+    def truth(t):
+        if t < 600:
+            return 25.0
+        if t < 660:
+            return 25.0 + 5.0 * (t - 600)
+        if t < 1260:
+            return 325.0 + 15.0 * math.exp(-(t - 660) / 20) * math.sin(2 * math.pi * (t - 660) / 12)
+        return 25.0 + 300.0 * math.exp(-(t - 1260) / 5)
+    return 2400.0, truth
+
+
+def recorded_run(path):
+    _, _, rows = read_recording(path)
+    times, values = [], []
+    for timestamp, row in rows:
+        if not math.isnan(row[0]):
+            times.append(timestamp)
+            values.append(row[0])
+    start = times[0]
+    times = [t - start for t in times]
+
+    def truth(t):
+        i = min(max(bisect_left(times, t), 1), len(times) - 1)
+        t0, t1 = times[i - 1], times[i]
+        return values[i - 1] + (values[i] - values[i - 1]) * (t - t0) / (t1 - t0)
+    return times[-1], truth
+
+
+def read(truth, t, rng):
+    readings = [round((truth(t) + rng.gauss(0, NOISE)) / RESOLUTION) * RESOLUTION for _ in range(ITERATIONS)]
+    return sum(readings) / len(readings)
+
+
+def sample(duration, truth, scheduler=None, interval=1.0, seed=1):
+    rng = random.Random(seed)
+    samples = []
+    t = 0.0
+    while t <= duration:
+        value = read(truth, t, rng)
+        samples.append((t, value))
+        if scheduler is not None:
+            scheduler.update('CH1', t, value)
+            t = scheduler.next_tick(t)
+        else:
+            t += interval
+    return samples
+
+
+def reconstruction_error(truth, samples, start=0.0, stop=math.inf):
+    # RMS and max error of the linear interpolation between samples, over [start, stop)
+    times = [t for t, _ in samples]
+    squared = 0.0
+    worst = 0.0
+    count = 0
+    t = start
+    while t <= min(times[-1], stop):
+        i = min(max(bisect_left(times, t), 1), len(times) - 1)
+        (t0, v0), (t1, v1) = samples[i - 1], samples[i]
+        error = abs(v0 + (v1 - v0) * (t - t0) / (t1 - t0) - truth(t))
+        squared += error * error
+        worst = max(worst, error)
+        count += 1
+        t += EVAL_STEP
+    return math.sqrt(squared / count), worst
+
+
+def live_run():
+    # Two simulated loggers through the real engines: a step on one of them must speed up
+    # both, keep the rows aligned and leave the rate changes in the recording's events.
+    # The outlier filter holds a step back for a few readings before it is believed.
+    class PortInfo:
+        vid = pid = serial_number = None
+
+        def __init__(self, device):
+            self.device = device
+
+    devices = [FakeArduino(seed=i).start() for i in range(2)]
+    directory = tempfile.mkdtemp()
+    core = AcquisitionCore(adaptive=True, max_interval=1.0, recordings_dir=directory, calibration_file=os.path.join(directory, 'none.json'))
+    core.attach([DiscoveredPort(PortInfo(device.port_name), device.port, 0.0) for device in devices])
+    core.scheduler.calm_period = 3.0
+    core.start()
+    rows = []
+    started = time.monotonic()
+    while time.monotonic() - started < 30:
+        time.sleep(0.1)
+        if 6 <= time.monotonic() - started < 6.1:
+            devices[0].temperature += 30
+        rows.extend(core.poll())
+    core.close()
+    for device in devices:
+        device.stop()
+    events = read_events(core.recorder.path)
+    incomplete = sum(1 for row in rows if any(math.isnan(value) for value in row[1]))
+    print(f"live, 2 loggers, step of 30 on CH1 after 6 s: {len(rows)} rows, {incomplete} with a missing channel")
+    for event in events:
+        print(f"  +{event['time'] - events[0]['time']:5.1f} s  interval {event['interval']:g} s ({event['reason']})")
+    shutil.rmtree(directory)
+    assert any(event['interval'] == core.min_interval for event in events)
+
+
+def main():
+    if len(sys.argv) > 1:
+        duration, truth = recorded_run(sys.argv[1])
+        print(f"recording {sys.argv[1]}, {duration:.0f} s")
+    else:
+        duration, truth = simulated_run()
+        print(f"simulated run, {duration:.0f} s: soak, 5 degrees/s ramp with overshoot, soak, quench, soak")
+
+    runs = [('fixed 1 s (current)', sample(duration, truth, interval=1.0)),
+            ('fixed 0.25 s', sample(duration, truth, interval=0.25)),
+            ('fixed 2 s', sample(duration, truth, interval=2.0)),
+            ('fixed 4 s', sample(duration, truth, interval=4.0))]
+    for max_interval in (1.0, 2.0, 4.0):
+        scheduler = AdaptiveRate(max_interval=max_interval, origin=0.0)
+        samples = sample(duration, truth, scheduler)
+        runs.append((f'adaptive 0.25-{max_interval:g} s ({scheduler.change_count} changes)', samples))
+    baseline = len(runs[0][1])
+    for name, samples in runs:
+        rms, worst = reconstruction_error(truth, samples)
+        line = (f"  {name:>32}: {len(samples):6d} samples ({len(samples) / baseline:5.0%} of 1 s polling), "
+                f"RMS error {rms:5.2f}, max {worst:6.2f}")
+        if len(sys.argv) == 1:
+            # The ramp and its overshoot, where a fast rate should pay off
+            ramp_rms, ramp_worst = reconstruction_error(truth, samples, 600, 760)
+            line += f"; ramp RMS {ramp_rms:5.2f}, max {ramp_worst:5.2f}"
+        print(line)
+    live_run()
+
+
+if __name__ == '__main__':
+    main()
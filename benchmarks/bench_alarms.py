@@ -0,0 +1,160 @@
+# Alarm evaluation on the reader path. First the cost of evaluating one sample against a
+# compiled AlarmTable as the rule count grows, next to checking every rule in turn. Then the
+# notification latency, from the frame that completed a sample to the alarm listener being
+# called, on two simulated loggers whose temperature is stepped across a limit: once with an
+# idle front end and once with a front end that keeps the interpreter busy and drains only
+# every STALL seconds, as a GUI thread redrawing a large plot does. The same alarms as the
+# front end gets them from poll() are shown for comparison. Run from the repository root:
+#   python benchmarks/bench_alarms.py [seconds per phase]
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from acquisition_core import AcquisitionCore  # noqa: E402
+from alarms import EVENT_RAISED, AlarmTable, build_rules  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from port_discovery import DiscoveredPort  # noqa: E402
+from timebase import NS_PER_SECOND  # noqa: E402
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+INTERVAL = 0.05
+STEP_EVERY = 0.4  # Seconds between temperature steps across the limit
+STALL = 0.5  # Seconds the loaded front end goes between drains
+
+
+class PortInfo:
+    vid = pid = serial_number = None
+
+    def __init__(self, device):
+        self.device = device
+
+
+def naive_evaluate(rules, state, value):
+    # Every rule checked on every sample, as a plain loop over the rules would
+    changed = []
+    for index, rule in enumerate(rules):
+        sign = 1 if rule.kind == 'high' else -1
+        if not state[index] and sign * value > sign * rule.limit:
+            state[index] = True
+            changed.append(rule)
+        elif state[index] and sign * value <= sign * rule.limit - rule.hysteresis:
+            state[index] = False
+            changed.append(rule)
+    return changed
+
+
+def evaluation_cost(samples=20_000):
+    rng = random.Random(1)
+    values = [60 + 30 * math.sin(i / 200) + rng.gauss(0, 0.5) for i in range(samples)]
+    print("evaluating one sample:")
+    for count in (1, 10, 100, 1000):
+        specs = [{'kind': rng.choice(('high', 'low')), 'limit': rng.uniform(20, 100), 'hysteresis': rng.uniform(0, 3)}
+                 for _ in range(count)]
+        rules = build_rules(specs)
+        table = AlarmTable(rules)
+        start = time.perf_counter()
+        transitions = sum(len(table.evaluate(i * INTERVAL * NS_PER_SECOND, value)) for i, value in enumerate(values))
+        compiled = (time.perf_counter() - start) / samples * 1e6
+        state = [False] * count
+        start = time.perf_counter()
+        naive = sum(len(naive_evaluate(rules, state, value)) for value in values)
+        loop = (time.perf_counter() - start) / samples * 1e6
+        print(f"  {count:>5} rules: compiled table {compiled:6.2f} us, every rule in turn {loop:8.2f} us "
+              f"({transitions} transitions)")
+        assert transitions == naive and table.active == state
+    return compiled
+
+
+def phase(core, devices, loaded):
+    latencies = []  # Frame received until the listener had the alarm, ms
+    polled = []  # Frame received until the front end had it from poll(), ms
+
+    def listener(name, stamp, kind, fields):
+        if kind == EVENT_RAISED:
+            latencies.append((time.monotonic_ns() - stamp) / 1e6)
+
+    core.alarm_listeners.append(listener)
+    started = time.monotonic()
+    next_step = started
+    high = False
+    while time.monotonic() - started < SECONDS:
+        now = time.monotonic()
+        if now >= next_step:
+            high = not high
+            for device in devices:
+                device.temperature = 300.0 if high else 100.0
+            next_step += STEP_EVERY
+        if loaded:
+            # Pure-Python work holding the interpreter, like a redraw of a large plot; the
+            # front end only gets round to draining every STALL seconds
+            busy_until = time.monotonic() + STALL
+            while time.monotonic() < busy_until:
+                sum(i * i for i in range(20_000))
+        else:
+            time.sleep(0.01)
+        core.poll()
+        for stamp, kind, fields in core.take_events():
+            if kind == EVENT_RAISED:
+                polled.append((time.monotonic_ns() - stamp) / 1e6)
+    core.alarm_listeners.remove(listener)
+    for device in devices:
+        device.temperature = 100.0
+    time.sleep(1.0)
+    core.poll()
+    core.take_events()
+    return sorted(latencies), sorted(polled)
+
+
+def percentiles(values):
+    return (f"p50 {values[len(values) // 2]:6.2f} ms, p99 {values[int(len(values) * 0.99)]:6.2f} ms, "
+            f"max {values[-1]:6.2f} ms")
+
+
+def main():
+    evaluation_cost()
+
+    directory = tempfile.mkdtemp()
+    alarms_file = os.path.join(directory, 'alarms.json')
+    with open(alarms_file, 'w') as file:
+        json.dump({'default': [{'kind': 'high', 'limit': 200, 'hysteresis': 10, 'name': 'over temperature'},
+                               {'kind': 'rise', 'limit': 5000, 'window': 0.5},
+                               {'kind': 'open', 'delay': 1}]}, file)
+    devices = [FakeArduino(baud=None, seed=i).start() for i in range(2)]
+    core = AcquisitionCore(interval=INTERVAL, recordings_dir=directory, store_series=False,
+                           calibration_file=os.path.join(directory, 'none.json'), alarms_file=alarms_file)
+    core.attach([DiscoveredPort(PortInfo(device.port_name), device.port, 0.0) for device in devices])
+    core.start()
+    time.sleep(1.0)
+    core.poll()
+    core.take_events()
+
+    print(f"2 loggers every {INTERVAL} s, stepped across the limit every {STEP_EVERY} s, {SECONDS:.0f} s per phase:")
+    results = {}
+    for name, loaded in (("idle front end", False), ("loaded front end", True)):
+        latencies, polled = phase(core, devices, loaded)
+        results[name] = latencies
+        print(f"  {name}: {len(latencies)} alarms, frame to listener {percentiles(latencies)}")
+        print(f"  {'':>{len(name)}}  frame to the front end's poll() {percentiles(polled)}")
+    print(f"  stats: {core.stats_line()}")
+    core.close()
+    for device in devices:
+        device.stop()
+    shutil.rmtree(directory)
+
+    # Under load the engine may have to wait for the interpreter a few times, a switch
+    # interval each time; that is the bound, far below when the front end would see it
+    bound = max(10.0, 4 * sys.getswitchinterval() * 1000)
+    for latencies in results.values():
+        assert len(latencies) >= SECONDS / STEP_EVERY
+        assert latencies[int(len(latencies) * 0.99)] < bound
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# Per-sample cost and memory of batch averaging over a simulated week at 1 Hz.
+# Only the averaging stage is measured; the per-batch plot points are the plot's concern.
+# Run from the repository root: python benchmarks/bench_batch_stats.py
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from batch_stats import BatchAverager  # noqa: E402
+
+WEEK = 7 * 24 * 60 * 60
+CHECKPOINTS = 7  # Report once per simulated day
+BATCH_VALUE = 10
+
+
+def legacy(values):
+    # The original handle_data_ready: unbounded list, slice + sum per sample
+    temperature_data = []
+    for value in values:
+        temperature_data.append(value)
+        batch_index = len(temperature_data) // BATCH_VALUE
+        current_batch_data = temperature_data[batch_index * BATCH_VALUE:]
+        if current_batch_data:
+            yield sum(current_batch_data) / len(current_batch_data)
+        else:
+            yield None
+
+
+def streaming(values):
+    # Raw rows go to the recording on disk, so only the open batch is held
+    batches = BatchAverager(BATCH_VALUE)
+    for value in values:
+        yield batches.add([value])[1][0].mean
+
+
+def run(name, pipeline, trace_memory):
+    values = (random.uniform(20, 30) for _ in range(WEEK))  # Fresh float objects, as from the reader
+    step = WEEK // CHECKPOINTS
+    results = []
+    if trace_memory:
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for count, _ in enumerate(pipeline(values), 1):
+        if count % step == 0:
+            now = time.perf_counter()
+            memory = (tracemalloc.get_traced_memory()[0] - base) / 1e6 if trace_memory else 0.0
+            results.append(((now - start) / step * 1e6, memory))
+            start = time.perf_counter()
+    if trace_memory:
+        tracemalloc.stop()
+    return results
+
+
+def main():
+    for name, pipeline in (('legacy list + slice/sum', legacy),
+                           ('BatchAverager', streaming)):
+        timings = run(name, pipeline, trace_memory=False)
+        memory = run(name, pipeline, trace_memory=True)
+        print(name)
+        for day, ((cost, _), (_, held)) in enumerate(zip(timings, memory), 1):
+            print(f"  day {day}: {cost:5.2f} us/sample, {held:6.1f} MB held")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# Calibration throughput (vectorized models vs. the old per-sample Python expression),
+# per-read overhead in the engine thread, and hot-reload of the calibration file while an
+# engine is acquiring from a simulated logger. Run from the repository root:
+#   python benchmarks/bench_calibration.py [rows]
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import calibration  # noqa: E402
+from acquisition_engine import AcquisitionEngine  # noqa: E402
+from calibration import CalibrationSet  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+CHANNELS = 4
+
+# The formula that used to be hard-coded in the GUI, and two models of the other kinds
+LINEAR = {'type': 'linear', 'gain': 0.3015250701388389, 'offset': -21.798755485216873 - 85}
+POLYNOMIAL = {'type': 'polynomial', 'coefficients': [2e-7, -1e-4, 1.02, -3.5]}
+TABLE = {'type': 'table', 'points': [[0, -2.0], [100, 24.0], [200, 50.5], [300, 76.0], [400, 101.0],
+                                     [500, 127.5], [600, 153.0], [700, 180.0], [800, 206.0]]}
+
+
+def scalar_reference(spec):
+    # Plain Python per-sample versions, the way handle_data_ready computed the calibration
+    if spec['type'] == 'linear':
+        return lambda t: spec['gain'] * t + spec['offset']
+    if spec['type'] == 'polynomial':
+        def polynomial(t):
+            result = 0.0
+            for coefficient in spec['coefficients']:
+                result = result * t + coefficient
+            return result
+        return polynomial
+    points = spec['points']
+
+    def table(t):
+        # First segment ending at or after t; the outer segments extend past the table
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if t <= x1:
+                break
+        return y0 + (t - x0) * (y1 - y0) / (x1 - x0)
+    return table
+
+
+def write_config(path, devices):
+    with open(path, 'w') as file:
+        json.dump({'devices': devices}, file)
+    # Make sure the change is visible even within the filesystem's timestamp granularity
+    stamp = time.time_ns() + 1_000_000_000
+    os.utime(path, ns=(stamp, stamp))
+
+
+def throughput(directory):
+    raw = np.random.default_rng(1).uniform(0, 800, size=(ROWS, CHANNELS))
+    keys = [[f"CH{i + 1}"] for i in range(CHANNELS)]
+    print(f"{ROWS} rows x {CHANNELS} channels:")
+    for name, spec in (('linear', LINEAR), ('polynomial', POLYNOMIAL), ('table', TABLE)):
+        path = os.path.join(directory, f'{name}.json')
+        write_config(path, {key[0]: spec for key in keys})
+        calibrations = CalibrationSet(path)
+
+        start = time.perf_counter()
+        vectorized = calibrations.apply_block(keys, raw)
+        vector_time = time.perf_counter() - start
+
+        reference = scalar_reference(spec)
+        sample = raw[:ROWS // 20]  # The scalar loop is slow; time a slice and scale up
+        start = time.perf_counter()
+        scalar = [[reference(value) for value in row] for row in sample.tolist()]
+        scalar_time = (time.perf_counter() - start) * ROWS / len(sample)
+
+        error = float(np.max(np.abs(vectorized[:len(sample)] - np.array(scalar))))
+        samples = ROWS * CHANNELS
+        print(f"  {name:>10}: numpy {samples / vector_time / 1e6:7.1f} M samples/s, "
+              f"python {samples / scalar_time / 1e6:6.2f} M samples/s ({scalar_time / vector_time:5.0f}x), "
+              f"max difference {error:.1e}")
+        assert error < 1e-9
+
+
+def per_read_overhead(directory):
+    # What one engine tick pays for calibrating its block of readings
+    path = os.path.join(directory, 'table.json')
+    write_config(path, {'CH1': TABLE})
+    calibrations = CalibrationSet(path)
+    for block in (2, 32, 1024):
+        readings = list(range(100, 100 + block))
+        count = 20000 if block < 1024 else 2000
+        start = time.perf_counter()
+        for _ in range(count):
+            float(calibrations.apply(['CH1'], readings).mean())
+        elapsed = (time.perf_counter() - start) / count
+        print(f"  table model, {block:4d} readings per read: {elapsed * 1e6:7.1f} us "
+              f"({block / elapsed / 1e6:6.2f} M readings/s per engine)")
+
+
+def hot_reload(directory):
+    path = os.path.join(directory, 'live.json')
+    write_config(path, {})
+    calibrations = CalibrationSet(path)
+    device = FakeArduino(temperature=100.0).start()
+    engine = AcquisitionEngine(device.port, interval=0.05, iterations=4, calibration=calibrations,
+                               calibration_keys=[device.port_name, 'CH1'])
+    engine.start()
+
+    def mean_after(seconds):
+        time.sleep(seconds)
+        values = [value for _, value in engine.drain()]
+        return sum(values[-5:]) / len(values[-5:])
+
+    try:
+        mean_after(1.0)
+        before = mean_after(0.5)
+        changed_at = time.monotonic()
+        write_config(path, {'CH1': {'type': 'linear', 'gain': 2.0, 'offset': 10.0}})
+        while True:
+            time.sleep(0.05)
+            values = [value for _, value in engine.drain()]
+            if values and values[-1] > 150:
+                picked_up = time.monotonic() - changed_at
+                break
+        after = mean_after(0.5)
+        with open(path, 'w') as file:
+            file.write('{"devices": {"CH1": {"type": "linear", "gain": ')  # Half-saved edit
+        stamp = time.time_ns() + 2_000_000_000
+        os.utime(path, ns=(stamp, stamp))
+        time.sleep(calibration.RELOAD_CHECK_INTERVAL + 0.3)
+        broken = mean_after(0.5)
+    finally:
+        engine.stop()
+        device.stop()
+    print(f"  raw {before:.1f} -> calibrated {after:.1f} (gain 2, offset 10) {picked_up:.2f} s after the edit, "
+          f"without restarting; broken edit ignored, still {broken:.1f}; {calibrations.reloads} reloads")
+    assert math.isclose(after, 2 * before + 10, rel_tol=0.05) and broken > 150
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        throughput(directory)
+        print("per read, in the engine thread:")
+        per_read_overhead(directory)
+        print("hot-reload while acquiring:")
+        hot_reload(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Aggregate throughput with one engine per simulated logger, for a growing number of ports.
+# Run from the repository root: python benchmarks/bench_channels.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from channels import ChannelRegistry, SampleStore  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+
+DURATION = 3.0
+ITERATIONS = 10  # Readings averaged into each sample
+
+
+def run(port_count):
+    devices = [FakeArduino().start() for _ in range(port_count)]
+    registry = ChannelRegistry(interval=0, iterations=ITERATIONS)
+    for index, device in enumerate(devices):
+        registry.add_device(f"pty{index}", device.port)
+    store = SampleStore(port_count, interval=0.05)
+
+    registry.start_all()
+    samples = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < DURATION:
+        time.sleep(0.05)
+        for channel, timestamp, value in registry.drain():
+            store.add(channel, timestamp, value)
+            samples += 1
+        store.pop_ready()
+    elapsed = time.perf_counter() - start
+    registry.stop_all()
+    for device in devices:
+        device.stop()
+
+    readings = samples * ITERATIONS / elapsed
+    print(f"{port_count:3d} ports: {readings:8.1f} readings/s aggregate, {readings / port_count:6.1f} per port")
+    return readings
+
+
+def main():
+    baseline = None
+    for port_count in (1, 2, 4, 8, 16):
+        readings = run(port_count)
+        baseline = baseline or readings
+        print(f"           scaling {readings / baseline:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# Outlier rejection and smoothing: per-reading cost against what a batch-mode link can
+# deliver, rejection quality on a noisy signal with spurious readings, and the whole engine
+# against a simulated logger that glitches and loses its thermocouple. Run from the repository root:
+#   python benchmarks/bench_filter.py [readings]
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from acquisition_engine import AcquisitionEngine  # noqa: E402
+from fake_arduino import BAUD, FakeArduino  # noqa: E402
+from protocol import MAX_BATCH, OPEN_THERMOCOUPLE  # noqa: E402
+from sample_filter import SMOOTHING_EMA, SMOOTHING_KALMAN, SampleFilter  # noqa: E402
+
+READINGS = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+SPIKE_RATE = 0.01
+
+# Best case for one 9600 baud link in batch mode: about 4.3 bytes per reading, 10 bits per byte
+LINK_READINGS_PER_SECOND = BAUD / 10 / 4.3
+
+
+def signal(count, seed=1):
+    # (truth, reading) pairs: a slow drift in quarter-degree counts, sensor noise, and spikes
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        truth = 400 + 20 * math.sin(i / 2000)
+        reading = round(truth + rng.gauss(0, 1.5))
+        if rng.random() < SPIKE_RATE:
+            reading = rng.choice((0, 4095))
+        elif rng.random() < 0.001:
+            reading = OPEN_THERMOCOUPLE
+        pairs.append((truth, reading))
+    return pairs
+
+
+def throughput(pairs):
+    readings = [reading for _, reading in pairs]
+    blocks = [readings[i:i + MAX_BATCH] for i in range(0, len(readings), MAX_BATCH)]
+    print(f"{len(readings)} readings in blocks of {MAX_BATCH} (one batch frame):")
+    for name, smoothing in (('hampel', None), ('hampel + ema', SMOOTHING_EMA), ('hampel + kalman', SMOOTHING_KALMAN)):
+        sample_filter = SampleFilter(smoothing=smoothing)
+        start = time.perf_counter()
+        for block in blocks:
+            accepted = sample_filter.filter(block)
+            if accepted:
+                sample_filter.smooth(sum(accepted) / len(accepted))
+        elapsed = time.perf_counter() - start
+        rate = len(readings) / elapsed
+        print(f"  {name:>16}: {elapsed / len(readings) * 1e6:5.2f} us/reading, {rate / 1e3:6.0f} k readings/s "
+              f"= {rate / LINK_READINGS_PER_SECOND:5.0f} saturated {BAUD} baud links")
+        assert rate > 20 * LINK_READINGS_PER_SECOND
+
+
+def quality(pairs):
+    # Two readings per sample, as the engine takes them by default
+    spikes = sum(1 for truth, reading in pairs if reading in (0, 4095))
+    print(f"quality, {SPIKE_RATE:.0%} spikes (0 / 4095) and 0.1% open-thermocouple readings:")
+    unfiltered = SampleFilter(hampel_window=0)
+    for name, sample_filter in (('no rejection', unfiltered), ('hampel', SampleFilter()),
+                                ('hampel + ema', SampleFilter(smoothing=SMOOTHING_EMA)),
+                                ('hampel + kalman', SampleFilter(smoothing=SMOOTHING_KALMAN))):
+        squared_error = 0.0
+        samples = 0
+        caught = false_rejections = 0
+        for i in range(0, len(pairs), 2):
+            block = pairs[i:i + 2]
+            accepted = sample_filter.filter([reading for _, reading in block])
+            truth = sum(item[0] for item in block) / len(block)
+            if sample_filter is not unfiltered:
+                kept = list(accepted)
+                for _, reading in block:
+                    if reading in (0, 4095):
+                        caught += reading not in kept
+                    elif reading != OPEN_THERMOCOUPLE and reading not in kept:
+                        false_rejections += 1
+                    if reading in kept:
+                        kept.remove(reading)
+            if not accepted:
+                continue
+            value = sample_filter.smooth(sum(accepted) / len(accepted))
+            squared_error += (value - truth) ** 2
+            samples += 1
+        rms = math.sqrt(squared_error / samples)
+        detail = "" if sample_filter is unfiltered else (f", spikes caught {caught}/{spikes}, "
+                                                         f"good readings rejected {false_rejections / len(pairs):.2%}")
+        print(f"  {name:>16}: RMS error {rms:7.2f} counts{detail}")
+
+
+def engine_against_device():
+    device = FakeArduino(spike_rate=0.05, seed=2).start()
+    engine = AcquisitionEngine(device.port, interval=0.02, iterations=10)
+    engine.start()
+    time.sleep(3.0)
+    device.thermocouple_open = True
+    time.sleep(1.0)
+    was_open = engine.filter.open_thermocouple
+    device.thermocouple_open = False
+    time.sleep(1.0)
+    engine.stop()
+    device.stop()
+    values = [value for _, value in engine.drain()]
+    valid = [value for value in values if not math.isnan(value)]
+    print(f"engine, 5% spikes: {len(values)} samples, {len(values) - len(valid)} NaN while open, "
+          f"range {min(valid):.1f} .. {max(valid):.1f}; {engine.filter.summary()}; "
+          f"device sent {device.spikes} spikes; open flagged {was_open}")
+    assert was_open and not engine.filter.open_thermocouple and min(valid) > 50 and max(valid) < 150
+
+
+def main():
+    pairs = signal(READINGS)
+    throughput(pairs)
+    quality(pairs[:200_000])
+    engine_against_device()
+
+
+if __name__ == '__main__':
+    main()
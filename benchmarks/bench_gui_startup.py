@@ -0,0 +1,96 @@
+# Startup regression check for the GUI entry point. Uses `python -X importtime` to measure
+# what `import data_acquisition_qt` costs and which modules it pulls in, then launches the
+# window (offscreen) and times until it is shown and until the plot is built.
+# Exits non-zero when a budget is exceeded or a deferred module is imported eagerly again.
+# Run from the repository root:
+#   python benchmarks/bench_gui_startup.py [runs]
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+# Budgets in milliseconds (median over RUNS)
+IMPORT_BUDGET_MS = 250
+WINDOW_BUDGET_MS = 1000
+
+# Only imported when first needed, never by `import data_acquisition_qt`
+DEFERRED_MODULES = ['matplotlib', 'numpy', 'serial.tools.list_ports', 'port_discovery', 'publisher', 'asyncio']
+
+# main() without app.exec(): show the window, then run the deferred work the way the event loop would
+WINDOW_DRIVER = """
+import sys, time
+launched = float(sys.argv[1])
+from PyQt6.QtWidgets import QApplication
+import data_acquisition_qt
+app = QApplication(sys.argv[:1])
+window = data_acquisition_qt.TemperatureDataAcquisitionSystem()
+window.show()
+app.processEvents()
+shown = time.time()
+window.build_plot()
+app.processEvents()
+plot_ready = time.time()
+print(f"{(shown - launched) * 1000:.1f} {(plot_ready - launched) * 1000:.1f}")
+"""
+
+
+def import_profile():
+    # {module: cumulative microseconds} from one `-X importtime` run
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import data_acquisition_qt'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def main():
+    failures = []
+
+    profiles = [import_profile() for _ in range(RUNS)]
+    import_ms = median([profile['data_acquisition_qt'] for profile in profiles]) / 1000
+    print(f"import data_acquisition_qt: {import_ms:.0f} ms (budget {IMPORT_BUDGET_MS} ms, median of {RUNS})")
+    heaviest = sorted(profiles[-1].items(), key=lambda item: -item[1])[1:9]
+    for name, cumulative in heaviest:
+        print(f"  {cumulative / 1000:7.1f} ms  {name}")
+    if import_ms > IMPORT_BUDGET_MS:
+        failures.append(f"import took {import_ms:.0f} ms")
+    eager = [name for name in DEFERRED_MODULES if any(module == name or module.startswith(name + '.')
+                                                      for module in profiles[-1])]
+    if eager:
+        failures.append(f"imported at module load again: {', '.join(eager)}")
+
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+        shown, plot_ready = [], []
+        for _ in range(RUNS):
+            result = subprocess.run([sys.executable, '-c', WINDOW_DRIVER, repr(time.time())], cwd=ROOT, env=env,
+                                    capture_output=True, text=True, check=True)
+            first, second = result.stdout.split()[-2:]
+            shown.append(float(first))
+            plot_ready.append(float(second))
+    window_ms = median(shown)
+    print(f"window shown {window_ms:.0f} ms after launch (budget {WINDOW_BUDGET_MS} ms), "
+          f"plot ready after {median(plot_ready):.0f} ms")
+    if window_ms > WINDOW_BUDGET_MS:
+        failures.append(f"window took {window_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# ms per frame of the old cla() + full redraw against LivePlot's blitted update (Agg, headless).
+# Also checks that a zoom stops the axes following new samples until follow() is called.
+# Run from the repository root: python benchmarks/bench_live_plot.py
+import os
+import random
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from live_plot import LivePlot  # noqa: E402
+
+SIZES = (1_000, 100_000, 1_000_000)
+FRAMES = 10
+
+
+def make_points(count):
+    return [(float(i), 25 + random.uniform(-1, 1)) for i in range(count)]
+
+
+def legacy_frames(points):
+    # The original update_plot: clear the axes and replot the whole series every sample
+    figure = Figure()
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        ax.cla()
+        ax.set_title('Temperature Over Time')
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('Temperature (°C)')
+        x_data, y_data = zip(*points)
+        ax.plot(x_data, y_data, '-o', label='Average Temperature')
+        ax.legend()
+        canvas.draw()
+    return (time.perf_counter() - start) / FRAMES * 1000
+
+
+def live_plot_frames(points):
+    figure = Figure()
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    plot = LivePlot(figure, canvas, ax)
+    plot.set_channels(['Average Temperature'])
+    for index, (x, y) in enumerate(points):
+        plot.update_point(index, x, [y])
+    plot.render(force=True)  # First frame: full draw and background capture
+
+    last = len(points) - 1
+    x = points[last][0]
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        # The open batch changes value; limits stay put so the frame is blitted
+        plot.update_point(last, x, [25 + random.uniform(-1, 1)])
+        plot.render(force=True)
+    return (time.perf_counter() - start) / FRAMES * 1000
+
+
+def check_zoom_is_kept():
+    figure = Figure()
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    plot = LivePlot(figure, canvas, ax)
+    plot.set_channels(['Average Temperature'])
+    canvas.draw()  # matplotlib autoscales the empty axes; that is not a zoom
+    for index in range(100):
+        if index == 50:
+            ax.set_xlim(10, 20)  # What the toolbar's zoom does
+        plot.update_point(index, float(index), [25 + index / 10])
+        plot.render(force=True)
+        canvas.draw()
+        if index == 49:
+            followed = ax.get_xlim()
+    zoomed = ax.get_xlim()
+    plot.follow()
+    plot.render(force=True)
+    print(f"axes follow the data to {followed[1]:.0f} s, stay zoomed at {zoomed[0]:.0f}-{zoomed[1]:.0f} s while samples arrive, "
+          f"follow again to {ax.get_xlim()[1]:.0f} s")
+    assert followed[1] >= 49 and zoomed == (10, 20) and ax.get_xlim()[1] >= 99
+
+
+def main():
+    check_zoom_is_kept()
+    for count in SIZES:
+        points = make_points(count)
+        legacy = legacy_frames(points)
+        live = live_plot_frames(points)
+        print(f"{count:>9} points: legacy {legacy:9.1f} ms/frame, LivePlot {live:9.1f} ms/frame")
+
+
+if __name__ == '__main__':
+    main()
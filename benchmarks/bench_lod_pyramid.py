@@ -0,0 +1,32 @@
+# Times MinMaxPyramid window queries and appends as the run grows; correctness is covered by
+# test_lod_pyramid.py.
+# Run from the repository root: python benchmarks/bench_lod_pyramid.py
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lod_pyramid import MinMaxPyramid  # noqa: E402
+
+PIXELS = 1200  # Typical plot width in pixel columns
+
+
+def time_queries():
+    pyramid = MinMaxPyramid()
+    build_start = time.perf_counter()
+    for target in (10_000, 100_000, 1_000_000):
+        while len(pyramid) < target:
+            pyramid.append(float(len(pyramid)), random.gauss(25, 3))
+        build = (time.perf_counter() - build_start) / len(pyramid) * 1e6
+        start = time.perf_counter()
+        for _ in range(20):
+            xs, _, level = pyramid.query(0, len(pyramid), PIXELS)
+        query = (time.perf_counter() - start) / 20 * 1000
+        print(f"{target:>9} points: full-window query {query:6.2f} ms -> {len(xs)} points (level {level}), "
+              f"{build:5.1f} us per append")
+
+
+if __name__ == '__main__':
+    time_queries()
@@ -0,0 +1,115 @@
+# Responsiveness of the GUI event loop while worker threads log 100k messages, most of them the
+# same few errors of a flapping port: the window's ring-buffered log view against appending every
+# message to a QTextEdit (the old log, fed through a queued signal). Lateness of a 10 ms timer
+# on the GUI thread stands in for input and repaint latency. Run from the repository root:
+#   python benchmarks/bench_log_view.py [events]
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal  # noqa: E402
+from PyQt6.QtWidgets import QApplication, QTextEdit  # noqa: E402
+
+import data_acquisition_qt  # noqa: E402
+from logs import configure_logging  # noqa: E402
+
+EVENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+THREADS = 4
+UNIQUE = 0.05  # Share of messages that are all different; the rest repeat
+TICK_MS = 10
+
+
+def rss_mb():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+
+def produce(emit, index, count):
+    rng = random.Random(index)
+    for i in range(count):
+        if rng.random() < UNIQUE:
+            emit(f"Recording error on run_{index}_{i}.bin: [Errno 28] No space left on device")
+        else:
+            emit(f"Serial communication error: [Errno 5] Input/output error on /dev/ttyUSB{rng.randrange(3)}")
+        if i % 100 == 99:
+            time.sleep(0.001)  # Bursts, like engines failing on every tick
+
+
+class Bridge(QObject):
+    message = pyqtSignal(str)
+
+
+def run(app, name, emit, shown_lines):
+    # Start the producers, sample timer lateness until they are done and the view has caught up
+    lateness = []
+    last = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        lateness.append(max(0.0, now - last[0] - TICK_MS / 1000))
+        last[0] = now
+
+    timer = QTimer()
+    timer.timeout.connect(tick)
+    timer.start(TICK_MS)
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=produce, args=(emit, index, EVENTS // THREADS)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        app.processEvents()
+        time.sleep(0.001)
+    produced = time.perf_counter() - started
+    for _ in range(30):  # Let the view take what is still queued
+        app.processEvents()
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    timer.stop()
+    lateness.sort()
+    p99 = lateness[int(len(lateness) * 0.99)] * 1000
+    print(f"  {name:>22}: timer late p50 {lateness[len(lateness) // 2] * 1000:6.1f} ms, p99 {p99:7.1f} ms, "
+          f"max {lateness[-1] * 1000:7.1f} ms; produced in {produced:.2f} s, settled in {elapsed:.2f} s, "
+          f"{shown_lines()} lines shown, RSS {rss_mb() - rss_before:+.1f} MB")
+    return p99
+
+
+def main():
+    app = QApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as directory:
+        configure_logging(os.path.join(directory, 'daq.log'), console=False)
+        worker = logging.getLogger('worker')
+        print(f"{EVENTS} messages from {THREADS} threads ({UNIQUE:.0%} unique), GUI timer every {TICK_MS} ms:")
+
+        # The old log: one QTextEdit.append per message, delivered to the GUI thread by a signal
+        text = QTextEdit()
+        text.setReadOnly(True)
+        text.show()
+        bridge = Bridge()
+        bridge.message.connect(text.append)
+        old_p99 = run(app, "QTextEdit per message", bridge.message.emit, lambda: text.document().blockCount())
+        text.close()
+
+        window = data_acquisition_qt.TemperatureDataAcquisitionSystem()
+        window.show()
+        handler = window.log_handler
+        new_p99 = run(app, "ring-buffered log view", worker.warning, lambda: window.log_text.document().blockCount())
+        print(f"  {handler.records} records: {handler.suppressed} folded into repeat lines, {handler.dropped} "
+              f"dropped before a frame took them; view capped at {data_acquisition_qt.LOG_LINES} lines")
+        log_files = sorted(os.listdir(directory))
+        print(f"  rotating file: {', '.join(log_files)} "
+              f"({sum(os.path.getsize(os.path.join(directory, name)) for name in log_files) / 1e6:.1f} MB)")
+        window.close()
+        logging.shutdown()
+    assert new_p99 < old_p99 and window.log_text.document().blockCount() <= data_acquisition_qt.LOG_LINES
+
+
+if __name__ == '__main__':
+    main()
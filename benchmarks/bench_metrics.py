@@ -0,0 +1,119 @@
+# Overhead of the pipeline instrumentation: the cost of one observation, engine CPU per sample
+# with and without metrics against an unpaced simulated logger (interleaved blocks, medians
+# compared), and the cost of the stats line and of the JSON / Prometheus dumps for a
+# 16-channel station. Run from the repository root:
+#   python benchmarks/bench_metrics.py [seconds]
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from acquisition_engine import AcquisitionEngine  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from metrics import Counter, Histogram, Metrics  # noqa: E402
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+BLOCK = 500  # Samples per block
+ITERATIONS = 10  # One batch frame per sample
+
+
+def observation_cost():
+    histogram = Histogram()
+    counter = Counter()
+    count = 1_000_000
+    start = time.perf_counter()
+    for i in range(count):
+        histogram.observe(i)
+    observe = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        counter.inc()
+    increment = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(count):
+        t = time.perf_counter_ns()
+        histogram.observe(time.perf_counter_ns() - t)
+    timed = (time.perf_counter() - start) / count
+    print(f"histogram observe {observe * 1e9:.0f} ns, counter inc {increment * 1e9:.0f} ns, "
+          f"timed section (two clock reads + observe) {timed * 1e9:.0f} ns")
+    return timed
+
+
+def engine_cost():
+    # Engine CPU per sample against a logger without wire-speed pacing, switching the metrics
+    # on and off between short blocks of samples on the same engine so both see the same load
+    device = FakeArduino(baud=None).start()
+    engine = AcquisitionEngine(device.port, interval=0, iterations=ITERATIONS)
+    metrics = Metrics()
+    engine.instrument(metrics, channel='CH1')
+    histograms = (engine.protocol.round_trip, engine.protocol.parse_latency, engine.averaging_latency)
+    engine.negotiate()
+    plain, instrumented = [], []
+    started = time.monotonic()
+    while time.monotonic() - started < SECONDS:
+        for enabled, costs in ((False, plain), (True, instrumented)):
+            engine.protocol.round_trip, engine.protocol.parse_latency, engine.averaging_latency = (
+                histograms if enabled else (None, None, None))
+            cpu_start = time.thread_time()
+            for _ in range(BLOCK):
+                engine.read_data_average(ITERATIONS)
+            costs.append((time.thread_time() - cpu_start) / BLOCK)
+    engine.stop()
+    device.stop()
+    return statistics.median(plain), statistics.median(instrumented), len(plain), metrics
+
+
+def dump_cost():
+    metrics = Metrics()
+    devices = []
+    for index in range(16):
+        device = FakeArduino(baud=None)
+        devices.append(device)
+        engine = AcquisitionEngine(device.port)
+        engine.instrument(metrics, channel=f'CH{index + 1}')
+        for i in range(1000):
+            engine.protocol.round_trip.observe(10_000_000 + i * 10_000)
+            engine.protocol.parse_latency.observe(5_000)
+            engine.averaging_latency.observe(20_000)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, function in (('stats line', metrics.stats_line), ('JSON', metrics.to_json),
+                               ('Prometheus text', metrics.to_prometheus),
+                               ('write .prom', lambda: metrics.write(os.path.join(directory, 'm.prom')))):
+            start = time.perf_counter()
+            for _ in range(20):
+                text = function()
+            elapsed = (time.perf_counter() - start) / 20
+            size = f", {len(text)} bytes" if text else ""
+            print(f"  {name:>16}: {elapsed * 1000:6.2f} ms{size}")
+    for device in devices:
+        device.port.close()
+        os.close(device.master_fd)
+    return metrics
+
+
+def main():
+    timed = observation_cost()
+
+    plain_cpu, instrumented_cpu, blocks, metrics = engine_cost()
+    print(f"engine, {ITERATIONS} readings per sample, unpaced link, median of {blocks} blocks of {BLOCK} samples each way:")
+    print(f"  without metrics: {plain_cpu * 1e6:6.1f} us CPU/sample")
+    print(f"     with metrics: {instrumented_cpu * 1e6:6.1f} us CPU/sample "
+          f"({(instrumented_cpu / plain_cpu - 1) * 100:+.1f}%)")
+    # Per sample: round trip, parse and averaging, i.e. three timed sections
+    extra = instrumented_cpu - plain_cpu
+    print(f"  micro figures predict {3 * timed * 1e6:.2f} us per sample; measured {extra * 1e6:.2f} us, "
+          f"i.e. {extra * 1000 * 100:.2f}% of one core at 1000 samples/s (a 9600 baud link delivers at most ~220)")
+    print(f"  stats: {metrics.stats_line()}")
+    # Relative to the engine's own cost, with a wide margin (~3% here): a loaded machine
+    # stretches both figures rather than only the difference
+    assert extra < 0.25 * plain_cpu
+
+    print("16 channels, 1000 observations per histogram:")
+    dump_cost()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Reading rate at 9600 baud from a logger that waits for the MAX6675's conversion like the
+# firmware does: one-at-a-time "*S#", pipelined "*S#" and batch frames. The chip, not the link,
+# sets the rate, so pipelining is reported, not relied on. Then the bytes per reading a
+# batch-mode link costs for the readings averaged into one sample, the default included,
+# against plain "*S#" round trips.
+# Run from the repository root: python benchmarks/bench_protocol.py
+import inspect
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from channels import ChannelRegistry  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from protocol import CONVERSION_TIME, MIN_BATCH, SampleProtocol  # noqa: E402
+from serial_reader import FrameReader  # noqa: E402
+
+SAMPLES = 40  # Readings per run; about 9 s each at the chip's rate
+
+
+def run(name, batch_support, window, batch_size=10):
+    device = FakeArduino(batch_support=batch_support, conversion_time=CONVERSION_TIME).start()
+    port = device.port
+    protocol = SampleProtocol(port, FrameReader(port), batch_size=batch_size, window=window)
+    mode = protocol.negotiate()
+    start = time.perf_counter()
+    values = protocol.request_samples(SAMPLES)
+    elapsed = time.perf_counter() - start
+
+    device.stop()
+    rate = len(values) / elapsed
+    print(f"{name:>22} ({mode:>6}): {rate:5.2f} readings/s, "
+          f"{protocol.bytes_per_sample():5.2f} bytes/sample (legacy {protocol.legacy_bytes_per_sample():.2f})")
+    return elapsed, len(values)
+
+
+def link_saving(iterations, samples=40):
+    # Percent of the "*S#" bytes saved when every sample takes `iterations` readings
+    device = FakeArduino().start()
+    protocol = SampleProtocol(device.port, FrameReader(device.port))
+    protocol.negotiate()
+    for _ in range(samples):
+        protocol.request_samples(iterations)
+    device.stop()
+    return (1 - protocol.bytes_per_sample() / protocol.legacy_bytes_per_sample()) * 100
+
+
+def main():
+    print(f"readings/s with a {CONVERSION_TIME * 1000:.0f} ms conversion per reading "
+          f"(at most {1 / CONVERSION_TIME:.2f}/s of fresh readings):")
+    runs = [run('*S# one at a time', batch_support=False, window=1),
+            run('*S# pipelined x4', batch_support=False, window=4),
+            run('batch 10, one at a time', batch_support=True, window=1, batch_size=10),
+            run('batch 10, pipelined x4', batch_support=True, window=4, batch_size=10),
+            run('batch 32, pipelined x2', batch_support=True, window=2, batch_size=32)]
+
+    default = inspect.signature(ChannelRegistry).parameters['iterations'].default
+    print(f"batch-mode link, readings per sample (batch frames from {MIN_BATCH}, default {default}):")
+    savings = {}
+    for iterations in sorted({1, default, MIN_BATCH - 1, MIN_BATCH, 10, 12, 32}):
+        savings[iterations] = link_saving(iterations)
+        print(f"  {iterations:>3}: saving {savings[iterations]:5.1f}% of the \"*S#\" bytes")
+
+    # Every reading is answered, none before the chip converted it (the first one is ready)
+    for elapsed, count in runs:
+        assert count == SAMPLES and elapsed >= (count - 1) * CONVERSION_TIME
+    # Below MIN_BATCH the link is exactly as cheap as "*S#", from there on cheaper
+    for iterations, saving in savings.items():
+        assert saving > 0 if iterations >= MIN_BATCH else abs(saving) < 1e-9
+    assert savings[default] >= 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+# Live fan-out to many subscribers: two simulated loggers sampled every INTERVAL seconds by the
+# real engines and core, drained like the daemon does, first without and then with the publisher
+# serving hundreds of local subscribers from a separate process (as remote dashboards would be):
+# most read everything, some never read (slow consumers), some join half way (catch-up).
+# Compares the acquisition cadence of both phases and reports delivery latency and drops.
+# A last run floods one stalled and one reading subscriber, well past the socket buffers.
+# Run from the repository root:
+#   python benchmarks/bench_publisher.py [subscribers] [seconds]
+import asyncio
+import math
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from acquisition_core import DRAIN_INTERVAL, AcquisitionCore  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from port_discovery import DiscoveredPort  # noqa: E402
+from publisher import (DROP_COUNT, DROPPED, HELLO, MESSAGE, ROWS, SamplePublisher, decode_hello,  # noqa: E402
+                       decode_rows, read_message)
+from timebase import NS_PER_SECOND  # noqa: E402
+
+SUBSCRIBERS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 15.0
+INTERVAL = 0.02
+SLOW_SHARE = 0.05  # Subscribers that connect and never read
+LATE_SHARE = 0.05  # Subscribers that connect half way through
+
+
+class PortInfo:
+    vid = pid = serial_number = None
+
+    def __init__(self, device):
+        self.device = device
+
+
+async def subscribe(port, stats, late):
+    if late:
+        await asyncio.sleep(SECONDS / 2)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    channels = 0
+    first = True
+    while True:
+        received = await read_message(reader)
+        if received is None:
+            break
+        kind, payload = received
+        now = time.time()
+        if kind == HELLO:
+            channels = len(decode_hello(payload)[0])
+        elif kind == ROWS:
+            rows = decode_rows(payload, channels)
+            stats['rows'] += len(rows)
+            if first and late:
+                stats['caught_up'].append(len(rows))
+            elif not first:
+                stats['latency'].extend(now - timestamp for timestamp, _ in rows)
+            first = False
+        elif kind == DROPPED:
+            stats['dropped'] += DROP_COUNT.unpack(payload)[0]
+    writer.close()
+
+
+async def stall(port):
+    # Connects with a tiny receive buffer and never reads
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(('127.0.0.1', port))
+    await asyncio.sleep(SECONDS + 5)
+    sock.close()
+
+
+def subscribers(port, count, results):
+    async def run():
+        slow = int(count * SLOW_SHARE)
+        late = int(count * LATE_SHARE)
+        stats = {'rows': 0, 'latency': [], 'caught_up': [], 'dropped': 0}
+        tasks = [asyncio.ensure_future(stall(port)) for _ in range(slow)]
+        tasks += [asyncio.ensure_future(subscribe(port, stats, index < late)) for index in range(count - slow)]
+        await asyncio.wait(tasks, timeout=SECONDS + 10)
+        latency = sorted(stats['latency'])
+        results.put({'rows': stats['rows'], 'readers': count - slow, 'dropped': stats['dropped'],
+                     'p50': latency[len(latency) // 2], 'p99': latency[int(len(latency) * 0.99)],
+                     'max': latency[-1], 'caught_up': stats['caught_up']})
+    asyncio.run(run())
+
+
+def acquire(core, seconds):
+    # Drain like the daemon; returns (per-channel arrival stamps, drain lateness in seconds, rows)
+    stamps = [[] for _ in core.registry.channels]
+    drain = core.registry.drain
+
+    def tap():
+        samples = drain()
+        for channel, stamp, _ in samples:
+            stamps[channel].append(stamp)
+        return samples
+
+    core.registry.drain = tap
+    lateness = []
+    rows = 0
+    started = time.monotonic()
+    next_poll = started + DRAIN_INTERVAL
+    while time.monotonic() - started < seconds:
+        time.sleep(max(next_poll - time.monotonic(), 0))
+        lateness.append(time.monotonic() - next_poll)
+        next_poll += DRAIN_INTERVAL
+        rows += len(core.poll())
+    core.registry.drain = drain
+    return stamps, lateness, rows
+
+
+def cadence(name, core, stamps, lateness, rows):
+    deviations = sorted(abs((b - a) / NS_PER_SECOND - INTERVAL) * 1000
+                        for channel in stamps for a, b in zip(channel, channel[1:]))
+    rms = math.sqrt(sum(d * d for d in deviations) / len(deviations))
+    lateness.sort()
+    missed = sum(channel.engine.missed_ticks for channel in core.registry.channels)
+    print(f"  {name:>16}: {rows} rows, sample spacing RMS {rms:5.2f} ms p99 {deviations[int(len(deviations) * 0.99)]:5.2f} ms, "
+          f"drain late p99 {lateness[int(len(lateness) * 0.99)] * 1000:5.1f} ms, missed ticks {missed}")
+    return rms, rows
+
+
+def flood(rows=200_000, batch=20):
+    # One subscriber never reads, one reads as fast as it can: the first must stay bounded
+    publisher = SamplePublisher(['CH1', 'CH2'], datetime.now(), '127.0.0.1', 0).start()
+    stalled = socket.create_connection(('127.0.0.1', publisher.port))
+    reading = socket.create_connection(('127.0.0.1', publisher.port))
+    received = {'rows': 0, 'dropped': 0}
+
+    def read():
+        buffer = b''
+        while True:
+            data = reading.recv(1 << 16)
+            if not data:
+                return
+            buffer += data
+            while len(buffer) >= MESSAGE.size:
+                kind, length = MESSAGE.unpack_from(buffer)
+                if len(buffer) < MESSAGE.size + length:
+                    break
+                if kind == ROWS:
+                    received['rows'] += length // 24
+                elif kind == DROPPED:
+                    received['dropped'] += DROP_COUNT.unpack_from(buffer, MESSAGE.size)[0]
+                buffer = buffer[MESSAGE.size + length:]
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    while len(publisher.subscribers) < 2:
+        time.sleep(0.01)
+    for index in range(0, rows, batch):
+        publisher.publish([(time.time(), [20.0, 21.0])] * batch)
+        if index % 2000 == 0:
+            time.sleep(0.001)
+    while publisher.published_rows < rows:
+        time.sleep(0.01)
+    time.sleep(0.5)
+    queued = max(subscriber.queued_rows for subscriber in list(publisher.subscribers))
+    publisher.stop()
+    reader.join(5)
+    stalled.close()
+    reading.close()
+    print(f"flood of {rows} rows: the reader got {received['rows']} (told of {received['dropped']} dropped); "
+          f"{publisher.dropped_rows} rows dropped for the stalled subscriber, {queued} still queued for it")
+    assert 0 < queued <= publisher.client_queue_rows and publisher.dropped_rows > 0
+    assert received['rows'] == rows
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    devices = [FakeArduino(baud=None, seed=i).start() for i in range(2)]
+    core = AcquisitionCore(interval=INTERVAL, recordings_dir=directory,
+                           calibration_file=os.path.join(directory, 'none.json'))
+    core.attach([DiscoveredPort(PortInfo(device.port_name), device.port, 0.0) for device in devices])
+    core.start()
+    print(f"2 loggers every {INTERVAL} s, {SECONDS:.0f} s per phase:")
+    time.sleep(1.0)
+    core.poll()
+    baseline = cadence("no publisher", core, *acquire(core, SECONDS))
+
+    publisher = core.start_publisher('127.0.0.1', 0)
+    for channel in core.registry.channels:
+        channel.engine.missed_ticks = 0
+    results = multiprocessing.get_context('spawn').Queue()
+    child = multiprocessing.get_context('spawn').Process(
+        target=subscribers, args=(publisher.port, SUBSCRIBERS, results))
+    child.start()
+    while len(publisher.subscribers) < SUBSCRIBERS * (1 - LATE_SHARE) and child.is_alive():
+        time.sleep(0.05)
+        core.poll()
+    cpu_start = time.process_time()
+    published = cadence(f"{SUBSCRIBERS} subscribers", core, *acquire(core, SECONDS))
+    cpu = time.process_time() - cpu_start
+    publisher.stop()
+    stats = results.get(timeout=30)
+    child.join(10)
+    core.close()
+    for device in devices:
+        device.stop()
+    shutil.rmtree(directory)
+
+    readers = stats['readers']
+    print(f"  delivery to {readers} readers: {stats['rows'] / readers:.0f} rows each on average, latency p50 "
+          f"{stats['p50'] * 1000:.1f} ms, p99 {stats['p99'] * 1000:.1f} ms, max {stats['max'] * 1000:.1f} ms "
+          f"(row time to receipt, includes the up to {DRAIN_INTERVAL * 1000:.0f} ms drain interval)")
+    print(f"  late joiners caught up with {min(stats['caught_up'])}-{max(stats['caught_up'])} rows of history; "
+          f"readers told of {stats['dropped']} dropped rows")
+    print(f"  {publisher.dropped_rows} rows dropped for {int(SUBSCRIBERS * SLOW_SHARE)} stalled subscribers; "
+          f"station CPU {cpu / SECONDS * 100:.0f}% of one core; {core.metrics.stats_line().split('; ')[0]}")
+    print(f"  publish: {next(part for part in core.stats_line().split('; ') if part.startswith('publish'))}")
+    assert published[0] < baseline[0] + 2.0 and published[1] > 0.9 * baseline[1]
+    assert stats['p99'] < 0.5 and stats['dropped'] == 0
+
+    flood()
+
+
+if __name__ == '__main__':
+    main()
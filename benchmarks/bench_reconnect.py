@@ -0,0 +1,94 @@
+# Recovery from pulled cables: two simulated loggers behind stable symlinks (like udev names),
+# opened with pyserial as discovery does, with the first one unplugged repeatedly for different
+# lengths of time and booting for BOOT_TIME seconds when it comes back. Reports how long the
+# engine takes to notice, to have the logger answering again once it is back, and what the
+# recording shows for the gap. Run from the repository root:
+#   python benchmarks/bench_reconnect.py
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from serial.tools.list_ports_common import ListPortInfo  # noqa: E402
+
+from acquisition_core import AcquisitionCore  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from port_discovery import probe_port  # noqa: E402
+from recorder import read_events, read_recording  # noqa: E402
+from timebase import NS_PER_SECOND  # noqa: E402
+
+INTERVAL = 0.2
+UNPLUGGED = (0.3, 1.0, 2.5, 5.0)  # Seconds without the device, one unplug each
+BOOT_TIME = 1.6  # An Uno's bootloader wait after power-up
+SETTLE = 4.0  # Seconds of normal acquisition between unplugs
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    devices = [FakeArduino(link=os.path.join(directory, f'ttyLOGGER{i}'), seed=i).start() for i in range(2)]
+    found = [probe_port(ListPortInfo(device.port_name), 9600, 3.0) for device in devices]
+    core = AcquisitionCore(interval=INTERVAL, recordings_dir=directory,
+                           calibration_file=os.path.join(directory, 'none.json'))
+    core.attach(found)
+    core.start()
+    engine = core.registry.channels[0].engine
+
+    rows = []
+    events = []
+    back = []  # Monotonic ns at which each unplugged logger had booted and could answer again
+    unplugged_at = []
+
+    def run(seconds):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            time.sleep(0.1)
+            rows.extend(core.poll())
+            events.extend(core.take_events())
+
+    run(SETTLE)
+    for duration in UNPLUGGED:
+        unplugged_at.append(time.monotonic_ns())
+        devices[0].unplug(duration, boot_time=BOOT_TIME)
+        back.append(unplugged_at[-1] + round((duration + BOOT_TIME) * NS_PER_SECOND))
+        run(duration + BOOT_TIME + SETTLE)
+    rows.extend(core.stop())
+    events.extend(core.take_events())
+
+    print(f"CH1 unplugged {len(UNPLUGGED)} times, {BOOT_TIME} s boot after each replug, sampling every {INTERVAL} s:")
+    recoveries = []
+    for duration, pulled, ready, (lost, answering, attempts) in zip(UNPLUGGED, unplugged_at, back, engine.outages):
+        recovery = (answering - ready) / NS_PER_SECOND
+        recoveries.append(recovery)
+        print(f"  unplugged {duration:3.1f} s: noticed after {(lost - pulled) / 1e6:5.0f} ms, answering "
+              f"{recovery:5.2f} s after the logger was ready ({attempts} reopen attempts), "
+              f"gap {(answering - lost) / NS_PER_SECOND:5.2f} s")
+    print(f"  CH1: {engine.link_summary()}")
+    print(f"  stats: {core.stats_line()}")
+
+    # Rows of the outages: CH1 is NaN there, CH2 carries on; no sample was dropped from a queue
+    missing = [sum(1 for row in rows if math.isnan(row[1][channel])) for channel in range(2)]
+    expected = sum((answering - lost) / NS_PER_SECOND / INTERVAL for lost, answering, _ in engine.outages)
+    print(f"  {len(rows)} rows; CH1 missing in {missing[0]} (outages span ~{expected:.0f} slots), "
+          f"CH2 missing in {missing[1]}; dropped from queues: "
+          f"{sum(channel.engine.dropped_samples for channel in core.registry.channels)}")
+    core.close()
+    kinds = [kind for _, kind, _ in events]
+    recorded = read_events(core.recorder.path)
+    rows_on_disk = sum(1 for _ in read_recording(core.recorder.path)[2])
+    print(f"  events: {kinds.count('disconnected')} disconnected, {kinds.count('reconnected')} reconnected; "
+          f"{len(recorded)} in the recording's events file next to {rows_on_disk} rows")
+    for device in devices:
+        device.stop()
+    shutil.rmtree(directory)
+
+    assert len(engine.outages) == len(UNPLUGGED)
+    assert max(recoveries) < 2.0
+    assert kinds.count('reconnected') == len(UNPLUGGED) and len(recorded) == 2 * len(UNPLUGGED)
+
+
+if __name__ == '__main__':
+    main()
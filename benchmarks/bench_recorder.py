@@ -0,0 +1,106 @@
+# Write amplification and CPU cost per 1M samples for the streaming recorder (binary and CSV),
+# next to the old save_data loop. The "SIMPAN DATA" export from each recording is timed too and
+# checked against the same export done row by row through BatchAverager.
+# Run from the repository root: python benchmarks/bench_recorder.py
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from batch_stats import BatchAverager  # noqa: E402
+from recorder import FORMAT_BINARY, FORMAT_CSV, SampleRecorder, export_batch_csv, read_recording  # noqa: E402
+from timebase import NS_PER_SECOND, Timebase  # noqa: E402
+
+SAMPLES = 1_000_000
+BATCH_VALUE = 10
+
+
+def bench_recorder(directory, record_format):
+    start_time = datetime(2026, 1, 1)
+    path = os.path.join(directory, f"run.{record_format}")
+    recorder = SampleRecorder(path, ['CH1'], start_time, record_format=record_format,
+                              timebase=Timebase.from_wall(start_time))
+    recorder.start()
+
+    rows = [(i * NS_PER_SECOND, [random.uniform(20, 30)]) for i in range(SAMPLES)]
+    wall_start = time.perf_counter()
+    caller_cpu = time.thread_time()
+    for timestamp, values in rows:
+        recorder.record(timestamp, values)
+    caller_cpu = time.thread_time() - caller_cpu
+    recorder.stop()
+    wall = time.perf_counter() - wall_start
+
+    size = os.path.getsize(path)
+    print(f"{record_format:>4}: {wall:5.2f} s wall, caller CPU {caller_cpu:5.2f} s, writer CPU {recorder.cpu_time:5.2f} s, "
+          f"{size / 1e6:5.1f} MB on disk, {size / recorder.payload_bytes():4.2f}x payload, "
+          f"{recorder.write_calls} writes, {recorder.fsync_calls} fsyncs")
+
+    export_path = os.path.join(directory, f"export_{record_format}.csv")
+    export_start = time.perf_counter()
+    points = export_batch_csv(path, export_path, BATCH_VALUE, start_time)
+    export_seconds = time.perf_counter() - export_start
+    row_start = time.perf_counter()
+    expected = export_row_by_row(path, BATCH_VALUE, start_time)
+    row_seconds = time.perf_counter() - row_start
+    print(f"      export to SIMPAN DATA CSV: {export_seconds:5.2f} s ({points} points), "
+          f"row by row through BatchAverager {row_seconds:5.2f} s")
+    with open(export_path) as file:
+        file.readline()
+        exported = [line.rstrip('\n').split(',') for line in file]
+    assert len(exported) == len(expected)
+    for (interval, temp), (expected_interval, expected_temp) in zip(exported, expected):
+        assert float(interval) == expected_interval and abs(float(temp) - expected_temp) <= 0.005 + 1e-9
+    return export_seconds, row_seconds
+
+
+def export_row_by_row(path, batch_value, start_time):
+    # What the export computed before it worked on arrays: every row through BatchAverager
+    _, _, rows = read_recording(path)
+    start = start_time.timestamp()
+    batches = BatchAverager(batch_value)
+    points = []
+    for timestamp, values in rows:
+        batch_index, stats = batches.add(values)
+        point = (round(timestamp - start, 6), stats[0].mean)
+        if len(points) <= batch_index:
+            points.append(point)
+        else:
+            points[batch_index] = point
+    assert not any(math.isnan(temp) for _, temp in points)
+    return points
+
+
+def bench_legacy_save(directory):
+    # The old save_data: batch averages only, one f-string write per row at the end of the run
+    plot_data = [(float(i * 10), random.uniform(20, 30)) for i in range(SAMPLES // 10)]
+    path = os.path.join(directory, "legacy.csv")
+    start = time.perf_counter()
+    cpu = time.process_time()
+    with open(path, "w") as file:
+        file.write("Waktu (s),Temperatur (Celcius)\n")
+        for interval, temp in plot_data:
+            file.write(f"{interval},{temp:.2f}\n")
+    print(f"legacy save (batch averages only, nothing on disk until the end): "
+          f"{time.perf_counter() - start:5.2f} s wall, {time.process_time() - cpu:5.2f} s CPU, "
+          f"{os.path.getsize(path) / 1e6:5.1f} MB")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        exports = {record_format: bench_recorder(directory, record_format)
+                   for record_format in (FORMAT_BINARY, FORMAT_CSV)}
+        bench_legacy_save(directory)
+    # Parsing the text of a CSV recording dominates its export; the binary default is quick.
+    # The times are reported above; only which way is faster is checked, as a loaded machine
+    # slows both (3x to 7x apart here).
+    assert all(export_seconds < row_seconds for export_seconds, row_seconds in exports.values())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Replays a large recording as fast as possible through averaging and the live plot (Agg),
+# and measures open time, seek latency and memory. Run from the repository root:
+#   python benchmarks/bench_replay.py [rows]
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from batch_stats import BatchAverager  # noqa: E402
+from live_plot import LivePlot  # noqa: E402
+from recorder import HEADER, MAGIC, VERSION, record_struct  # noqa: E402
+from replay import ReplaySource  # noqa: E402
+from timebase import NS_PER_SECOND  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+BATCH_VALUE = 10
+
+
+def write_recording(path, rows):
+    # Same layout SampleRecorder writes, generated in bulk
+    start = datetime(2026, 1, 1).timestamp()
+    record = record_struct(1)
+    with open(path, 'wb') as file:
+        names = b'["CH1"]'
+        file.write(HEADER.pack(MAGIC, VERSION, 1, start, len(names)) + names)
+        chunk = []
+        for i in range(rows):
+            chunk.append(record.pack(start + i, 25 + random.uniform(-2, 2)))
+            if len(chunk) == 65536:
+                file.write(b''.join(chunk))
+                chunk = []
+        file.write(b''.join(chunk))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'run.bin')
+        write_recording(path, ROWS)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        start = time.perf_counter()
+        replay = ReplaySource(path, speed=None)
+        print(f"{ROWS} rows ({os.path.getsize(path) / 1e6:.0f} MB): opened in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        seeks = []
+        for _ in range(1000):
+            target = replay.start_time.timestamp() + random.uniform(0, ROWS)
+            seek_start = time.perf_counter()
+            replay.view.position_at(target)
+            seeks.append(time.perf_counter() - seek_start)
+        seeks.sort()
+        print(f"seek by timestamp: median {seeks[500] * 1e6:.1f} us, p99 {seeks[990] * 1e6:.1f} us")
+
+        figure = Figure()
+        canvas = FigureCanvasAgg(figure)
+        plot = LivePlot(figure, canvas, figure.add_subplot(111), fps=10)
+        plot.set_channels(['CH1'])
+        batches = BatchAverager(BATCH_VALUE)
+
+        replay.start()
+        start = time.perf_counter()
+        rows = 0
+        frames = []
+        while not replay.is_finished():
+            for timestamp, values in replay.drain():
+                elapsed = (timestamp - replay.timebase.monotonic_ns) / NS_PER_SECOND
+                batch_index, stats = batches.add(values)
+                plot.update_point(batch_index, elapsed, [stats[0].mean])
+                rows += 1
+            frame_start = time.perf_counter()
+            if plot.render():
+                frames.append(time.perf_counter() - frame_start)
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        replay.stop()
+
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        frames.sort()
+        print(f"replayed {rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s), "
+              f"{len(frames)} frames, median {frames[len(frames) // 2] * 1000:.1f} ms, "
+              f"max {frames[-1] * 1000:.1f} ms")
+        print(f"peak RSS grew by {(rss_after - rss_before) / 1024:.0f} MB while replaying")
+
+
+if __name__ == '__main__':
+    main()
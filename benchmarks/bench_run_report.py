@@ -0,0 +1,152 @@
+# Bulk run summaries over a generated archive of RUNS one-hour runs at 1 Hz, two channels each:
+# binary recordings, CSV recordings and "SIMPAN DATA" exports of the binary ones in equal parts,
+# with ramps, missing readings and the odd gap. Times the whole report with 1, 2, 4, ... worker processes
+# up to the CPU count and checks every worker count writes the same file. Also compares the
+# vectorized loading with reading the same runs row by row through read_recording and
+# BatchAverager, and checks the batch averages against both BatchAverager and the exports.
+# Empty and cut-off recordings, as a crash leaves them, must be skipped without ending the report.
+# Run from the repository root:
+#   python benchmarks/bench_run_report.py [runs]
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from batch_stats import BatchAverager  # noqa: E402
+from recorder import binary_header, export_batch_csv, read_recording  # noqa: E402
+from run_report import batch_means, find_runs, load_run, summarize_runs, write_report  # noqa: E402
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+ROWS = 3600
+BATCH_VALUE = 10
+NAMES = ['CH1', 'CH2']
+ROW_BY_ROW_RUNS = 60  # Runs also read the row-by-row way; that is slow enough without all of them
+
+
+def generate(directory, runs):
+    rng = np.random.default_rng(1)
+    start = datetime(2026, 1, 1).timestamp()
+    for run in range(runs):
+        times = start + run * 7200 + np.arange(ROWS, dtype=float)
+        if run % 5 == 0:
+            times[ROWS // 2:] += 30  # The logger was unplugged for half a minute
+        ramp = np.minimum(np.arange(ROWS) / 10, rng.uniform(80, 200))  # Heat up, then hold
+        values = np.column_stack([25 + ramp + rng.normal(0, 0.3, ROWS), 25 + 0.8 * ramp + rng.normal(0, 0.3, ROWS)])
+        values[rng.random((ROWS, 2)) < 0.002] = np.nan  # Readings the sensor missed
+        data = np.column_stack([times, values])
+        if run % 3 == 0:
+            with open(os.path.join(directory, f"run_{run:05d}.bin"), 'wb') as file:
+                file.write(binary_header(NAMES, datetime.fromtimestamp(times[0])))
+                data.astype('<f8').tofile(file)
+        elif run % 3 == 1:
+            np.savetxt(os.path.join(directory, f"run_{run:05d}.csv"), data, fmt=['%.6f', '%.17g', '%.17g'],
+                       delimiter=',', header="timestamp,CH1,CH2", comments='')
+        else:
+            # What QA saves by hand: the batch averages of the binary run two before
+            export_batch_csv(os.path.join(directory, f"run_{run - 2:05d}.bin"),
+                             os.path.join(directory, f"export_{run - 2:05d}.csv"), BATCH_VALUE)
+
+
+def row_by_row(path):
+    # The per-row path the app itself exports with: every row through BatchAverager
+    names, _, rows = read_recording(path)
+    batches = BatchAverager(BATCH_VALUE, len(names))
+    means = []
+    for _, values in rows:
+        index, stats = batches.add(values)
+        point = [item.mean for item in stats]
+        if len(means) <= index:
+            means.append(point)
+        else:
+            means[index] = point
+    return np.array(means)
+
+
+def all_batch_means(path):
+    values = load_run(path)[3]
+    return np.column_stack([batch_means(values[:, channel], BATCH_VALUE) for channel in range(values.shape[1])])
+
+
+def write_broken(directory, good):
+    # What a crash can leave in the recordings directory: nothing, part of the header, part of
+    # the channel names, an empty CSV
+    with open(good, 'rb') as file:
+        data = file.read()
+    cuts = {'empty.bin': 0, 'cut_header.bin': 10, 'cut_names.bin': len(binary_header(NAMES, datetime.now())) - 3}
+    paths = []
+    for name, size in cuts.items():
+        paths.append(os.path.join(directory, name))
+        with open(paths[-1], 'wb') as file:
+            file.write(data[:size])
+    paths.append(os.path.join(directory, 'empty.csv'))
+    open(paths[-1], 'w').close()
+    return paths
+
+
+def main():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    directory = tempfile.mkdtemp()
+    started = time.perf_counter()
+    generate(directory, RUNS)
+    paths = find_runs(directory)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"generated {len(paths)} runs ({size / 1e6:.0f} MB) in {time.perf_counter() - started:.0f} s; "
+          f"{cpus} CPUs available")
+
+    counts = sorted({1, 2, cpus} | {2 ** power for power in range(8) if 2 ** power <= cpus})
+    timings = {}
+    reports = {}
+    for workers in counts:
+        started = time.perf_counter()
+        rows = summarize_runs(paths, BATCH_VALUE, workers)
+        out_path = os.path.join(directory, f"summary_{workers}.txt")
+        write_report(rows, out_path, directory)
+        timings[workers] = time.perf_counter() - started
+        with open(out_path) as file:
+            reports[workers] = file.read()
+        speedup = timings[1] / timings[workers]
+        print(f"  {workers:>3} workers: {timings[workers]:6.2f} s, {len(paths) / timings[workers]:6.0f} runs/s, "
+              f"{size / timings[workers] / 1e6:6.0f} MB/s, {speedup:.2f}x, "
+              f"{speedup / min(workers, cpus) * 100:.0f}% of linear on {min(workers, cpus)} CPUs")
+
+    # The same runs row by row, and the batch averages both ways
+    sample = [path for path in paths if not os.path.basename(path).startswith('export_')][:ROW_BY_ROW_RUNS]
+    started = time.perf_counter()
+    expected = [row_by_row(path) for path in sample]
+    row_seconds = (time.perf_counter() - started) / len(sample)
+    started = time.perf_counter()
+    summarize_runs(sample, BATCH_VALUE)
+    vector_seconds = (time.perf_counter() - started) / len(sample)
+    print(f"  the same {len(sample)} recordings row by row through read_recording and BatchAverager, batch "
+          f"averages only: {row_seconds * 1000:.1f} ms per run; the report, all statistics: "
+          f"{vector_seconds * 1000:.1f} ms per run ({row_seconds / vector_seconds:.0f}x)")
+    for path, means in zip(sample, expected):
+        assert np.allclose(all_batch_means(path), means, rtol=1e-12, equal_nan=True)
+    exports = [path for path in paths if os.path.basename(path).startswith('export_')]
+    for path in exports:
+        recorded = all_batch_means(path.replace('export_', 'run_').replace('.csv', '.bin'))
+        exported = load_run(path)[3]
+        assert np.array_equal(np.isnan(exported), np.isnan(recorded))
+        assert np.nanmax(np.abs(exported - recorded)) <= 0.005 + 1e-9  # Exports are rounded to 0.01
+    print(f"  batch averages match BatchAverager on {len(sample)} runs and all {len(exports)} exports")
+    broken = write_broken(directory, sample[0])
+    skipped = summarize_runs(broken + sample[:1], BATCH_VALUE)
+    print(f"  {len(broken)} empty or cut-off recordings skipped, {len(skipped)} rows from the good one")
+    shutil.rmtree(directory)
+
+    assert len(set(reports.values())) == 1
+    assert len(skipped) == len(NAMES)
+    assert reports[1].count('\n') == 1 + 2 * len(paths)
+    # Scaling over workers is only reported: on a shared or loaded machine it says more about
+    # the neighbours than about the pool. Vectorised is ~5x faster here; only its order is checked.
+    assert row_seconds > vector_seconds
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Compare the old busy-spin readline against FrameReader over a pty loopback.
+# Run from the repository root: python benchmarks/bench_serial_reader.py
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_arduino import PtyPort  # noqa: E402
+from serial_reader import FrameReader  # noqa: E402
+
+REQUESTS = 500
+DEVICE_DELAY = 0.002  # Time the fake Arduino needs to answer one request
+
+
+def responder(master_fd, stop):
+    # Answer every "*S#" with a temperature frame after a short delay
+    pending = b''
+    while not stop.is_set():
+        try:
+            pending += os.read(master_fd, 1024)
+        except OSError:
+            return
+        while b'#' in pending:
+            _, pending = pending.split(b'#', 1)
+            time.sleep(DEVICE_DELAY)
+            os.write(master_fd, b'*123#\n')
+
+
+def legacy_readline(serial_conn, timeout=0.3):
+    # The DataReaderWorker.non_blocking_readline implementation this replaces
+    end_time = time.time() + timeout
+    line = bytearray()
+    while time.time() < end_time:
+        if serial_conn.in_waiting > 0:
+            char = serial_conn.read(1)
+            line += char
+            if char == b'\n':
+                break
+    return line.decode('utf-8').strip()
+
+
+def run(name, read_one):
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    stop = threading.Event()
+    thread = threading.Thread(target=responder, args=(master_fd, stop), daemon=True)
+    thread.start()
+    port = PtyPort(slave_fd)
+    reader = FrameReader(port)
+
+    ok = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    for _ in range(REQUESTS):
+        port.write(b'*S#')
+        if read_one(port, reader):
+            ok += 1
+    cpu = time.thread_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    stop.set()
+    port.close()
+    os.close(master_fd)
+    print(f"{name:>14}: {ok}/{REQUESTS} frames, {REQUESTS / wall:8.1f} frames/s, "
+          f"CPU {cpu / REQUESTS * 1e6:8.1f} us/frame, CPU load {cpu / wall * 100:5.1f}%")
+    return reader
+
+
+def main():
+    run('legacy', lambda port, reader: legacy_readline(port).startswith('*'))
+    reader = run('FrameReader', lambda port, reader: reader.read_frame() is not None)
+    stats = reader.stats()
+    print(f"FrameReader counters: {stats['bytes_per_sec']:.0f} B/s, "
+          f"{stats['frames_per_sec']:.1f} frames/s, {stats['cpu_per_frame_us']:.1f} us CPU/frame")
+
+
+if __name__ == '__main__':
+    main()
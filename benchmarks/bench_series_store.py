@@ -0,0 +1,171 @@
+# Range queries on a large time-series store: builds a database of SAMPLES samples (CHANNELS
+# loggers at 1 Hz, ending now) through the same insert path as the live store, rollups
+# included, then times typical dashboard and report queries against it, each read from the
+# coarsest rollup level that answers it, and compares the 30-day one with a raw-sample scan.
+# Also times a live commit (one row) on the full database, and pruning old raw samples from a
+# small store, checking the minute series are unchanged by it. Timings are with a warm page cache.
+# Run from the repository root:
+#   python benchmarks/bench_series_store.py [samples] [database to keep and reuse]
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from series_store import SeriesDatabase, level_for  # noqa: E402
+
+SAMPLES = int(float(sys.argv[1])) if len(sys.argv) > 1 else 100_000_000
+CHANNELS = 4
+INTERVAL = 1.0
+CHUNK_ROWS = 3600  # Rows per transaction while building, an hour of data
+REPEAT = 20
+DAY = 86400
+NAMES = [f"CH{index + 1}" for index in range(CHANNELS)]
+
+
+def build(path, samples):
+    rows = samples // CHANNELS
+    end = math.floor(time.time())
+    start = end - rows * INTERVAL
+    # Daily cycle plus a few tenths of noise, from tables so generating is not the bottleneck
+    cycle = [25.0 + 5.0 * math.sin(2 * math.pi * second / DAY) for second in range(DAY)]
+    noise = [((index * 7919) % 101 - 50) / 100 for index in range(1009)]
+    build_start = time.perf_counter()
+    written = 0
+    with SeriesDatabase(path) as database:
+        for first in range(0, rows, CHUNK_ROWS):
+            chunk = []
+            for index in range(first, min(first + CHUNK_ROWS, rows)):
+                timestamp = start + index * INTERVAL
+                base = cycle[int(timestamp) % DAY]
+                values = [base + channel + noise[(index + 97 * channel) % 1009] for channel in range(CHANNELS)]
+                if index % 1000 == 0:
+                    values[-1] = math.nan  # The last logger misses a sample now and then
+                chunk.append((timestamp, values))
+            written += database.insert(NAMES, chunk)
+            if first // CHUNK_ROWS % 500 == 0:
+                elapsed = time.perf_counter() - build_start
+                print(f"  {written:>11} samples, {written / max(elapsed, 1e-9) / 1e6:.2f} M/s", end='\r', flush=True)
+    elapsed = time.perf_counter() - build_start
+    print(f"built {written} samples ({rows} rows x {CHANNELS} channels, {rows * INTERVAL / DAY:.0f} days) in "
+          f"{elapsed:.0f} s, {written / elapsed / 1e3:.0f} k samples/s with rollups; "
+          f"{os.path.getsize(path) / 1e9:.2f} GB, {os.path.getsize(path) / written:.1f} bytes per sample")
+
+
+def timed(function, repeat=REPEAT):
+    # (result, first call in ms, median of the rest in ms)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    rest = sorted(times[1:]) or times
+    return result, times[0], rest[len(rest) // 2]
+
+
+def same(rollup, raw):
+    # Bucket by bucket: counts, min and max exactly, means to rounding
+    return len(rollup) == len(raw) and all(
+        a[:2] == b[:2] and a[3:] == b[3:] and math.isclose(a[2], b[2], rel_tol=1e-12) for a, b in zip(rollup, raw))
+
+
+def main():
+    keep = sys.argv[2] if len(sys.argv) > 2 else None
+    directory = None
+    if keep:
+        path = keep
+    else:
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'series.sqlite')
+    if not os.path.exists(path):
+        build(path, SAMPLES)
+
+    database = SeriesDatabase(path, readonly=True)
+    first, last = database.time_range('CH1')
+    end = last + 1
+    print(f"queries on CH1 (median of {REPEAT - 1} after the first call):")
+    queries = [
+        ("last hour per second", end - 3600, 1),
+        ("last day per 10 s", end - DAY, 10),
+        ("last day per minute", end - DAY, 60),
+        ("last 30 days per minute", end - 30 * DAY, 60),
+        ("last 30 days per hour", end - 30 * DAY, 3600),
+        ("everything per day", first, DAY),
+    ]
+    results = {}
+    for name, start, step in queries:
+        rows, cold, warm = timed(lambda: database.series('CH1', start, end, step))
+        results[name] = (rows, warm)
+        print(f"  {name:>24}: {warm:7.2f} ms (first {cold:7.2f} ms), {len(rows):>6} buckets "
+              f"from the {level_for(step) or 'raw'} s level")
+
+    # Summaries over ranges that do not start or end on a whole hour, minute or second
+    for name, start in (("last 30 days", end - 30 * DAY - 1234.5), ("everything", first)):
+        stats, cold, warm = timed(lambda: database.summary('CH1', start, end - 0.25))
+        pieces = SeriesDatabase.pieces(start, end - 0.25)
+        print(f"  {'summary of ' + name:>24}: {warm:7.2f} ms (first {cold:7.2f} ms), {len(pieces)} ranges, "
+              f"n={stats[0]} mean {stats[1]:.3f} min {stats[2]:.2f} max {stats[3]:.2f}")
+    brute, _, brute_ms = timed(lambda: database.connection.execute(
+        'SELECT count(*), avg(value), min(value), max(value) FROM samples WHERE channel = ? AND time >= ? AND time < ?',
+        (database.find_channel('CH1'), end - 30 * DAY - 1234.5, end - 0.25)).fetchone(), repeat=3)
+    summary = database.summary('CH1', end - 30 * DAY - 1234.5, end - 0.25)
+
+    # The same per-minute query answered from the raw samples
+    raw, _, raw_ms = timed(lambda: database.series('CH1', end - 30 * DAY, end, 60, level=0), repeat=3)
+    minutes, minutes_ms = results["last 30 days per minute"]
+    print(f"  last 30 days per minute from raw samples: {raw_ms:.0f} ms, {raw_ms / minutes_ms:.0f}x slower; "
+          f"30-day summary by scanning: {brute_ms:.0f} ms")
+    database.close()
+
+    # A live commit: one row of every channel, rollups included, on the full database. Written
+    # under other channel names so the built data (and a kept database) stays as it was.
+    commits = []
+    with SeriesDatabase(path) as writer:
+        for index in range(200):
+            row = [(end + index * INTERVAL, [25.0] * CHANNELS)]
+            start = time.perf_counter()
+            writer.insert([f"LIVE{channel + 1}" for channel in range(CHANNELS)], row)
+            commits.append((time.perf_counter() - start) * 1000)
+    commits.sort()
+    print(f"live commit of one row x {CHANNELS} channels: p50 {commits[len(commits) // 2]:.2f} ms, "
+          f"p99 {commits[int(len(commits) * 0.99)]:.2f} ms")
+    pruned, kept_minutes = bench_prune(os.path.dirname(path) if directory else tempfile.gettempdir())
+    if directory:
+        shutil.rmtree(directory)
+
+    assert same(minutes, raw)
+    assert summary[0] == brute[0] and summary[2:4] == brute[2:4] and math.isclose(summary[1], brute[1], rel_tol=1e-12)
+    assert minutes_ms < 100 and raw_ms > 10 * minutes_ms
+    assert commits[len(commits) // 2] < 10
+    assert pruned and kept_minutes
+
+
+def bench_prune(directory, days=3, keep_days=1):
+    # A few days of one logger, pruned down to the last day of raw samples
+    path = os.path.join(directory, 'prune.sqlite')
+    end = math.floor(time.time() / 60) * 60
+    start = end - days * DAY
+    with SeriesDatabase(path) as database:
+        for first in range(start, end, CHUNK_ROWS):
+            database.insert(['SN1'], [(timestamp, [25.0 + timestamp % 7]) for timestamp in range(first, first + CHUNK_ROWS)],
+                            ['CH1'])
+        before = database.series('CH1', start, end, 60)
+        cutoff = end - keep_days * DAY
+        prune_start = time.perf_counter()
+        dropped = database.prune(cutoff)
+        prune_ms = (time.perf_counter() - prune_start) * 1000
+        raw_left = database.connection.execute('SELECT count(*), min(time) FROM samples').fetchone()
+        seconds_left = database.connection.execute('SELECT min(start) FROM rollups WHERE level = 1').fetchone()[0]
+        after = database.series('CH1', start, end, 60)
+    os.remove(path)
+    print(f"pruned {dropped} of {days * DAY} samples older than {days - keep_days} days in {prune_ms:.0f} ms; "
+          f"{raw_left[0]} raw samples left, minute series unchanged: {after == before}")
+    return (dropped == (days - keep_days) * DAY and raw_left == (keep_days * DAY, cutoff)
+            and seconds_left == cutoff), after == before
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Startup time and idle memory of a logging station, headless daemon vs. Qt window, both
+# acquiring from the same simulated logger. Startup is measured from process launch until
+# the engines are running; RSS is read after the station has been acquiring for a while.
+# Run from the repository root:
+#   python benchmarks/bench_startup.py [runs]
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from fake_arduino import FakeArduino  # noqa: E402
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+SETTLE = 3.0  # Seconds of acquisition before RSS is read
+
+# Same steps as pressing MULAI, minus discovery (the port is given explicitly, as for the daemon)
+GUI_DRIVER = """
+import sys
+from PyQt6.QtWidgets import QApplication
+import data_acquisition_qt
+from acquisition_core import open_ports
+app = QApplication(sys.argv)
+window = data_acquisition_qt.TemperatureDataAcquisitionSystem()
+window.core.interval = 0.1
+window.show()
+app.processEvents()
+window.on_connection_success(open_ports([sys.argv[1]], 9600, 5.0))
+app.processEvents()
+print("ready", flush=True)
+app.exec()
+"""
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as file:
+        for line in file:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def measure(command, ready_prefix, env):
+    started = time.monotonic()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    for line in process.stdout:
+        if line.startswith(ready_prefix):
+            break
+    startup = time.monotonic() - started
+    time.sleep(SETTLE)
+    rss = rss_mb(process.pid)
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    return startup, rss
+
+
+def main():
+    device = FakeArduino().start()
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+        modes = {
+            'headless': ([sys.executable, '-m', 'acquisition_core', '--port', device.port_name, '--interval', '0.1',
+                          '--status-every', '0', '--dir', home], 'Acquiring'),
+            'gui': ([sys.executable, '-c', GUI_DRIVER, device.port_name], 'ready'),
+        }
+        results = {}
+        for name, (command, ready_prefix) in modes.items():
+            runs = [measure(command, ready_prefix, env) for _ in range(RUNS)]
+            startup = sorted(run[0] for run in runs)[len(runs) // 2]
+            rss = sorted(run[1] for run in runs)[len(runs) // 2]
+            results[name] = (startup, rss)
+            print(f"{name:>8}: startup {startup * 1000:7.0f} ms, RSS while acquiring {rss:6.1f} MB (median of {RUNS})")
+    device.stop()
+
+    headless, gui = results['headless'], results['gui']
+    print(f"headless saves {(gui[0] - headless[0]) * 1000:.0f} ms of startup "
+          f"({gui[0] / headless[0]:.1f}x) and {gui[1] - headless[1]:.1f} MB of RSS ({gui[1] / headless[1]:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# Sample timestamps taken by the reader when a frame completes, against stamping when the
+# consumer gets to a sample (what handle_data_ready used to do with datetime.now()), while the
+# consumer stalls the way a busy GUI thread does; and the device clock drift estimated from
+# "*T#" probes against simulated loggers whose clocks run fast and slow. Halfway through, the
+# wall clock is stepped back (as NTP or someone setting the clock would) and the samples mapped
+# through the run's Timebase are checked to stay in order. Run from the repository root:
+#   python benchmarks/bench_timestamps.py [seconds]
+import math
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from acquisition_engine import AcquisitionEngine  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from timebase import NS_PER_SECOND, Timebase  # noqa: E402
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+INTERVAL = 0.1
+DRIFTS_PPM = (500.0, -150.0)
+STALL_EVERY = 1.0  # Seconds between consumer stalls, on average
+STALLS = (0.1, 0.6)  # Shortest and longest stall, seconds
+WALL_STEP = -30.0  # Seconds the wall clock is stepped by halfway through
+
+
+def spacing_stats(stamps):
+    # Deviation of consecutive sample spacing from the nominal interval, in ms
+    deviations = sorted(abs((b - a) / NS_PER_SECOND - INTERVAL) * 1000 for a, b in zip(stamps, stamps[1:]))
+    rms = math.sqrt(sum(d * d for d in deviations) / len(deviations))
+    return rms, deviations[int(len(deviations) * 0.99)], deviations[-1]
+
+
+def drift_tolerance(clock, scatter_ms):
+    # Five standard errors of the fitted rate, in ppm, from the probes' span and scatter, so a
+    # short run is held to what its probes can tell; never tighter than 20 ppm
+    hosts = [host / NS_PER_SECOND for host, _, _ in clock.probes]
+    mean = sum(hosts) / len(hosts)
+    spread = math.sqrt(sum((host - mean) ** 2 for host in hosts))
+    return max(20.0, 5 * scatter_ms / 1000 / spread * 1e6)
+
+
+def main():
+    rng = random.Random(1)
+    devices = [FakeArduino(clock_drift_ppm=ppm, seed=i).start() for i, ppm in enumerate(DRIFTS_PPM)]
+    engines = [AcquisitionEngine(device.port, interval=INTERVAL, iterations=2, clock_probe_interval=0.2)
+               for device in devices]
+    for engine in engines:
+        engine.start()
+
+    arrival = [[] for _ in engines]  # Stamped by the reader
+    consumed = [[] for _ in engines]  # Stamped when the consumer drained the sample
+    wall_consumed = []  # time.time() when the consumer drained a sample of the first logger
+    timebase = Timebase()  # Read once at the start of the run, as AcquisitionCore does
+    real_time, real_time_ns = time.time, time.time_ns
+    step = mock.patch.multiple(time, time=lambda: real_time() + WALL_STEP,
+                               time_ns=lambda: real_time_ns() + round(WALL_STEP * NS_PER_SECOND))
+    stepped = False
+    stalls = 0
+    started = time.monotonic()
+    while time.monotonic() - started < DURATION:
+        if not stepped and time.monotonic() - started >= DURATION / 2:
+            step.start()  # From here on every wall-clock read is WALL_STEP seconds off
+            stepped = True
+        if rng.random() < 0.05 / STALL_EVERY:
+            time.sleep(rng.uniform(*STALLS))  # A slow redraw, a modal dialog, a GC pause
+            stalls += 1
+        else:
+            time.sleep(0.05)
+        for index, engine in enumerate(engines):
+            for stamp, _ in engine.drain():
+                arrival[index].append(stamp)
+                consumed[index].append(time.monotonic_ns())
+                if index == 0:
+                    wall_consumed.append(time.time())
+    step.stop()
+    for engine in engines:
+        engine.stop()
+    for device in devices:
+        device.stop()
+
+    print(f"{DURATION:.0f} s at {INTERVAL} s per sample, consumer stalled {stalls} times for "
+          f"{STALLS[0]}-{STALLS[1]} s; deviation of sample spacing from {INTERVAL} s:")
+    for name, stamps in (('stamped on arrival', arrival[0]), ('stamped when consumed', consumed[0])):
+        rms, p99, worst = spacing_stats(stamps)
+        print(f"  {name:>22}: RMS {rms:6.1f} ms, p99 {p99:6.1f} ms, max {worst:6.1f} ms ({len(stamps)} samples)")
+    arrival_rms = spacing_stats(arrival[0])[0]
+    consumed_rms = spacing_stats(consumed[0])[0]
+    assert arrival_rms < 10 and consumed_rms > 5 * arrival_rms
+
+    print("device clock drift from *T# probes:")
+    for engine, ppm in zip(engines, DRIFTS_PPM):
+        estimate, scatter, probes = engine.clock.estimate()
+        tolerance = drift_tolerance(engine.clock, scatter)
+        print(f"  configured {ppm:+6.0f} ppm: estimated {estimate:+7.1f} ppm (allowed +-{tolerance:.0f}), "
+              f"scatter {scatter:.2f} ms, {probes} probes; {engine.link_summary()}")
+        assert abs(estimate - ppm) < tolerance
+
+    # The wall clock was stepped halfway through: samples mapped through the run's Timebase
+    # keep their order and spacing, stamps read from the wall clock jump with it
+    mapped = [timebase.wall_time(stamp) for stamp in arrival[0]]
+    monotonic_span = (arrival[0][-1] - arrival[0][0]) / NS_PER_SECOND
+    wall_jump = min(b - a for a, b in zip(wall_consumed, wall_consumed[1:]))
+    print(f"wall clock stepped by {WALL_STEP:+.0f} s halfway: stamps read from it jumped {wall_jump:+.3f} s; "
+          f"samples through the Timebase span {mapped[-1] - mapped[0]:.3f} s "
+          f"({monotonic_span:.3f} s of monotonic time), all in order: "
+          f"{all(a < b for a, b in zip(mapped, mapped[1:]))}")
+    assert wall_jump < WALL_STEP / 2
+    assert all(a < b for a, b in zip(mapped, mapped[1:]))
+    assert abs(mapped[-1] - mapped[0] - monotonic_span) < 1e-6
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Headless soak test of the real acquisition stack against misbehaving simulated loggers.
+# Reports throughput, read latency percentiles and memory growth at every interval.
+# Run from the repository root, e.g. for two hours:
+#   python benchmarks/soak_acquisition.py --devices 4 --duration 7200 --drop 0.01 --garble 0.01
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from batch_stats import BatchAverager  # noqa: E402
+from channels import ChannelRegistry, SampleStore  # noqa: E402
+from fake_arduino import FakeArduino  # noqa: E402
+from recorder import SampleRecorder  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def rss_mb():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * resource.getpagesize() / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=60.0, help="seconds to run")
+    parser.add_argument('--report-every', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=0.1, help="engine sample interval")
+    parser.add_argument('--iterations', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--drop', type=float, default=0.0)
+    parser.add_argument('--garble', type=float, default=0.0)
+    parser.add_argument('--disconnect-every', type=float, default=None)
+    parser.add_argument('--disconnect-for', type=float, default=1.0)
+    args = parser.parse_args()
+
+    devices = [FakeArduino(latency=args.latency, jitter=args.jitter, drop_rate=args.drop, garble_rate=args.garble,
+                           disconnect_every=args.disconnect_every, disconnect_for=args.disconnect_for, seed=i).start()
+               for i in range(args.devices)]
+    registry = ChannelRegistry(interval=args.interval, iterations=args.iterations)
+    for device in devices:
+        registry.add_device(device.port_name, device.port)
+    store = SampleStore(len(registry), interval=args.interval)
+    batches = BatchAverager(10, len(registry))
+
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = SampleRecorder(os.path.join(directory, 'soak.bin'), registry.names(), datetime.now())
+        recorder.start()
+        registry.start_all()
+
+        start = time.monotonic()
+        next_report = start + args.report_every
+        rss_start = rss_mb()
+        samples = rows = 0
+        interval_samples = 0
+        while time.monotonic() - start < args.duration:
+            time.sleep(0.1)
+            for channel, timestamp, value in registry.drain():
+                store.add(channel, timestamp, value)
+                samples += 1
+                interval_samples += 1
+            for timestamp, values in store.pop_ready():
+                batches.add(values)
+                recorder.record(timestamp, values)
+                rows += 1
+
+            now = time.monotonic()
+            if now >= next_report:
+                latencies = [duration for channel in registry.channels for duration in channel.engine.read_durations]
+                print(f"[{now - start:7.0f} s] {interval_samples / args.report_every:7.1f} samples/s, "
+                      f"read latency p50 {percentile(latencies, 0.5) * 1000:6.1f} ms "
+                      f"p95 {percentile(latencies, 0.95) * 1000:6.1f} ms p99 {percentile(latencies, 0.99) * 1000:6.1f} ms, "
+                      f"RSS {rss_mb():6.1f} MB ({rss_mb() - rss_start:+.1f})", flush=True)
+                interval_samples = 0
+                next_report += args.report_every
+
+        elapsed = time.monotonic() - start
+        registry.stop_all()
+        recorder.stop()
+        for device in devices:
+            device.stop()
+
+    print(f"total: {samples} samples ({samples / elapsed:.1f}/s), {rows} aligned rows, "
+          f"{sum(channel.engine.dropped_samples for channel in registry.channels)} queue drops, "
+          f"{sum(channel.engine.missed_ticks for channel in registry.channels)} missed ticks, "
+          f"RSS growth {rss_mb() - rss_start:+.1f} MB")
+    print("devices: " + ", ".join(f"sent {d.frames_sent} dropped {d.frames_dropped} garbled {d.frames_garbled} "
+                                   f"disconnects {d.disconnects}" for d in devices))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Per-device calibration models, e.g.
+#   {
+#     "default": {"type": "linear", "gain": 1.0, "offset": 0.0},
+#     "devices": {
+#       "CH1": {"type": "linear", "gain": 0.3015250701388389, "offset": -106.79875548521687},
+#       "/dev/ttyACM1": {"type": "polynomial", "coefficients": [0.0001, 0.98, -1.5]},
+#       "5573932393535151A1C1": {"type": "table", "points": [[0, 0.0], [400, 98.5], [800, 201.0]]}
+#     }
+#   }
+# Devices are looked up by USB serial number, then port, then channel name. Without a file,
+# or for devices not listed, the raw reading is used unchanged.
+CALIBRATION_FILE = os.path.join(os.path.expanduser('~'), '.temperature_daq_calibration.json')
+
+# Seconds between checks of the file's modification time for hot-reload
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class LinearModel:
+    def __init__(self, gain=1.0, offset=0.0):
+        self.gain = float(gain)
+        self.offset = float(offset)
+
+    def apply(self, raw):
+        return raw * self.gain + self.offset
+
+
+class PolynomialModel:
+    # Coefficients highest power first, as numpy.polyval takes them
+    def __init__(self, coefficients):
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        if self.coefficients.ndim != 1 or not len(self.coefficients):
+            raise ValueError("polynomial needs a non-empty list of coefficients")
+
+    def apply(self, raw):
+        return np.polyval(self.coefficients, raw)
+
+
+class LookupTableModel:
+    # Piecewise-linear interpolation between (raw, temperature) points; outside the table the
+    # first and last segments are extended rather than clamped, so out-of-range stays visible
+    def __init__(self, points):
+        points = sorted((float(raw), float(temperature)) for raw, temperature in points)
+        if len(points) < 2:
+            raise ValueError("lookup table needs at least two points")
+        self.raw = np.array([point[0] for point in points])
+        self.temperature = np.array([point[1] for point in points])
+        if np.any(np.diff(self.raw) <= 0):
+            raise ValueError("lookup table raw values must be distinct")
+        self._low_slope = (self.temperature[1] - self.temperature[0]) / (self.raw[1] - self.raw[0])
+        self._high_slope = (self.temperature[-1] - self.temperature[-2]) / (self.raw[-1] - self.raw[-2])
+
+    def apply(self, raw):
+        raw = np.asarray(raw, dtype=float)
+        result = np.interp(raw, self.raw, self.temperature)
+        below = raw < self.raw[0]
+        above = raw > self.raw[-1]
+        result[below] = self.temperature[0] + (raw[below] - self.raw[0]) * self._low_slope
+        result[above] = self.temperature[-1] + (raw[above] - self.raw[-1]) * self._high_slope
+        return result
+
+
+MODEL_TYPES = {
+    'linear': lambda spec: LinearModel(spec.get('gain', 1.0), spec.get('offset', 0.0)),
+    'polynomial': lambda spec: PolynomialModel(spec['coefficients']),
+    'table': lambda spec: LookupTableModel(spec['points']),
+}
+
+IDENTITY = LinearModel()
+
+
+def build_model(spec):
+    try:
+        factory = MODEL_TYPES[spec['type']]
+    except KeyError:
+        raise ValueError(f"unknown calibration type {spec.get('type')!r}") from None
+    return factory(spec)
+
+
+class CalibrationSet:
+    # Calibration models for all devices, shared by the acquisition engines.
+    # The file is re-read when it changes; a broken edit is reported and the previous
+    # models stay in use, so acquisition never stops because of a typo.
+
+    def __init__(self, path=CALIBRATION_FILE):
+        self.path = path
+        self.models = {}
+        self.default = IDENTITY
+        self.reloads = 0
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            # No file (any more): raw readings
+            self.models, self.default, self._mtime = {}, IDENTITY, None
+            return True
+        try:
+            with open(self.path) as file:
+                config = json.load(file)
+            models = {key: build_model(spec) for key, spec in config.get('devices', {}).items()}
+            default = build_model(config['default']) if 'default' in config else IDENTITY
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning(f"Calibration file {self.path} not applied: {e}")
+            self._mtime = mtime  # Do not retry until it is edited again
+            return False
+        # Swapped in one assignment each; engines pick the new models up on their next read
+        self.models, self.default, self._mtime = models, default, mtime
+        self.reloads += 1
+        return True
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = now + RELOAD_CHECK_INTERVAL
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self._mtime:
+                return False
+            return self.reload()
+        finally:
+            self._lock.release()
+
+    def model_for(self, keys):
+        # First model configured for any of `keys` (serial number, port, channel name)
+        self.reload_if_changed()
+        models = self.models
+        for key in keys:
+            if key in models:
+                return models[key]
+        return self.default
+
+    def apply(self, keys, raw):
+        # Calibrate a block of raw readings from one device
+        return self.model_for(keys).apply(np.asarray(raw, dtype=float))
+
+    def apply_block(self, keys_per_channel, block):
+        # Calibrate a (rows x channels) block, one model per column
+        block = np.asarray(block, dtype=float)
+        result = np.empty_like(block)
+        for column, keys in enumerate(keys_per_channel):
+            result[:, column] = self.model_for(keys).apply(block[:, column])
+        return result
@@ -0,0 +1,133 @@
+import math
+import time
+from collections import OrderedDict
+from functools import partial
+
+from acquisition_engine import AcquisitionEngine
+from sample_filter import SampleFilter
+from timebase import NS_PER_SECOND
+
+
+class Channel:
+    def __init__(self, index, name, device, engine, serial_number=None):
+        self.index = index
+        self.name = name
+        self.device = device
+        self.key = serial_number or device  # The logger itself: USB serial number, or the port without one
+        self.engine = engine  # Own reader thread and lock, so a stalled port only stalls itself
+
+
+class ChannelRegistry:
+    # One AcquisitionEngine per discovered device; channels are numbered in device order
+
+    def __init__(self, interval=1.0, iterations=2, calibration=None, smoothing=None, scheduler=None, metrics=None,
+                 alarms=None, alarm_listener=None):
+        self.interval = interval
+        self.iterations = iterations
+        self.calibration = calibration  # Shared CalibrationSet, or None for raw readings
+        self.smoothing = smoothing  # sample_filter.SMOOTHING_* for every channel
+        self.scheduler = scheduler  # Shared AdaptiveRate, or None to sample every `interval` seconds
+        self.metrics = metrics  # metrics.Metrics every engine reports into, labelled by channel
+        self.alarms = alarms  # Shared AlarmSet, or None for no alarms
+        self.alarm_listener = alarm_listener  # alarm_listener(name, stamp, kind, fields), on the engine threads
+        self.channels = []
+
+    def add_device(self, device, serial_conn, serial_number=None, reopen=None):
+        index = len(self.channels)
+        name = f"CH{index + 1}"
+        keys = [key for key in (serial_number, device, name) if key]
+        engine = AcquisitionEngine(serial_conn, interval=self.interval, iterations=self.iterations,
+                                   calibration=self.calibration, calibration_keys=keys,
+                                   sample_filter=SampleFilter(smoothing=self.smoothing), scheduler=self.scheduler,
+                                   device=device, reopen=reopen, alarms=self.alarms,
+                                   on_alarm=partial(self.alarm_listener, name) if self.alarm_listener else None)
+        if self.metrics is not None:
+            engine.instrument(self.metrics, channel=name)
+        channel = Channel(index, name, device, engine, serial_number)
+        self.channels.append(channel)
+        return channel
+
+    def names(self):
+        return [channel.name for channel in self.channels]
+
+    def keys(self):
+        return [channel.key for channel in self.channels]
+
+    def start_all(self):
+        for channel in self.channels:
+            channel.engine.start()
+
+    def stop_all(self):
+        for channel in self.channels:
+            channel.engine.stop()
+
+    def drain(self):
+        # Collect (channel_index, timestamp, value) from every engine without blocking
+        samples = []
+        for channel in self.channels:
+            for timestamp, value in channel.engine.drain():
+                samples.append((channel.index, timestamp, value))
+        return samples
+
+    def drain_events(self):
+        # Collect (channel name, timestamp, kind, fields) of the engines' link and alarm events
+        events = []
+        for channel in self.channels:
+            for timestamp, kind, fields in channel.engine.drain_events():
+                events.append((channel.name, timestamp, kind, fields))
+        return events
+
+    def __len__(self):
+        return len(self.channels)
+
+
+class SampleStore:
+    # Aligns samples from all channels onto a common time grid of `interval` seconds.
+    # A row is released once every channel has reported for its slot or a later one (each
+    # channel's samples arrive in order), or once it is `max_delay` seconds old; channels that
+    # never reported are filled with NaN.
+    # Timestamps are time.monotonic_ns() stamps, as the engines produce them.
+
+    def __init__(self, channel_count, interval=1.0, max_delay=None, origin=None):
+        self.channel_count = channel_count
+        self.interval = interval
+        self.max_delay = max_delay if max_delay is not None else 2 * interval
+        self.origin = origin if origin is not None else time.monotonic_ns()
+        self._interval_ns = round(interval * NS_PER_SECOND)
+        self._max_delay_ns = self.max_delay * NS_PER_SECOND
+        self._slots = OrderedDict()  # slot -> [list of values per channel, set of channels reported]
+        self._released = -1  # Highest slot already handed out
+        self._latest = [-1] * channel_count  # Highest slot each channel has reported for
+
+    def add(self, channel, timestamp, value):
+        # Nearest grid point, in integer arithmetic
+        slot = (timestamp - self.origin + self._interval_ns // 2) // self._interval_ns
+        if slot <= self._released:
+            return False  # Too late, the row for this slot was already released
+        entry = self._slots.get(slot)
+        if entry is None:
+            entry = self._slots[slot] = [[math.nan] * self.channel_count, set()]
+            if len(self._slots) > 1 and slot < next(reversed(self._slots)):
+                self._slots = OrderedDict(sorted(self._slots.items()))
+        # A channel may report NaN (no valid reading); that still counts as reported
+        entry[0][channel] = value
+        entry[1].add(channel)
+        self._latest[channel] = max(self._latest[channel], slot)
+        return True
+
+    def pop_ready(self, now=None):
+        # Return [(timestamp, [value per channel]), ...] for every row that is complete or overdue;
+        # now=math.inf releases everything
+        now = now if now is not None else time.monotonic_ns()
+        ready = []
+        while self._slots:
+            slot, (row, reported) = next(iter(self._slots.items()))
+            slot_time = self.origin + slot * self._interval_ns
+            complete = len(reported) == self.channel_count or min(self._latest) > slot
+            overdue = now - slot_time >= self._max_delay_ns
+            if not (complete or overdue):
+                break
+            del self._slots[slot]
+            self._released = slot
+            ready.append((slot_time, row))
+        return ready
@@ -1,27 +1,53 @@
+import logging
+import math
 import sys
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject
-from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QLabel, QTextEdit, QFileDialog, QHBoxLayout
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QLabel, QPlainTextEdit, QFileDialog, QHBoxLayout, QInputDialog
 from PyQt6.QtCore import QTimer
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 # import random
-import re
-from datetime import datetime
-import serial
-import serial.tools.list_ports
-from PyQt6.QtGui import QFont
+from PyQt6.QtGui import QFont, QKeySequence, QShortcut
 import time
-from threading import Lock
 
-# Initialize the serial port variable to None (it will be set later)
-serial_port_working = None
+from acquisition_core import AcquisitionCore
+from live_plot import LivePlot, navigation_toolbar
+from logs import RingLogHandler, configure_logging
+from recorder import RECORDINGS_DIR
+from replay import RecordingView
 
-# Create a global lock for serial port access
-serial_lock = Lock()
+log = logging.getLogger(__name__)
+
+# How often the GUI drains queued samples (milliseconds)
+DRAIN_INTERVAL_MS = 100
+
+# Upper bound on plot redraws per second, independent of the sample rate
+PLOT_FPS = 10
+
+# Replay speeds offered for recorded runs (None plays as fast as possible)
+REPLAY_SPEEDS = {"1x": 1.0, "10x": 10.0, "100x": 100.0, "Secepatnya": None}
+
+# Pipeline latency overlay on the plot, toggled with F3; refreshed every STATS_REFRESH_MS
+STATS_OVERLAY = False
+STATS_REFRESH_MS = 1000
+
+# Keep the pipeline metrics in this file while measuring (Prometheus text if *.prom, else JSON),
+# every METRICS_INTERVAL seconds; None for no file
+METRICS_FILE = None
+METRICS_INTERVAL = 10.0
+
+# Publish the live rows to remote dashboards on this TCP port (see publisher.py); None for no server
+PUBLISH_PORT = None
+# Interface the server listens on: this machine only, or '0.0.0.0' for dashboards elsewhere
+PUBLISH_HOST = '127.0.0.1'
+
+# The log view keeps the last LOG_LINES lines and takes new messages every LOG_REFRESH_MS;
+# a message repeating within LOG_REPEAT_WINDOW seconds is shown once, then counted
+LOG_LINES = 1000
+LOG_REFRESH_MS = 100
+LOG_REPEAT_WINDOW = 10.0
 
 
 class SerialConnectionThread(QThread):
-    connection_success = pyqtSignal(str)
+    connection_success = pyqtSignal(object)  # List of DiscoveredPort, connections already open
     connection_failed = pyqtSignal(str)
 
     def __init__(self, baud_rate, timeout):
@@ -30,130 +56,72 @@ class SerialConnectionThread(QThread):
         self.timeout = timeout
 
     def run(self):
-        found = False  # Initialize found flag as False
-
-        for port_info in serial.tools.list_ports.comports():
-            serial_port = port_info.device
-
-            try:
-                with serial.Serial(serial_port, self.baud_rate, timeout=self.timeout, write_timeout=self.timeout+3) as temp_conn:
-                    temp_conn.flushInput()
-                    temp_conn.flushOutput()
-                    print(temp_conn)
-
-                    # Initialize success flag for write/read operations
-                    success = False
-
-                    # Retry loop - try to write and read up to 3 times
-                    for attempt in range(5):
-                        try:
-                            time.sleep(0.01)
-                            temp_conn.write(b'*S#')
-                            time.sleep(0.01)
-                            response = temp_conn.readline().decode('utf-8').strip()
-
-                            if re.match(r'\*\d+#', response):
-                                found = True  # Suitable device found
-                                success = True  # Write/read operations successful
-                                self.connection_success.emit(serial_port)
-                                temp_conn.close()  # Ensure the serial connection is closed on exit
-                                break  # Exit retry loop upon success
-                        except (serial.SerialTimeoutException, serial.SerialException) as e:
-                            # Handle possible write/read exceptions here
-                            print(f"Error on attempt {attempt + 1}: {e}")
-
-                        if success:
-                            break  # Exit the retry loop if successful
-                        
-                    if found:
-                        break  # Exit the with block if a suitable device has been found
-            except serial.SerialException as e:
-                # Log or handle the error without stopping the loop
-                print(f"Attempted to open {serial_port}, but failed: {e}")
-                continue  # Try the next port
+        # pyserial's port enumeration is only needed here, so it is imported off the GUI thread
+        from port_discovery import discover_ports
 
+        started = time.monotonic()
+        found = discover_ports(self.baud_rate, self.timeout)
         if not found:
-            # If the loop completes without finding a device, emit the failure signal
+            # If no port answered, emit the failure signal
             self.connection_failed.emit("Arduino gagal ditemukan!")
+            return
+        log.info(f"Found {', '.join(port.device for port in found)} in {time.monotonic() - started:.2f} s")
+        self.connection_success.emit(found)
 
 
-class DataReaderWorker(QObject):
-    data_ready = pyqtSignal(float)  # Signal to emit the average temperature
-    finished = pyqtSignal()  # Signal to indicate completion
+class ExportThread(QThread):
+    # Writes the "SIMPAN DATA" CSV from the recording, so a long run does not freeze the window
+    exported = pyqtSignal(str, object)  # Output path, points written or None when nothing was recorded
+    export_failed = pyqtSignal(str)
 
-    def __init__(self, serial_connection):
+    def __init__(self, export, out_path):
         super().__init__()
-        self.serial_connection = serial_port_working
-
-    def read_data_average(self, iterations=2):
-        total_temp = 0
-        valid_readings = 0
-        for _ in range(iterations):
-            # Assume read_data is a method that reads data from the serial port
-            temp_reading = self.read_data(self.serial_connection)
-            try:
-                temp_reading = float(temp_reading)
-                total_temp += temp_reading
-                valid_readings += 1
-            except (ValueError, TypeError):
-                continue  # Skip invalid readings
-
-        if valid_readings > 0:
-            average_temp = total_temp / valid_readings
-        else:
-            average_temp = 0  # Handle error or no data case
-
-        self.data_ready.emit(average_temp)  # Emit the average temperature
-        self.finished.emit()  # Indicate that the work is done
-
-    def read_data(self, serial_conn):
-        global serial_lock
-        with serial_lock:  # Acquire the lock
-            try:
-                if serial_conn and serial_conn.is_open:
-                    serial_conn.write(b'*S#')  # Send command to request data
-                    # Wait for data to become available
-                    response = self.non_blocking_readline(serial_conn)
-                    if response.startswith('*') and response.endswith('#'):
-                        return response[1:-1]  # Return the valid data
-                    else:
-                        return 0  # Invalid response format
-            except serial.SerialException as e:
-                print(f"Serial communication error: {e}")
-                return 0
-            except Exception as e:
-                print(f"An unexpected error occurred: {e}")
-                return 0
-    
-    def non_blocking_readline(self, serial_conn, timeout=0.3):
-        end_time = time.time() + timeout
-        line = bytearray()
-        while time.time() < end_time:
-            if serial_conn.in_waiting > 0:
-                
-                char = serial_conn.read(1)
-                line += char
-                if char == b'\n':  # Check if the newline character is received
-                    break
-            # Without sleep, this loop will aggressively check in_waiting, potentially consuming more CPU.
-        return line.decode('utf-8').strip()  # Decode and return the line
+        self.export = export
+        self.out_path = out_path
+
+    def run(self):
+        try:
+            self.exported.emit(self.out_path, self.export(self.out_path))
+        except (OSError, ValueError) as e:
+            self.export_failed.emit(f"Data gagal disimpan ke {self.out_path}: {e}")
 
 
 class TemperatureDataAcquisitionSystem(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.serial_lock = Lock()  # Initialize the lock
-
         self.setWindowTitle("Temperature Data Acquisition System")
         self.setGeometry(100, 100, 800, 600)  # x, y, width, height
 
-        self.serial_conn = None
-        self.temperature_data = []  # Initialize as empty list
-        self.plot_data = []  # Store data points for plotting
+        # Engines, alignment, batch statistics and recording; this window only displays them
+        self.core = AcquisitionCore()
+        self.connect_started = None  # Monotonic time MULAI was pressed, for time-to-first-sample
+        self.connection_thread = None
+        self.export_thread = None  # Writing the CSV of SIMPAN DATA, see save_data
+        self.discovered = None  # Ports found by the discovery started at launch, not yet in use
+        self.start_requested = False  # MULAI was pressed while discovery was still running
+        self.live_plot = None  # Built just after the window is shown, see build_plot
+        self.open_channels = []  # Channels last reported with an open thermocouple
+        self.active_alarms = set()  # (channel, alarm name) of the alarms raised and not cleared
+        self.replay_shown = False  # The plot still shows a finished or stopped replay
         self.update_job = None
+        self.render_latency = self.core.metrics.histogram('render_seconds', "Drawing one plot frame")
+        self.stats_overlay = None  # QLabel over the plot, see toggle_stats_overlay
+        self.next_metrics_dump = 0.0
         
         self.update_timer = QTimer(self)  # Create a QTimer instance
-        self.update_timer.timeout.connect(self.acquire_and_plot_data)  # Connect timeout signal to the slot
+        self.update_timer.timeout.connect(self.drain_samples)  # Connect timeout signal to the slot
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats_overlay)
+
+        # Messages of this window, and warnings from the engines, recorder and discovery
+        # threads; the view below is only touched by flush_log, once per LOG_REFRESH_MS
+        configure_logging()
+        self.log_handler = RingLogHandler(LOG_LINES, LOG_REPEAT_WINDOW)
+        self.log_handler.addFilter(lambda record: record.levelno >= logging.WARNING or record.name == log.name)
+        logging.getLogger().addHandler(self.log_handler)
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start(LOG_REFRESH_MS)
         
 
     
@@ -177,10 +145,10 @@ class TemperatureDataAcquisitionSystem(QMainWindow):
         font.setPointSize(150)  # Sets the font size to 18 points. Adjust the size as needed.
         self.temp_display.setFont(font)
 
-        # Plot Area
-        self.figure = Figure()
-        self.canvas = FigureCanvas(self.figure)
-        self.layout.addWidget(self.canvas)
+        # Plot Area: a placeholder until build_plot has imported matplotlib
+        self.plot_placeholder = QLabel("Memuat grafik...", self)
+        self.plot_placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.layout.addWidget(self.plot_placeholder, 1)
 
         # Assuming self.layout is your QVBoxLayout
         # Control Panel with QHBoxLayout
@@ -213,181 +181,329 @@ class TemperatureDataAcquisitionSystem(QMainWindow):
         control_panel_layout.addWidget(self.stop_button)
         control_panel_layout.addWidget(self.save_button)
 
+        self.replay_button = QPushButton("PUTAR ULANG", self)
+        self.replay_button.clicked.connect(self.start_replay)
+        self.replay_button.setFont(button_font)
+        self.replay_button.setMinimumSize(100, 100)
+        control_panel_layout.addWidget(self.replay_button)
+
         # Add the QHBoxLayout to the main QVBoxLayout
         self.layout.addLayout(control_panel_layout)
 
         # Logs
-        self.log_text = QTextEdit(self)
+        self.log_text = QPlainTextEdit(self)
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_LINES)  # Oldest lines are dropped
         self.layout.addWidget(self.log_text)
-        
-        self.ax = self.figure.add_subplot(111)
-        self.ax.set_title('Grafik Temperatur terhadap Waktu')
-        self.ax.set_xlabel('Waktu (detik)')
-        self.ax.set_ylabel('Temperatur (°C)')
-        
-    def acquire_and_plot_data(self):
-        # Create the worker and thread
-        self.data_reader_thread = QThread()
-        self.data_reader_worker = DataReaderWorker(serial_port_working)
-        self.data_reader_worker.moveToThread(self.data_reader_thread)
-
-        # Connect signals
-        self.data_reader_worker.data_ready.connect(self.handle_data_ready)
-        self.data_reader_worker.finished.connect(self.data_reader_thread.quit)
-        self.data_reader_thread.started.connect(self.data_reader_worker.read_data_average)
-
-        # Start the thread
-        self.data_reader_thread.start()
-        
-    def handle_data_ready(self, average_temperature):
-        # Calibration results
-        calibrated_temp = (0.3015250701388389 * average_temperature - 21.798755485216873)-85
-        # calibrated_temp = ((calibrated_temp-110)/(220-110))*(55-25)+25
-        batch_value = 10
-        calibrated_temp = average_temperature
-
-        # Add calibrated temperature to the list
-        self.temperature_data.append(calibrated_temp)
-
-        # Display the temperature with 2 decimal places
-        self.temp_display.setText(f"{calibrated_temp:.2f} °C")
-
-        # Determine current time in seconds since start
-        elapsed_time = (datetime.now() - self.start_time).total_seconds()
-
-        # Calculate the index for the current batch (0 for the first 100, 1 for the next 100, etc.)
-        batch_index = len(self.temperature_data) // batch_value
-
-        # Calculate running average for the current batch
-        current_batch_start = batch_index * batch_value
-        current_batch_data = self.temperature_data[current_batch_start:]
-        if len(current_batch_data) > 0:  # Ensure we have data to avoid division by zero
-            running_avg_temp = sum(current_batch_data) / len(current_batch_data)
-
-            # Ensure there's a plot data point for each batch, including the current incomplete one
-            if len(self.plot_data) <= batch_index:
-                self.plot_data.append((elapsed_time, running_avg_temp))
-            else:
-                self.plot_data[batch_index] = (elapsed_time, running_avg_temp)
-
-        # Update the plot with the latest data
-        self.update_plot()
 
-    def update_plot(self):
-        # Ensure to clear only the necessary parts of the plot for efficiency
-        self.ax.cla()  # Clear the current axes
+        QShortcut(QKeySequence("F3"), self).activated.connect(self.toggle_stats_overlay)
+        if STATS_OVERLAY:
+            QTimer.singleShot(0, self.toggle_stats_overlay)
+
+    def build_plot(self):
+        # matplotlib is most of the import time, so the figure is built after the window is up
+        if self.live_plot is not None:
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        self.layout.replaceWidget(self.plot_placeholder, self.canvas)
+        self.plot_placeholder.deleteLater()
+
+        self.ax = self.figure.add_subplot(111)
         self.ax.set_title('Temperature Over Time')
         self.ax.set_xlabel('Time (s)')
         self.ax.set_ylabel('Temperature (°C)')
-        # self.ax.set_ylim(0, 100)
-        
-        if self.plot_data:
-            x_data, y_data = zip(*self.plot_data)
-            self.ax.plot(x_data, y_data, '-o', label='Average Temperature')
-            self.ax.legend()
 
-        self.canvas.draw()
+        # Lines are created once and updated in place; redraws are capped at PLOT_FPS
+        self.live_plot = LivePlot(self.figure, self.canvas, self.ax, fps=PLOT_FPS)
+        # Zoom and pan stop the axes following the data; the home button resumes it
+        self.layout.insertWidget(self.layout.indexOf(self.canvas), navigation_toolbar(self.live_plot, self))
+
+    def drain_samples(self):
+        # Only consume what the engines (or the replay) have already produced; never touch the ports here
+        processed = self.core.poll()
+        if processed and self.connect_started is not None:
+            self.log_message(f"Sampel pertama diterima {time.monotonic() - self.connect_started:.2f} detik setelah MULAI")
+            self.connect_started = None
+        self.show_rows(processed)
+        self.check_thermocouples()
+        for timestamp, kind, fields in self.core.take_events():
+            if kind == 'rate':
+                when = self.core.timebase.wall_datetime(timestamp)
+                self.log_message(f"{when:%H:%M:%S} laju sampling {fields['interval']:g} detik ({fields['reason']})")
+            elif kind == 'disconnected':
+                self.log_message(f"{fields['channel']}: koneksi terputus, mencoba menyambung ulang...")
+            elif kind == 'reconnected':
+                self.log_message(f"{fields['channel']}: tersambung kembali setelah {fields['gap']:.1f} detik "
+                                 f"({fields['attempts']} percobaan)")
+            elif kind == 'alarm':
+                self.active_alarms.add((fields['channel'], fields['alarm']))
+                self.log_message(f"{fields['channel']}: ALARM {fields['alarm']} (nilai {fields['value']})")
+                self.show_alarm_state()
+            elif kind == 'alarm_cleared':
+                self.active_alarms.discard((fields['channel'], fields['alarm']))
+                self.log_message(f"{fields['channel']}: alarm {fields['alarm']} selesai (nilai {fields['value']})")
+                self.show_alarm_state()
+
+        # Redraw at most once per drain, however many samples arrived; this also
+        # gives a frame that was held back by the FPS cap a chance to draw
+        self.update_plot()
+
+        if METRICS_FILE and time.monotonic() >= self.next_metrics_dump:
+            self.core.write_metrics(METRICS_FILE)
+            self.next_metrics_dump = time.monotonic() + METRICS_INTERVAL
+
+        if self.core.replay is not None and self.core.replay.is_finished():
+            self.stop_replay()
+
+    def show_rows(self, processed):
+        # Rows already processed by the core: only the display and the plot are updated here
+        self.build_plot()
+        for timestamp, temperatures, batch_index, elapsed_time, running_avg_temps in processed:
+            self.live_plot.update_point(batch_index, elapsed_time, running_avg_temps)
+        if processed:
+            # Display the latest temperature with 2 decimal places
+            self.temp_display.setText(self.format_temperatures(processed[-1][1]))
+
+    def show_alarm_state(self):
+        # The temperature turns red while any alarm is raised
+        self.temp_display.setStyleSheet("color: red;" if self.active_alarms else "")
+
+    def check_thermocouples(self):
+        open_channels = self.core.open_channels()
+        for name in open_channels:
+            if name not in self.open_channels:
+                self.log_message(f"{name}: termokopel terlepas / terbuka!")
+        for name in self.open_channels:
+            if name not in open_channels:
+                self.log_message(f"{name}: termokopel terhubung kembali")
+        self.open_channels = open_channels
+
+    def set_plot_channels(self):
+        labels = ['Average Temperature'] if len(self.core.channel_names) == 1 else self.core.channel_names
+        self.build_plot()
+        self.live_plot.set_channels(labels)
+
+    def format_temperatures(self, temperatures):
+        # NaN: no valid reading in this slot (open thermocouple, outliers only, or no reply)
+        if len(temperatures) == 1:
+            return "--- °C" if math.isnan(temperatures[0]) else f"{temperatures[0]:.2f} °C"
+        return "  ".join(f"{name}: ---" if math.isnan(value) else f"{name}: {value:.1f}"
+                         for name, value in zip(self.core.channel_names, temperatures))
+
+    def update_plot(self, force=False):
+        # Only the changed lines are redrawn (blitted); the axes are redrawn when the limits grow.
+        # A full redraw is only scheduled here, so render_seconds mostly measures blits.
+        if self.live_plot is not None:
+            render_start = time.perf_counter_ns()
+            if self.live_plot.render(force=force):
+                self.render_latency.observe(time.perf_counter_ns() - render_start)
+
+    def toggle_stats_overlay(self):
+        if self.stats_overlay is not None:
+            self.stats_timer.stop()
+            self.stats_overlay.deleteLater()
+            self.stats_overlay = None
+            return
+        self.build_plot()
+        self.stats_overlay = QLabel(self.canvas)
+        self.stats_overlay.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.stats_overlay.setStyleSheet("background-color: rgba(0, 0, 0, 160); color: white; padding: 6px;")
+        self.stats_overlay.setFont(QFont("monospace", 9))
+        self.stats_overlay.move(10, 10)
+        self.stats_overlay.show()
+        self.update_stats_overlay()
+        self.stats_timer.start(STATS_REFRESH_MS)
+
+    def update_stats_overlay(self):
+        if self.stats_overlay is None:
+            return
+        self.stats_overlay.setText(self.core.stats_line().replace("; ", "\n") or "Belum ada data")
+        self.stats_overlay.adjustSize()
 
     def start_update(self):
+        if self.core.replay is not None:
+            self.stop_replay()
+        if self.core.registry is not None:
+            return  # Already measuring
+        self.connect_started = time.monotonic()
+        if self.discovered is not None:
+            # Discovery already finished in the background: start right away
+            found, self.discovered = self.discovered, None
+            self.on_connection_success(found)
+            return
+        self.start_requested = True
+        if self.connection_thread is None or not self.connection_thread.isRunning():
+            self.start_discovery()
+
+    def start_discovery(self):
+        # Also run once at launch, so the loggers are usually found (and past their reset)
+        # before MULAI is pressed
         self.log_message("Mencoba mencari arduino, mohon menunggu!")
-        self.connection_thread = SerialConnectionThread(baud_rate=9600, timeout=1)
-        self.connection_thread.connection_success.connect(self.on_connection_success)
+        self.connection_thread = SerialConnectionThread(baud_rate=9600, timeout=5)
+        self.connection_thread.connection_success.connect(self.on_ports_found)
         self.connection_thread.connection_failed.connect(self.on_connection_failed,)
         self.connection_thread.start()
-        
-    def on_connection_success(self, port):
-        time.sleep(3)
-        global serial_port_working
-        serial_port_working = serial.Serial(port, 9600, timeout=1, write_timeout=1)
-        self.log_message(f"Koneksi dibuka pada port {port}.")
-        if not hasattr(self, 'start_time'):
-            self.start_time = datetime.now()
-        self.update_timer.start(1000)  # Start the timer with this interval
+
+    def on_ports_found(self, found_ports):
+        if self.start_requested:
+            self.start_requested = False
+            self.on_connection_success(found_ports)
+            return
+        self.discovered = found_ports
+        self.log_message(f"Arduino ditemukan pada {', '.join(found.device for found in found_ports)}. Tekan MULAI untuk mulai mengukur.")
+
+    def on_connection_success(self, found_ports):
+        # Discovery hands over open connections, so the Arduinos do not reset a second time
+        recorder = self.core.recorder
+        if self.core.attach(found_ports) or self.replay_shown:
+            # A different set of loggers, or the plot still shows a replay: previous data no
+            # longer lines up
+            self.replay_shown = False
+            self.set_plot_channels()
+        for channel, found in zip(self.core.registry.channels, found_ports):
+            self.log_message(f"{channel.name}: koneksi dibuka pada port {found.device} (reset Arduino {found.reset_wait:.2f} detik).")
+        if self.core.recorder is not recorder:
+            self.log_message(f"Data direkam ke {self.core.recorder.path}")
+        if PUBLISH_PORT is not None and self.core.publisher is None:
+            try:
+                self.core.start_publisher(PUBLISH_HOST, PUBLISH_PORT)
+                self.log_message(f"Data langsung dipublikasikan pada port {self.core.publisher.port}")
+            except OSError as e:
+                self.log_message(f"Server data langsung gagal dibuka pada port {PUBLISH_PORT}: {e}")
+
+        channel_count = len(self.core.registry)
+        font = self.temp_display.font()
+        font.setPointSize(150 if channel_count == 1 else max(20, 150 // channel_count))
+        self.temp_display.setFont(font)
+
+        # The engines own the ports from here until stop_update
+        self.core.start()
+        self.update_timer.start(DRAIN_INTERVAL_MS)  # Drain queued samples at this interval
         
         self.log_message("Pengukuran temperatur mulai")
 
     def on_connection_failed(self, message):
+        self.start_requested = False
         self.log_message(message)
 
+    def start_replay(self):
+        if self.core.registry is not None:
+            self.log_message("Hentikan pengukuran sebelum memutar ulang rekaman")
+            return
+        fileName, _ = QFileDialog.getOpenFileName(self, "Open Recording", RECORDINGS_DIR, "Recordings (*.bin)")
+        if not fileName:
+            return
+        speed_name, ok = QInputDialog.getItem(self, "Kecepatan", "Kecepatan putar ulang:", list(REPLAY_SPEEDS), 0, False)
+        if not ok:
+            return
+        if self.core.replay is not None:
+            self.stop_replay()
+
+        # An empty, cut-off or non-binary file must not reach the event loop as an exception
+        try:
+            view = RecordingView(fileName)
+        except (OSError, ValueError) as e:
+            self.log_message(f"Rekaman tidak dapat diputar ulang: {e}")
+            return
+        count, duration = len(view), view.duration()
+        view.close()
+        if not count:
+            self.log_message(f"Rekaman {fileName} tidak berisi sampel, tidak dapat diputar ulang")
+            return
+        offset, ok = QInputDialog.getDouble(self, "Mulai dari", "Mulai dari detik ke-:", 0, 0, duration, 1)
+        if not ok:
+            return
+
+        # Replayed rows are not recorded again; the next MULAI starts a fresh recording
+        try:
+            replay = self.core.start_replay(fileName, speed=REPLAY_SPEEDS[speed_name], offset=offset)
+        except (OSError, ValueError) as e:
+            self.log_message(f"Rekaman tidak dapat diputar ulang: {e}")
+            return
+        self.set_plot_channels()
+        self.update_timer.start(DRAIN_INTERVAL_MS)
+        self.log_message(f"Memutar ulang {fileName} ({speed_name}, {len(replay.view)} sampel)")
+
+    def stop_replay(self):
+        self.core.stop_replay()
+        self.replay_shown = True  # Left on the plot until the next MULAI
+        self.update_timer.stop()
+        self.update_plot(force=True)
+        self.log_message("Putar ulang selesai")
+
     def stop_update(self):
+        if self.core.replay is not None:
+            self.stop_replay()
+            return
         self.update_timer.stop()  # Stop the timer
         self.log_message("Pengukuran temperatur selesai")
         self.close_serial_connection()
     
     def close_serial_connection(self):
-        global serial_port_working
-        if serial_port_working:
-            serial_port_working.close()
-            self.log_message("Serial connection closed.")
+        if self.core.registry is None:
+            return
+        # Keep whatever was acquired before the stop, including rows still waiting for a slow channel
+        self.show_rows(self.core.stop())
+        self.update_plot(force=True)
+        for name, summary in self.core.link_summaries():
+            self.log_message(f"{name}: {summary}")
+        self.log_message(f"Statistik: {self.core.stats_line()}")
+        self.core.release()
+        self.log_message("Serial connection closed.")
             
-    def read_data(self, serial_conn):
-        print(serial_conn)
-        try:
-            if serial_conn and serial_conn.is_open:
-                serial_conn.write(b'*S#')
-                response = serial_conn.readline().decode('utf-8').strip()
-                print(f"Raw response: {response}")
-
-                if response.startswith('*') and response.endswith('#'):
-                    return response[1:-1]  # Return the valid data
-                else:
-                    return "Invalid response received: " + response
-            else:
-                return "Serial connection is not open."
-        except serial.SerialException as e:
-            print(f"Serial communication error: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-
-    def read_data_average(self, iterations=10):
-        total_temp = 0
-        valid_readings = 0
-
-        for _ in range(iterations):
-            temp_reading = self.read_data(serial_port_working)
-            time.sleep(2)
-            # temp_reading = 0
-            try:
-                # Convert the reading to float and accumulate it
-                temp_reading = float(temp_reading)
-                print(temp_reading)
-                total_temp += temp_reading
-                valid_readings += 1
-            except ValueError:
-                # Handle the case where the reading cannot be converted to float
-                # You might want to log this as an error or handle it in some way
-                print("Invalid reading received")
-            except TypeError:
-                print("NaN value")
-
-        # Calculate the average if there were any valid readings
-        if valid_readings > 0:
-            new_temp = total_temp / valid_readings
-        else:
-            # Handle the case where no valid readings were received
-            new_temp = 0  # or some other default/error value
-
-        return new_temp
-
     def save_data(self):
+        if self.export_thread is not None and self.export_thread.isRunning():
+            self.log_message("Data masih disimpan, mohon menunggu")
+            return
         # Directly call getSaveFileName without using options
         fileName, _ = QFileDialog.getSaveFileName(self, "Save Data", "", "CSV Files (*.csv);;All Files (*)")
         if fileName:
-            with open(fileName, "w") as file:
-                file.write("Waktu (s),Temperatur (Celcius)\n")
-                for interval, temp in self.plot_data:
-                    file.write(f"{interval},{temp:.2f}\n")
-            self.log_message(f"Data disimpan ke {fileName}")
+            # Exported from the recording off the GUI thread; measuring carries on meanwhile
+            self.export_thread = ExportThread(self.core.export_csv, fileName)
+            self.export_thread.exported.connect(self.on_data_saved)
+            self.export_thread.export_failed.connect(self.log_message)
+            self.export_thread.start()
+
+    def on_data_saved(self, fileName, points):
+        if points is None:
+            self.log_message("Belum ada data untuk disimpan")
+            return
+        self.log_message(f"Data disimpan ke {fileName}")
+
+    def closeEvent(self, event):
+        if self.export_thread is not None:
+            self.export_thread.wait()  # Let a running SIMPAN DATA finish its file
+        self.close_serial_connection()
+        if self.discovered is not None:
+            for found in self.discovered:
+                found.connection.close()
+            self.discovered = None
+        self.core.close()
+        logging.getLogger().removeHandler(self.log_handler)
+        self.log_timer.stop()
+        super().closeEvent(event)
 
     def log_message(self, message):
-        self.log_text.append(message)
+        log.info(message)
+
+    def flush_log(self):
+        # Everything logged since the last frame in one append, however many messages arrived
+        lines = self.log_handler.take()
+        if lines:
+            self.log_text.appendPlainText("\n".join(lines))
 
 
 def main():
     app = QApplication(sys.argv)
     ex = TemperatureDataAcquisitionSystem()
     ex.showMaximized()  # This will show the window maximized
+    # Look for the loggers while the plot is being built; both run once the window has painted
+    QTimer.singleShot(0, ex.start_discovery)
+    QTimer.singleShot(0, ex.build_plot)
     sys.exit(app.exec())
 
 
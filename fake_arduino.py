@@ -0,0 +1,300 @@
+import argparse
+import fcntl
+import math
+import os
+import pty
+import random
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+
+from protocol import MAX_BATCH, OPEN_THERMOCOUPLE
+
+BAUD = 9600
+
+
+class PtyPort:
+    # Just enough of the pyserial API to use the pty slave in-process without pyserial
+    def __init__(self, fd):
+        self.fd = fd
+        self.is_open = True
+
+    def fileno(self):
+        return self.fd
+
+    @property
+    def in_waiting(self):
+        return struct.unpack('I', fcntl.ioctl(self.fd, termios.FIONREAD, b'\0\0\0\0'))[0]
+
+    def read(self, size=1):
+        return os.read(self.fd, size)
+
+    def write(self, data):
+        return os.write(self.fd, data)
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            os.close(self.fd)
+
+
+class FakeArduino:
+    # Pty-backed stand-in for arduino_logger.ino with a MAX6675 attached.
+    # Speaks "*S#" and the batch protocol, and can misbehave on purpose: reply latency and
+    # jitter, dropped and garbled frames, periodic disconnects, unsolicited frame bursts,
+    # spurious readings (0 or full scale, like a glitching MAX6675) and an open thermocouple.
+    # Its millis() clock ("*T#") runs `clock_drift_ppm` fast (or slow, if negative) against the host.
+    # With a `conversion_time` (e.g. protocol.CONVERSION_TIME) reads wait for the MAX6675's
+    # conversion like the firmware does; the default 0 converts instantly.
+    # `port_name` can be opened with pyserial; `port` is an in-process handle to the same pty.
+    # With a `link` path, port_name is a symlink that survives unplug(), like a udev name does.
+
+    def __init__(self, batch_support=True, baud=BAUD, latency=0.0, jitter=0.0, drop_rate=0.0,
+                 garble_rate=0.0, disconnect_every=None, disconnect_for=1.0, stream_rate=0.0,
+                 temperature=100.0, spike_rate=0.0, clock_drift_ppm=0.0, conversion_time=0.0, link=None, seed=None):
+        self.batch_support = batch_support
+        self.baud = baud  # None: no wire-speed pacing
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.garble_rate = garble_rate
+        self.disconnect_every = disconnect_every
+        self.disconnect_for = disconnect_for
+        self.stream_rate = stream_rate  # Unsolicited frames per second (0: request/response only)
+        self.temperature = temperature
+        self.spike_rate = spike_rate  # Fraction of readings replaced by 0 or 4095
+        self.thermocouple_open = False  # Set to report OPEN_THERMOCOUPLE instead of readings
+        self.clock_drift_ppm = clock_drift_ppm
+        self.conversion_time = conversion_time
+        self._conversion_start = 0.0  # Monotonic time the running conversion started
+        self.random = random.Random(seed)
+
+        self.requests = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_garbled = 0
+        self.spikes = 0
+        self.disconnects = 0
+        self.connected = True
+        self.unplugs = 0
+
+        self.link = link
+        self._stop_event = threading.Event()
+        self._unplugged = threading.Event()
+        self._write_lock = threading.Lock()
+        self._threads = []
+        self._plug_in()
+
+    def _plug_in(self, boot_time=0.0):
+        # A fresh pty, as the kernel creates a fresh tty for a USB adapter; the board boots
+        # for `boot_time` seconds before it answers
+        self.master_fd, slave_fd = pty.openpty()
+        tty.setraw(slave_fd)
+        self.port = PtyPort(slave_fd)
+        self.port_name = os.ttyname(slave_fd)
+        if self.link:
+            temporary = self.link + '.new'
+            os.symlink(self.port_name, temporary)
+            os.replace(temporary, self.link)
+            self.port_name = self.link
+        self._started_at = time.monotonic()
+        self._booted_at = self._started_at + boot_time
+
+    def unplug(self, duration=1.0, boot_time=0.0):
+        # Pull the cable: reads on the port fail at once; after `duration` seconds the device
+        # is back as a new tty (behind the same link) and boots for `boot_time` seconds
+        self._unplugged.set()
+        for thread in self._threads:
+            thread.join(1.0)
+        with self._write_lock:
+            self.unplugs += 1
+            self.port.close()
+            os.close(self.master_fd)
+            self.master_fd = None
+            if self.link:
+                os.unlink(self.link)
+
+        def plug_back():
+            if self._stop_event.wait(duration):
+                return
+            with self._write_lock:
+                self._plug_in(boot_time)
+            self._unplugged.clear()
+            self.start()
+
+        threading.Thread(target=plug_back, name="FakeArduinoPlug", daemon=True).start()
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._serve, name="FakeArduino", daemon=True)]
+        if self.stream_rate:
+            self._threads.append(threading.Thread(target=self._stream, name="FakeArduinoStream", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(1.0)
+        with self._write_lock:
+            self.port.close()
+            if self.master_fd is not None:
+                try:
+                    os.close(self.master_fd)
+                except OSError:
+                    pass
+                self.master_fd = None
+        if self.link and os.path.islink(self.link):
+            os.unlink(self.link)
+
+    def read_max6675(self):
+        # Slow drift plus sensor noise, as the integer the firmware prints
+        if self.conversion_time:
+            time.sleep(max(self._conversion_start + self.conversion_time - time.monotonic(), 0))
+            self._conversion_start = time.monotonic()
+        if self.thermocouple_open:
+            return OPEN_THERMOCOUPLE
+        if self.spike_rate and self.random.random() < self.spike_rate:
+            self.spikes += 1
+            return self.random.choice((0, 4095))
+        elapsed = time.monotonic() - self._started_at
+        value = self.temperature + 5 * math.sin(elapsed / 60) + self.random.gauss(0, 0.5)
+        return max(int(round(value)), 0)
+
+    def millis(self):
+        # The firmware's millis(): milliseconds since power-up as an unsigned 32-bit counter
+        elapsed = (time.monotonic() - self._started_at) * (1 + self.clock_drift_ppm / 1e6)
+        return int(elapsed * 1000) % 2 ** 32
+
+    def _is_disconnected(self):
+        # Simulated USB blip / reset: the device goes silent for disconnect_for seconds
+        if not self.disconnect_every:
+            return False
+        phase = (time.monotonic() - self._started_at) % (self.disconnect_every + self.disconnect_for)
+        disconnected = phase >= self.disconnect_every
+        if disconnected and self.connected:
+            self.disconnects += 1
+        self.connected = not disconnected
+        return disconnected
+
+    def _serve(self):
+        pending = b''
+        master_fd = self.master_fd
+        while not (self._stop_event.is_set() or self._unplugged.is_set()):
+            try:
+                if not select.select([master_fd], [], [], 0.1)[0]:
+                    continue
+                data = os.read(master_fd, 1024)
+            except OSError:
+                return
+            if self._is_disconnected() or time.monotonic() < self._booted_at:
+                pending = b''
+                continue  # Whatever arrives while "unplugged" or booting is lost
+            pending += data
+            while b'#' in pending:
+                command, pending = pending.split(b'#', 1)
+                command = command[command.rfind(b'*'):]
+                self._pace(len(command) + 1)
+                reply = self._answer(command)
+                if reply is not None:
+                    self._reply(reply)
+
+    def _answer(self, command):
+        if command == b'*S':
+            self.requests += 1
+            return b'*%d#\n' % self.read_max6675()
+        if command.startswith(b'*B') and self.batch_support:
+            self.requests += 1
+            try:
+                seq, count = command[2:].split(b',')
+                count = min(max(int(count), 1), MAX_BATCH)
+            except ValueError:
+                return None
+            values = b','.join(b'%d' % self.read_max6675() for _ in range(count))
+            return b'*B' + seq + b':' + values + b'#\n'
+        if command == b'*T' and self.batch_support:
+            # Firmware that knows batch frames also reports its clock
+            return b'*T%d#\n' % self.millis()
+        return None  # Unknown commands are ignored, like the firmware does
+
+    def _stream(self):
+        interval = 1.0 / self.stream_rate
+        next_frame = time.monotonic()
+        while not (self._stop_event.is_set() or self._unplugged.is_set()):
+            if not self._is_disconnected():
+                self._reply(b'*%d#\n' % self.read_max6675())
+            next_frame += interval
+            self._stop_event.wait(max(next_frame - time.monotonic(), 0))
+
+    def _reply(self, reply):
+        if self.random.random() < self.drop_rate:
+            self.frames_dropped += 1
+            return
+        if self.random.random() < self.garble_rate:
+            self.frames_garbled += 1
+            reply = self._garble(reply)
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        self._pace(len(reply))
+        with self._write_lock:
+            if self.master_fd is None:
+                return  # Unplugged
+            try:
+                os.write(self.master_fd, reply)
+            except OSError:
+                return
+        self.frames_sent += 1
+
+    def _garble(self, reply):
+        # Flip one byte, or lose the terminator, the way line noise does
+        data = bytearray(reply)
+        if self.random.random() < 0.5:
+            return bytes(data.replace(b'#', b''))
+        position = self.random.randrange(len(data))
+        data[position] = self.random.choice(b'*#x?0123456789')
+        return bytes(data)
+
+    def _pace(self, byte_count):
+        if self.baud:
+            time.sleep(byte_count * 10 / self.baud)  # 8N1: ten bit times per byte
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated MAX6675 Arduino logger on a pseudo-terminal")
+    parser.add_argument('--no-batch', action='store_true', help="behave like the old firmware (*S# only)")
+    parser.add_argument('--baud', type=int, default=BAUD, help="wire speed to emulate, 0 for unpaced")
+    parser.add_argument('--latency', type=float, default=0.0, help="extra reply delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="+/- random reply delay in seconds")
+    parser.add_argument('--drop', type=float, default=0.0, help="fraction of replies dropped")
+    parser.add_argument('--garble', type=float, default=0.0, help="fraction of replies garbled")
+    parser.add_argument('--disconnect-every', type=float, default=None, help="seconds between disconnects")
+    parser.add_argument('--disconnect-for', type=float, default=1.0, help="length of each disconnect")
+    parser.add_argument('--spikes', type=float, default=0.0, help="fraction of readings that are spurious")
+    parser.add_argument('--open', action='store_true', help="report an open thermocouple")
+    parser.add_argument('--clock-drift', type=float, default=0.0, help="device clock error in ppm")
+    parser.add_argument('--stream-rate', type=float, default=0.0, help="unsolicited frames per second")
+    args = parser.parse_args()
+
+    device = FakeArduino(batch_support=not args.no_batch, baud=args.baud or None, latency=args.latency,
+                         jitter=args.jitter, drop_rate=args.drop, garble_rate=args.garble,
+                         disconnect_every=args.disconnect_every, disconnect_for=args.disconnect_for,
+                         stream_rate=args.stream_rate, spike_rate=args.spikes, clock_drift_ppm=args.clock_drift)
+    device.thermocouple_open = args.open
+    device.start()
+    print(f"Fake Arduino listening on {device.port_name} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"requests {device.requests}, sent {device.frames_sent}, dropped {device.frames_dropped}, "
+                  f"garbled {device.frames_garbled}, disconnects {device.disconnects}")
+    except KeyboardInterrupt:
+        pass
+    device.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import math
+import time
+
+from lod_pyramid import MinMaxPyramid
+
+
+class LivePlot:
+    # Incrementally updated plot: one Line2D per channel created once, data updated in place,
+    # and redraws limited to `fps` frames per second whatever the sample rate.
+    # Frames that do not change the axes limits are blitted over a cached background;
+    # only growing the limits costs a full (idle) redraw. Each channel is kept in a
+    # MinMaxPyramid so a frame draws about one point per pixel column of the visible window.
+    # The limits follow the data until the user zooms or pans; follow() (the toolbar's home
+    # button) goes back to following.
+
+    def __init__(self, figure, canvas, ax, fps=10, style='-o'):
+        self.figure = figure
+        self.canvas = canvas
+        self.ax = ax
+        self.style = style
+        self.marker = 'o' if 'o' in style else ''
+        self.min_frame_interval = 1.0 / fps
+
+        self.lines = []
+        self.series = []  # One MinMaxPyramid per channel
+
+        self._background = None
+        self._dirty = False
+        self._needs_full_draw = True
+        self._last_frame = 0.0
+        self._limits = None  # (x_min, x_max, y_min, y_max) around the data, shown while following
+        self.following = True  # False while the user has zoomed or panned
+        self._applying = False  # The limits are being set by the plot itself, not the user
+
+        self.frames_drawn = 0
+        self.full_draws = 0
+        canvas.mpl_connect('draw_event', self._on_draw)
+        # Zooming or panning changes the window, so the next frame re-reads the pyramids
+        ax.callbacks.connect('xlim_changed', self._on_limits_changed)
+        ax.callbacks.connect('ylim_changed', self._on_limits_changed)
+
+    def set_channels(self, labels):
+        for line in self.lines:
+            line.remove()
+        self.lines = [self.ax.plot([], [], self.style, label=label, animated=True)[0] for label in labels]
+        self.ax.legend(loc='upper left')
+        self.clear()
+
+    def clear(self):
+        self.series = [MinMaxPyramid() for _ in self.lines]
+        self._limits = None
+        self.following = True
+        for line in self.lines:
+            line.set_data([], [])
+        self._needs_full_draw = True
+        self._dirty = True
+
+    def update_point(self, index, x, values):
+        # Append point `index`, or replace it when it is the still-open last point
+        for series, value in zip(self.series, values):
+            series.set_point(index, x, value)
+        self._include(x, values)
+        self._dirty = True
+
+    def follow(self):
+        # Let the limits follow the data again after a zoom or pan
+        self.following = True
+        self._needs_full_draw = True
+        self._dirty = True
+
+    def render(self, force=False):
+        # Draw a frame if something changed and the frame budget allows it
+        if not self._dirty:
+            return False
+        now = time.monotonic()
+        if not force and now - self._last_frame < self.min_frame_interval:
+            return False
+        self._last_frame = now
+
+        if self._needs_full_draw or self._background is None:
+            self._apply_limits()
+            self._needs_full_draw = False
+            self._dirty = False
+            self.full_draws += 1
+            # The draw_event handler re-captures the background and paints the lines
+            self._decimate()
+            self.canvas.draw_idle()
+            return True
+
+        self._dirty = False
+        self._decimate()
+        self.canvas.restore_region(self._background)
+        for line in self.lines:
+            self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
+        self.frames_drawn += 1
+        return True
+
+    def _decimate(self):
+        # Give every line roughly one point per pixel column of the visible x range
+        x0, x1 = self.ax.get_xlim()
+        max_points = max(int(self.ax.bbox.width), 100)
+        for line, series in zip(self.lines, self.series):
+            xs, ys, level = series.query(x0, x1, max_points)
+            line.set_data(xs, ys)
+            # Markers only make sense while individual batch points are drawn
+            line.set_marker(self.marker if level == 0 else '')
+
+    def _on_limits_changed(self, ax):
+        # matplotlib's own autoscaling before the first frame is not the user either
+        if not self._applying and not ax.get_autoscale_on():
+            self.following = False  # Zoomed or panned: keep the user's view until follow()
+        self._dirty = True
+
+    def _include(self, x, values):
+        # Grow the limits with some headroom so the axes are not rescaled on every sample
+        finite = [value for value in values if not math.isnan(value)]
+        if not finite:
+            return
+        y_low, y_high = min(finite), max(finite)
+        if self._limits is None:
+            self._limits = (x, x, y_low, y_high)
+            self._needs_full_draw = self._needs_full_draw or self.following
+            return
+        x_min, x_max, y_min, y_max = self._limits
+        if x_min <= x <= x_max and y_min <= y_low and y_high <= y_max:
+            return
+        x_span = max(x_max - x_min, 1.0)
+        y_span = max(y_max - y_min, 1.0)
+        if x > x_max:
+            x_max = x + 0.25 * x_span
+        if x < x_min:
+            x_min = x
+        if y_low < y_min:
+            y_min = y_low - 0.1 * y_span
+        if y_high > y_max:
+            y_max = y_high + 0.1 * y_span
+        self._limits = (x_min, x_max, y_min, y_max)
+        self._needs_full_draw = self._needs_full_draw or self.following
+
+    def _apply_limits(self):
+        if self._limits is None or not self.following:
+            return
+        x_min, x_max, y_min, y_max = self._limits
+        if x_max == x_min:
+            x_max = x_min + 1.0
+        if y_max == y_min:
+            y_min, y_max = y_min - 1.0, y_max + 1.0
+        self._applying = True
+        try:
+            self.ax.set_xlim(x_min, x_max)
+            self.ax.set_ylim(y_min, y_max)
+        finally:
+            self._applying = False
+
+    def _on_draw(self, event):
+        # A full draw just happened (first show, resize or limit change): refresh the background
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines:
+            self.ax.draw_artist(line)
+
+
+def navigation_toolbar(live_plot, parent):
+    # matplotlib's zoom/pan toolbar for the plot, whose home button resumes following the data
+    # instead of going back to the limits of the first frame
+    from matplotlib.backends.backend_qtagg import NavigationToolbar2QT
+
+    class FollowingToolbar(NavigationToolbar2QT):
+        def home(self, *args):
+            live_plot.follow()
+            live_plot.render(force=True)
+
+    return FollowingToolbar(live_plot.canvas, parent)
@@ -0,0 +1,144 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class MinMaxPyramid:
+    # Multi-resolution min/max envelope of one (x, y) series, built incrementally.
+    # Level 0 holds the raw points; every bucket on level k summarises `fanout` entries of
+    # level k-1 as (first x, last x, x and y of the minimum, x and y of the maximum).
+    # Appending a point, or replacing the last one, only touches the last bucket per level.
+    # x must be non-decreasing (elapsed time).
+
+    def __init__(self, fanout=4):
+        self.fanout = fanout
+        self.x = array('d')
+        self.y = array('d')
+        self.levels = []  # Level k >= 1 is stored at levels[k - 1]
+
+    def __len__(self):
+        return len(self.x)
+
+    def append(self, x, y):
+        self.x.append(x)
+        self.y.append(y)
+        self._update_tail()
+
+    def replace_last(self, x, y):
+        self.x[-1] = x
+        self.y[-1] = y
+        self._update_tail()
+
+    def set_point(self, index, x, y):
+        # Same contract as LivePlot.update_point: append, or update the open last point
+        if index < len(self.x):
+            if index != len(self.x) - 1:
+                raise IndexError("only the last point of a MinMaxPyramid can be replaced")
+            self.replace_last(x, y)
+        else:
+            self.append(x, y)
+
+    def clear(self):
+        self.x = array('d')
+        self.y = array('d')
+        self.levels = []
+
+    def level_for(self, x0, x1, max_points):
+        # Finest level whose envelope of [x0, x1] fits in max_points points
+        start, stop = self._raw_range(x0, x1)
+        raw_count = stop - start
+        count = raw_count
+        level = 0
+        while count > max_points and level < len(self.levels):
+            level += 1
+            count = 2 * math.ceil(raw_count / self.fanout ** level)  # Every bucket is drawn as two points
+        return level
+
+    def query(self, x0, x1, max_points):
+        # Points to draw for the window [x0, x1]: raw data if it fits, otherwise the min/max
+        # envelope of the coarsest needed level. Returns (xs, ys, level).
+        level = self.level_for(x0, x1, max_points)
+        if level == 0:
+            start, stop = self._raw_range(x0, x1)
+            return self.x[start:stop].tolist(), self.y[start:stop].tolist(), 0
+
+        first, last, x_min, y_min, x_max, y_max = self.levels[level - 1]
+        # One bucket either side of the window so the line runs to the plot edges
+        start = max(bisect_left(last, x0) - 1, 0)
+        stop = min(bisect_right(first, x1) + 1, len(first))
+        xs = []
+        ys = []
+        for i in range(start, stop):
+            # Emit min and max in time order so the envelope is drawn as one line
+            if x_min[i] <= x_max[i]:
+                xs.extend((x_min[i], x_max[i]))
+                ys.extend((y_min[i], y_max[i]))
+            else:
+                xs.extend((x_max[i], x_min[i]))
+                ys.extend((y_max[i], y_min[i]))
+        return xs, ys, level
+
+    def _raw_range(self, x0, x1):
+        # One point either side of the window so the line runs to the plot edges
+        start = max(bisect_left(self.x, x0) - 1, 0)
+        stop = min(bisect_right(self.x, x1) + 1, len(self.x))
+        return start, stop
+
+    def _update_tail(self):
+        # Recompute the last bucket of every level from the level below
+        below_length = len(self.x)
+        level = 0
+        while below_length > 1 or level < len(self.levels):
+            bucket = (below_length - 1) // self.fanout
+            lo = bucket * self.fanout
+            hi = below_length
+            if level == len(self.levels):
+                if below_length <= self.fanout:
+                    break  # One bucket would summarise the whole level: stop growing
+                # New level: summarise everything below once, then keep it up to date at the tail
+                columns = tuple(array('d') for _ in range(6))
+                for earlier in range(bucket):
+                    for column, value in zip(columns, self._summarise(level, earlier * self.fanout,
+                                                                       (earlier + 1) * self.fanout)):
+                        column.append(value)
+                self.levels.append(columns)
+            summary = self._summarise(level, lo, hi)
+            columns = self.levels[level]
+            if bucket < len(columns[0]):
+                for column, value in zip(columns, summary):
+                    column[bucket] = value
+            else:
+                for column, value in zip(columns, summary):
+                    column.append(value)
+            below_length = len(columns[0])
+            level += 1
+
+    def _summarise(self, level, lo, hi):
+        # (first x, last x, x at min, min y, x at max, max y) over entries lo..hi-1 of `level`
+        if level == 0:
+            xs = self.x
+            first_x = xs[lo]
+            last_x = xs[hi - 1]
+            x_min = x_max = math.nan
+            y_min = y_max = math.nan
+            for i in range(lo, hi):
+                value = self.y[i]
+                if math.isnan(value):
+                    continue
+                if not value >= y_min:  # Also true while y_min is still NaN
+                    y_min, x_min = value, xs[i]
+                if not value <= y_max:
+                    y_max, x_max = value, xs[i]
+            return first_x, last_x, x_min, y_min, x_max, y_max
+
+        first, last, xs_min, ys_min, xs_max, ys_max = self.levels[level - 1]
+        x_min = x_max = math.nan
+        y_min = y_max = math.nan
+        for i in range(lo, hi):
+            if math.isnan(ys_min[i]):
+                continue  # Bucket without any valid sample
+            if not ys_min[i] >= y_min:
+                y_min, x_min = ys_min[i], xs_min[i]
+            if not ys_max[i] <= y_max:
+                y_max, x_max = ys_max[i], xs_max[i]
+        return first[lo], last[hi - 1], x_min, y_min, x_max, y_max
@@ -0,0 +1,114 @@
+import logging
+import logging.handlers
+import os
+import time
+from collections import deque
+
+# Every message of every run, rotated so a flapping port cannot fill the disk
+LOG_FILE = os.path.join(os.path.expanduser('~'), 'temperature_runs', 'temperature_daq.log')
+LOG_FILE_BYTES = 1_000_000
+LOG_FILE_BACKUPS = 5
+
+FILE_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_configured = False
+
+
+def configure_logging(log_file=LOG_FILE, level=logging.INFO, console=True):
+    # Console (as plain messages, like the old prints) and a rotating file; safe to call twice
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    root = logging.getLogger()
+    root.setLevel(level)
+    if console:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+    if log_file:
+        try:
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=LOG_FILE_BYTES,
+                                                           backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Log file {log_file} not available: {e}")
+        else:
+            handler.setFormatter(logging.Formatter(FILE_FORMAT))
+            root.addHandler(handler)
+
+
+class RingLogHandler(logging.Handler):
+    # Collects formatted lines for an on-screen log without touching any widget: records may
+    # come from any thread, and the view takes whatever accumulated once per frame.
+    # A message that repeats within `repeat_window` seconds is shown once; when the window
+    # is over, one "(diulang N kali)" line stands for all the repeats. At most `capacity`
+    # lines wait between two takes; if more arrive, the oldest are dropped and counted.
+
+    def __init__(self, capacity=1000, repeat_window=10.0, level=logging.NOTSET):
+        super().__init__(level)
+        self.capacity = capacity
+        self.repeat_window = repeat_window
+        self.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%H:%M:%S"))
+
+        self.records = 0
+        self.suppressed = 0  # Repeats folded into a "(diulang N kali)" line
+        self.dropped = 0  # Lines lost because the view did not take them in time
+
+        self._pending = deque()
+        self._dropped_since_take = 0
+        self._seen = {}  # (level, message) -> [time first shown, repeats since]
+
+    def emit(self, record):
+        # Runs with self.lock held (logging.Handler.handle)
+        try:
+            self.records += 1
+            key = (record.levelno, record.getMessage())
+            seen = self._seen.get(key)
+            if seen is not None and record.created - seen[0] < self.repeat_window:
+                seen[1] += 1
+                self.suppressed += 1
+                return
+            if seen is not None:
+                self._report_repeats(key, seen)
+            self._seen[key] = [record.created, 0]
+            if len(self._seen) > 4 * self.capacity:
+                self._expire(record.created, force=len(self._seen) - 2 * self.capacity)
+            self._append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def take(self, now=None):
+        # Lines to show since the last take, including repeat summaries that are due
+        now = time.time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            lines = list(self._pending)
+            self._pending.clear()
+            if self._dropped_since_take:
+                lines.insert(0, f"... {self._dropped_since_take} pesan dilewati")
+                self._dropped_since_take = 0
+        return lines
+
+    def _expire(self, now, force=0):
+        # Close repeat windows that are over; `force` closes that many of the oldest regardless
+        for key in list(self._seen):
+            seen = self._seen[key]
+            if force <= 0 and now - seen[0] < self.repeat_window:
+                continue
+            force -= 1
+            self._report_repeats(key, seen)
+            del self._seen[key]
+
+    def _report_repeats(self, key, seen):
+        if seen[1]:
+            stamp = time.strftime("%H:%M:%S", time.localtime(seen[0]))
+            self._append(f"{stamp} {key[1]} (diulang {seen[1]} kali dalam {self.repeat_window:g} detik)")
+            seen[1] = 0
+
+    def _append(self, line):
+        if len(self._pending) >= self.capacity:
+            self._pending.popleft()
+            self.dropped += 1
+            self._dropped_since_take += 1
+        self._pending.append(line)
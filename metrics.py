@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import time
+
+# Reported latency buckets: upper bounds of 2**bits nanoseconds, from about 1 us to 17 s
+BUCKET_BITS = range(10, 35)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    # Durations in integer nanoseconds, bucketed by bit length, i.e. in powers of two: observing
+    # is one index and two additions, with no float maths or search on the hot path. Like the
+    # other metrics it has a single writer (one engine thread, the GUI or the recorder).
+    __slots__ = ('counts', 'sum_ns')
+
+    def __init__(self):
+        self.counts = [0] * 65  # counts[k]: observations with 2**(k-1) <= ns < 2**k
+        self.sum_ns = 0
+
+    def observe(self, ns):
+        self.counts[ns.bit_length()] += 1
+        self.sum_ns += ns
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum_ns += other.sum_ns
+
+    def buckets(self):
+        # Cumulative [(upper bound in seconds, count)] over BUCKET_BITS, then (inf, total),
+        # from one copy of the counts so the total matches while the writer keeps observing
+        counts = list(self.counts)
+        result = []
+        cumulative = sum(counts[:BUCKET_BITS.start])
+        for bits in BUCKET_BITS:
+            cumulative += counts[bits]
+            result.append((2 ** bits / 1e9, cumulative))
+        result.append((math.inf, sum(counts)))
+        return result
+
+    def quantile(self, q):
+        # In seconds, interpolated geometrically within the bucket; NaN without observations
+        total = self.count
+        if not total:
+            return math.nan
+        target = q * total
+        seen = 0
+        for bits, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                lower = 2 ** (bits - 1) if bits else 0.5
+                return lower * 2 ** ((target - seen) / count) / 1e9
+            seen += count
+        return math.nan
+
+
+class Metrics:
+    # Named counters, gauges and histograms with labels, e.g. one series per channel.
+    # The hot paths only touch the metric objects; everything else (snapshots, the stats
+    # line, the JSON and Prometheus dumps) happens when somebody asks. Values that already
+    # live elsewhere are read through callbacks at that time instead of being counted twice.
+
+    def __init__(self):
+        self._families = {}  # name -> [type, help, {labels tuple: metric or callback}]
+
+    def counter(self, name, help_text, **labels):
+        return self._series(name, COUNTER, help_text, labels, Counter)
+
+    def gauge(self, name, help_text, **labels):
+        return self._series(name, GAUGE, help_text, labels, Gauge)
+
+    def histogram(self, name, help_text, **labels):
+        # Observed in nanoseconds, reported in seconds
+        return self._series(name, HISTOGRAM, help_text, labels, Histogram)
+
+    def callback(self, name, kind, help_text, function, **labels):
+        # A counter or gauge whose value is function(), read at snapshot time
+        family = self._families.setdefault(name, [kind, help_text, {}])
+        family[2][tuple(sorted(labels.items()))] = function
+
+    def remove(self, **labels):
+        # Forget every series with these labels, e.g. a channel that was disconnected
+        wanted = set(labels.items())
+        for family in self._families.values():
+            for key in [key for key in family[2] if wanted <= set(key)]:
+                del family[2][key]
+
+    def snapshot(self):
+        # {name: {'type', 'help', 'series': [{'labels', ...values}]}} of plain Python values
+        result = {}
+        for name, (kind, help_text, series) in self._families.items():
+            items = []
+            for labels, metric in list(series.items()):
+                item = {'labels': dict(labels)}
+                if kind == HISTOGRAM:
+                    buckets = metric.buckets()
+                    item.update(count=buckets[-1][1], sum=metric.sum_ns / 1e9, buckets=buckets,
+                                p50=metric.quantile(0.5), p99=metric.quantile(0.99))
+                else:
+                    item['value'] = metric() if callable(metric) else metric.value
+                items.append(item)
+            result[name] = {'type': kind, 'help': help_text, 'series': items}
+        return result
+
+    def to_json(self):
+        def number(value):
+            return None if isinstance(value, float) and not math.isfinite(value) else value
+        snapshot = self.snapshot()
+        for family in snapshot.values():
+            for item in family['series']:
+                for key in ('value', 'sum', 'p50', 'p99'):
+                    if key in item:
+                        item[key] = number(item[key])
+                if 'buckets' in item:
+                    item['buckets'] = [['+Inf' if math.isinf(bound) else bound, count] for bound, count in item['buckets']]
+        return json.dumps({'time': time.time(), 'metrics': snapshot}, indent=1)
+
+    def to_prometheus(self):
+        # Text exposition format, e.g. for node_exporter's textfile collector
+        lines = []
+        for name, family in self.snapshot().items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for item in family['series']:
+                labels = item['labels']
+                if family['type'] == HISTOGRAM:
+                    for bound, count in item['buckets']:
+                        le = '+Inf' if math.isinf(bound) else f"{bound:.6g}"
+                        lines.append(f"{name}_bucket{_labels(labels, le=le)} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {item['sum']!r}")
+                    lines.append(f"{name}_count{_labels(labels)} {item['count']}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {float(item['value'])!r}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Prometheus text for *.prom, JSON otherwise; replaced atomically so a scraper never
+        # reads half a file
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as file:
+            file.write(text)
+        os.replace(temporary, path)
+
+    def stats_line(self):
+        # One human-readable line: p50/p99 of every histogram over all its series, totals of
+        # the counters and gauges
+        parts = []
+        for name, (kind, _, series) in self._families.items():
+            if not series:
+                continue
+            label = name.replace('_seconds', '').replace('_total', '').replace('_', ' ')
+            if kind == HISTOGRAM:
+                merged = Histogram()
+                for metric in list(series.values()):
+                    merged.merge(metric)
+                if merged.count:
+                    parts.append(f"{label} p50 {_duration(merged.quantile(0.5))} p99 {_duration(merged.quantile(0.99))}")
+            else:
+                total = sum(metric() if callable(metric) else metric.value for metric in list(series.values()))
+                parts.append(f"{label} {_duration(total)}" if name.endswith('_seconds_total') else f"{label} {total:g}")
+        return "; ".join(parts)
+
+    def _series(self, name, kind, help_text, labels, factory):
+        family = self._families.setdefault(name, [kind, help_text, {}])
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = factory()
+        return metric
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+def _duration(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
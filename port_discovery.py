@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+
+import serial
+import serial.tools.list_ports
+
+log = logging.getLogger(__name__)
+
+# Last ports that answered, identified by USB VID/PID/serial number so they survive renumbering
+CACHE_FILE = os.path.join(os.path.expanduser('~'), '.temperature_daq_port.json')
+
+VALID_RESPONSE = re.compile(rb'\*-?\d+#')  # -1: open thermocouple, but a logger
+
+
+# Seconds a reopened logger gets to finish its reset and answer
+REOPEN_TIMEOUT = 3.0
+
+# Once the expected loggers have answered, the remaining ports get this many times the slowest
+# measured reset wait (counted from when the probes started), see discover_ports
+SETTLE_FACTOR = 2.0
+
+
+class DiscoveredPort:
+    def __init__(self, port_info, connection, reset_wait, baud_rate=9600):
+        self.port_info = port_info
+        self.device = port_info.device
+        self.connection = connection  # Already open and past the Arduino reset
+        self.reset_wait = reset_wait  # Seconds from opening the port to the first valid reply
+        self.baud_rate = baud_rate
+
+    def reopen(self, cancel=None):
+        # A new connection to this logger after the old one failed, or None; see reopen_port
+        found = reopen_port(self.port_info, self.baud_rate, REOPEN_TIMEOUT, cancel)
+        return found.connection if found else None
+
+
+def port_identity(port_info):
+    return {
+        'vid': port_info.vid,
+        'pid': port_info.pid,
+        'serial_number': port_info.serial_number,
+        'device': port_info.device,
+    }
+
+
+def load_cached_identities(cache_file=CACHE_FILE):
+    try:
+        with open(cache_file) as file:
+            identities = json.load(file)
+    except (OSError, ValueError):
+        return []
+    if isinstance(identities, dict):
+        identities = [identities]  # Cache written for a single device
+    return identities
+
+
+def save_cached_identities(port_infos, cache_file=CACHE_FILE):
+    try:
+        with open(cache_file, 'w') as file:
+            json.dump([port_identity(port_info) for port_info in port_infos], file)
+    except OSError as e:
+        log.warning(f"Could not save port cache {cache_file}: {e}")
+
+
+def matches_identity(port_info, identity):
+    if identity.get('vid') is not None and identity.get('serial_number'):
+        return (port_info.vid == identity['vid'] and port_info.pid == identity['pid']
+                and port_info.serial_number == identity['serial_number'])
+    # Adapters without USB descriptors can only be matched by device name
+    return port_info.device == identity.get('device')
+
+
+def probe_port(port_info, baud_rate, timeout, cancel=None):
+    # Open the port and keep asking "*S#" until the Arduino has finished its reset and answers.
+    # Returns a DiscoveredPort with the connection still open, or None.
+    cancel = cancel or threading.Event()
+    try:
+        conn = serial.Serial(port_info.device, baud_rate, timeout=0.2, write_timeout=timeout)
+    except serial.SerialException as e:
+        log.info(f"Attempted to open {port_info.device}, but failed: {e}")
+        return None
+
+    opened_at = time.monotonic()
+    deadline = opened_at + timeout
+    try:
+        conn.reset_input_buffer()
+        while time.monotonic() < deadline and not cancel.is_set():
+            try:
+                conn.write(b'*S#')
+                response = conn.readline()
+            except (serial.SerialTimeoutException, serial.SerialException) as e:
+                log.warning(f"Error probing {port_info.device}: {e}")
+                break
+            if VALID_RESPONSE.search(response):
+                conn.timeout = 1
+                return DiscoveredPort(port_info, conn, time.monotonic() - opened_at, baud_rate)
+    except serial.SerialException as e:
+        log.warning(f"Error probing {port_info.device}: {e}")
+    conn.close()
+    return None
+
+
+def reopen_port(port_info, baud_rate=9600, timeout=REOPEN_TIMEOUT, cancel=None):
+    # The same logger again after a cable blip: usually under its old name, but USB adapters
+    # can come back renumbered, so ports with its VID/PID/serial number are tried as well
+    found = probe_port(port_info, baud_rate, timeout, cancel)
+    if found is not None or cancel is not None and cancel.is_set():
+        return found
+    identity = port_identity(port_info)
+    for candidate in serial.tools.list_ports.comports():
+        if candidate.device != port_info.device and matches_identity(candidate, identity):
+            found = probe_port(candidate, baud_rate, timeout, cancel)
+            if found is not None:
+                return found
+    return None
+
+
+def discover_ports(baud_rate=9600, timeout=5.0, cache_file=CACHE_FILE):
+    # Probe every port at once and return all responders: the loggers of the last run first,
+    # in their previous order so they keep their channel numbers, then new ones by device name.
+    # Once the cached loggers (without a cache hit: the first logger) have answered, the other
+    # ports get up to SETTLE_FACTOR times the slowest reset measured so far, so a silent or
+    # unrelated port does not hold up the start for the whole timeout while a logger that
+    # resets a little slower than the first one is still found.
+    ports = list(serial.tools.list_ports.comports())
+    if not ports:
+        return []
+    identities = load_cached_identities(cache_file)
+    ranks = {}
+    for port_info in ports:
+        ranks[port_info.device] = next((rank for rank, identity in enumerate(identities)
+                                        if matches_identity(port_info, identity)), len(identities))
+    ports.sort(key=lambda port_info: (ranks[port_info.device], port_info.device))  # Cached ports first
+    expected = {port_info.device for port_info in ports if ranks[port_info.device] < len(identities)}
+
+    cancel = threading.Event()
+    found = []
+    pool = ThreadPoolExecutor(max_workers=len(ports))
+    pending = {pool.submit(probe_port, port_info, baud_rate, timeout, cancel) for port_info in ports}
+    started = time.monotonic()
+    deadline = started + timeout
+    settling = False
+    try:
+        while pending:
+            try:
+                for future in as_completed(pending, timeout=max(deadline - time.monotonic(), 0)):
+                    pending.discard(future)
+                    result = future.result()
+                    if result is not None:
+                        found.append(result)
+                        expected.discard(result.device)
+                    if found and not expected and not settling:
+                        # Restart the wait with the shorter deadline
+                        settling = True
+                        slowest = max(result.reset_wait for result in found)
+                        deadline = min(deadline, started + SETTLE_FACTOR * slowest)
+                        break
+            except FuturesTimeoutError:  # Not the builtin TimeoutError before Python 3.11
+                break
+    finally:
+        cancel.set()  # Probes still waiting give up within one read timeout
+        pool.shutdown(wait=True)
+    # A probe may have got its answer while being cancelled; it is a logger all the same
+    found.extend(result for result in (future.result() for future in pending) if result is not None)
+
+    found.sort(key=lambda result: (ranks[result.device], result.device))
+    if found:
+        save_cached_identities([result.port_info for result in found], cache_file)
+    return found
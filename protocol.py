@@ -0,0 +1,246 @@
+import time
+from collections import deque
+
+# Request/response framing shared with arduino_logger.ino:
+#   legacy:  "*S#"             -> "*<value>#\n"
+#   batch:   "*B<seq>,<count>#" -> "*B<seq>:<v1>,<v2>,...,<vn>#\n"
+#   clock:   "*T#"             -> "*T<millis>#\n"   (firmware with batch frames only)
+LEGACY_REQUEST = b'*S#'
+CLOCK_REQUEST = b'*T#'
+MAX_BATCH = 32  # Must match MAX_BATCH in the firmware
+
+# Seconds the MAX6675 needs per conversion (CONVERSION_MS in the firmware). The firmware waits
+# this long between reads, so it, not the link, limits how many fresh readings there are.
+CONVERSION_TIME = 0.22
+
+# Sent instead of a reading when the MAX6675 reports an open thermocouple (status bit 2)
+OPEN_THERMOCOUPLE = -1
+
+MODE_LEGACY = 'legacy'
+MODE_BATCH = 'batch'
+
+
+def fresh_readings(interval):
+    # Readings the MAX6675 can convert afresh within one sample interval (at least one)
+    return max(int(interval / CONVERSION_TIME), 1)
+
+
+def batch_request(seq, count):
+    return b'*B%d,%d#' % (seq, count)
+
+
+def batch_saves(count):
+    # Whether one batch frame of `count` readings costs fewer bytes on the link than `count`
+    # "*S#" round trips, with the longest sequence number; the values cost the same either way
+    frame = len(batch_request(9999, count)) + len(b'*B9999:#\n') + count - 1
+    return frame < count * (len(LEGACY_REQUEST) + len(b'*#\n'))
+
+
+# Fewer readings than this go as "*S#" requests even in batch mode: a frame's header and
+# sequence number would cost more than they save
+MIN_BATCH = next(count for count in range(1, MAX_BATCH + 1) if batch_saves(count))
+
+
+def parse_batch(payload):
+    # "B<seq>:<v1>,...,<vn>" -> (seq, [values]); raises ValueError on a malformed frame
+    if not payload.startswith('B') or ':' not in payload:
+        raise ValueError(f"not a batch frame: {payload!r}")
+    seq, values = payload[1:].split(':', 1)
+    return int(seq), [float(value) for value in values.split(',') if value]
+
+
+def parse_clock(payload):
+    # "T<millis>" -> device milliseconds; raises ValueError on anything else
+    if not payload.startswith('T'):
+        raise ValueError(f"not a clock frame: {payload!r}")
+    return int(payload[1:])
+
+
+class SampleProtocol:
+    # Batch mode packs up to batch_size readings into one frame, which saves link bytes from
+    # MIN_BATCH readings on; old firmware that does not answer the batch probe, and requests
+    # of fewer readings, are driven with "*S#" requests. Up to `window` requests can be in
+    # flight, but the firmware paces reads to CONVERSION_TIME, so more than one does not
+    # raise the reading rate (see bench_protocol.py) and the default is one.
+
+    def __init__(self, serial_conn, reader, batch_size=10, window=1, timeout=1.0):
+        self.serial_conn = serial_conn
+        self.reader = reader
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.window = window  # Requests allowed to be outstanding at once
+        self.timeout = timeout  # Seconds to wait for a frame, plus CONVERSION_TIME per reading of a batch
+        self.mode = MODE_LEGACY
+        self.clock_supported = False  # The firmware answers "*T#" with its millis()
+        self.last_sample_ns = None  # Reader stamp of the last frame that delivered a reading
+        self._seq = 0
+
+        # Link accounting for the bytes-per-sample figures
+        self.bytes_written = 0
+        self.samples_received = 0
+        self.value_chars = 0
+        self.lost_requests = 0
+        self._bytes_read_start = reader.bytes_read
+
+        # Histograms set by AcquisitionEngine.instrument, or None
+        self.round_trip = None  # From writing a request to the frame that answers it
+        self.parse_latency = None  # Turning one answer frame into readings
+
+    def negotiate(self, keep_counters=False):
+        # Probe for batch frames and the device clock at once; old firmware simply never
+        # answers "*B" or "*T", so it costs one timeout, not two. After a reconnect the link
+        # figures of the run are kept (keep_counters), without the probe's own traffic.
+        self.mode = MODE_LEGACY
+        self.clock_supported = False
+        self.reader.clear()
+        bytes_read = self.reader.bytes_read
+        seq = self._next_seq()
+        self.serial_conn.write(batch_request(seq, 1) + CLOCK_REQUEST)
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline and not (self.mode == MODE_BATCH and self.clock_supported):
+            payload = self.reader.read_frame(timeout=max(deadline - time.monotonic(), 0))
+            if payload is None:
+                break
+            if payload.startswith('T'):
+                self.clock_supported = True
+                continue
+            try:
+                reply_seq, _ = parse_batch(payload)
+            except ValueError:
+                continue
+            if reply_seq == seq:
+                self.mode = MODE_BATCH
+        self._bytes_read_start += self.reader.bytes_read - bytes_read
+        if not keep_counters:
+            self.reset_counters()
+        return self.mode
+
+    def probe_clock(self):
+        # One "*T#" round trip: (host ns when sent, host ns when the answer arrived, device ms),
+        # or None if no answer came. Readings still in flight from a lost request are skipped.
+        # Probe traffic is kept out of the bytes-per-sample figures.
+        bytes_read = self.reader.bytes_read
+        try:
+            sent = time.monotonic_ns()
+            self.serial_conn.write(CLOCK_REQUEST)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                payload = self.reader.read_frame(timeout=max(deadline - time.monotonic(), 0))
+                if payload is None:
+                    return None
+                try:
+                    return sent, self.reader.last_frame_ns, parse_clock(payload)
+                except ValueError:
+                    continue
+        finally:
+            self._bytes_read_start += self.reader.bytes_read - bytes_read
+
+    def request_samples(self, count):
+        self.last_sample_ns = None
+        if self.mode == MODE_BATCH and count >= MIN_BATCH:
+            return self._request_batches(count)
+        return self._request_legacy(count)
+
+    def reset_counters(self):
+        self.bytes_written = 0
+        self.samples_received = 0
+        self.value_chars = 0
+        self.lost_requests = 0
+        self._bytes_read_start = self.reader.bytes_read
+
+    def bytes_per_sample(self):
+        if not self.samples_received:
+            return 0.0
+        link_bytes = self.bytes_written + self.reader.bytes_read - self._bytes_read_start
+        return link_bytes / self.samples_received
+
+    def legacy_bytes_per_sample(self):
+        # What the same readings would have cost as "*S#" + "*<value>#\n" round trips
+        if not self.samples_received:
+            return 0.0
+        return len(LEGACY_REQUEST) + self.value_chars / self.samples_received + 3
+
+    def _request_legacy(self, count):
+        values = []
+        sent = 0
+        outstanding = deque()  # Send time of every request in flight; answers come in order
+        while sent < count or outstanding:
+            while sent < count and len(outstanding) < self.window:
+                outstanding.append(time.monotonic_ns())
+                self._write(LEGACY_REQUEST)
+                sent += 1
+            payload = self.reader.read_frame(timeout=self.timeout)
+            if payload is None:
+                # Everything still in flight is considered lost
+                self.lost_requests += len(outstanding)
+                outstanding.clear()
+                continue
+            sent_at = outstanding.popleft()
+            if self.round_trip is not None:
+                self.round_trip.observe(self.reader.last_frame_ns - sent_at)
+            parse_start = time.perf_counter_ns()
+            try:
+                values.append(float(payload))
+            except ValueError:
+                continue  # Skip invalid readings
+            if self.parse_latency is not None:
+                self.parse_latency.observe(time.perf_counter_ns() - parse_start)
+            self.last_sample_ns = self.reader.last_frame_ns
+            self._count_value(payload)
+        return values
+
+    def _request_batches(self, count):
+        # Frames of equal size, so no short remainder frame falls below MIN_BATCH
+        frames = -(-count // self.batch_size)
+        sizes = [count // frames + (index < count % frames) for index in range(frames)]
+
+        pending = {}  # seq -> send time of the request
+        results = {}
+        order = []  # Sequence numbers in the order they were sent
+        next_size = 0
+        while next_size < len(sizes) or pending:
+            while next_size < len(sizes) and len(pending) < self.window:
+                seq = self._next_seq()
+                pending[seq] = time.monotonic_ns()
+                order.append(seq)
+                self._write(batch_request(seq, sizes[next_size]))
+                next_size += 1
+            # The firmware converts every reading of a frame before it answers
+            payload = self.reader.read_frame(timeout=self.timeout + max(sizes) * CONVERSION_TIME)
+            if payload is None:
+                self.lost_requests += len(pending)
+                pending.clear()
+                continue
+            parse_start = time.perf_counter_ns()
+            try:
+                seq, batch = parse_batch(payload)
+            except ValueError:
+                continue  # Garbled frame, its request will time out
+            if self.parse_latency is not None:
+                self.parse_latency.observe(time.perf_counter_ns() - parse_start)
+            sent_at = pending.pop(seq, None)
+            if sent_at is None:
+                continue  # Late answer to a request we already gave up on
+            if self.round_trip is not None:
+                self.round_trip.observe(self.reader.last_frame_ns - sent_at)
+            results[seq] = batch
+            self.last_sample_ns = self.reader.last_frame_ns
+            for value in payload.split(':', 1)[1].split(','):
+                self._count_value(value)
+
+        # Keep request ordering even if frames were reordered
+        values = []
+        for seq in order:
+            values.extend(results.get(seq, ()))
+        return values
+
+    def _count_value(self, text):
+        self.samples_received += 1
+        self.value_chars += len(text)
+
+    def _next_seq(self):
+        self._seq = (self._seq + 1) % 10000
+        return self._seq
+
+    def _write(self, data):
+        self.serial_conn.write(data)
+        self.bytes_written += len(data)
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import json
+import logging
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from metrics import COUNTER, GAUGE
+from recorder import HEADER, binary_header, record_struct
+
+log = logging.getLogger(__name__)
+
+# Every message is MESSAGE (kind, payload length) followed by the payload:
+#   HELLO   the header of a binary recording: channel names and start time
+#   ROWS    records exactly as in a binary recording: unix timestamp, value per channel (float64)
+#   EVENT   one line of the events file (JSON)
+#   DROPPED rows this subscriber missed because it did not keep up (uint32)
+# A subscriber that writes HELLO and the ROWS payloads to a file gets a readable recording.
+MESSAGE = struct.Struct('<BI')
+HELLO = ord('H')
+ROWS = ord('R')
+EVENT = ord('E')
+DROPPED = ord('D')
+DROP_COUNT = struct.Struct('<I')
+
+# Rows kept for subscribers that join late, and rows one subscriber may fall behind by
+HISTORY_ROWS = 600
+CLIENT_QUEUE_ROWS = 1000
+
+# Seconds a subscriber may block every write before it is disconnected
+STALL_TIMEOUT = 30.0
+
+
+def message(kind, payload):
+    return MESSAGE.pack(kind, len(payload)) + payload
+
+
+def decode_hello(payload):
+    # (channel names, start time) of a HELLO message
+    _, _, _, start, names_length = HEADER.unpack_from(payload)
+    names = json.loads(payload[HEADER.size:HEADER.size + names_length].decode('utf-8'))
+    return names, datetime.fromtimestamp(start)
+
+
+def decode_rows(payload, channel_count):
+    # [(unix timestamp, [values])] of a ROWS message
+    record = record_struct(channel_count)
+    return [(row[0], list(row[1:])) for row in record.iter_unpack(payload)]
+
+
+async def read_message(reader):
+    # (kind, payload) of the next message, or None once the server has gone
+    try:
+        kind, length = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+        return kind, await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+class Subscriber(asyncio.Protocol):
+    # One connection. While the socket keeps up, messages go straight to the transport; once
+    # it pushes back (pause_writing), they wait in a queue of at most `max_rows` rows, the
+    # oldest rows are dropped beyond that, and what is left goes out as one write when the
+    # socket drains. Messages are encoded once by the publisher, whatever the subscriber count.
+
+    def __init__(self, publisher, max_rows, stall_timeout):
+        self.publisher = publisher
+        self.max_rows = max_rows
+        self.stall_timeout = stall_timeout
+        self.transport = None
+        self.address = None
+        self.queue = deque()  # (message bytes, rows in it) while paused
+        self.queued_rows = 0
+        self.paused_at = None  # Loop time the socket started pushing back, None while it keeps up
+        self.dropped = 0  # Rows dropped and not yet reported to the subscriber
+        self.dropped_total = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.address = transport.get_extra_info('peername')
+        # Small buffers, so a slow subscriber backs up into the bounded queue
+        transport.set_write_buffer_limits(high=64 * 1024)
+        self.publisher._join(self)
+
+    def connection_lost(self, exc):
+        self.publisher._leave(self)
+
+    def data_received(self, data):
+        pass  # Subscribers have nothing to say
+
+    def pause_writing(self):
+        self.paused_at = asyncio.get_running_loop().time()
+
+    def resume_writing(self):
+        self.paused_at = None
+        if self.queue or self.dropped:
+            self.transport.write(self._take())
+
+    def send(self, data, rows=0):
+        if self.paused_at is None:
+            self.transport.write(data)
+            return
+        if asyncio.get_running_loop().time() - self.paused_at > self.stall_timeout:
+            log.warning(f"Subscriber {self.address} stalled for {self.stall_timeout:g} s, disconnected")
+            self.transport.abort()
+            return
+        self.queue.append((data, rows))
+        self.queued_rows += rows
+        # Too far behind: drop its oldest rows; HELLO and events are always kept
+        while self.queued_rows > self.max_rows:
+            for index, (_, count) in enumerate(self.queue):
+                if count:
+                    del self.queue[index]
+                    self.queued_rows -= count
+                    self.dropped += count
+                    self.dropped_total += count
+                    self.publisher.dropped_rows += count
+                    break
+
+    def _take(self):
+        # Everything queued as one buffer, the drop notice first
+        parts = []
+        if self.dropped:
+            parts.append(message(DROPPED, DROP_COUNT.pack(self.dropped)))
+            self.dropped = 0
+        parts.extend(data for data, _ in self.queue)
+        self.queue.clear()
+        self.queued_rows = 0
+        return b''.join(parts)
+
+
+class SamplePublisher:
+    # Streams the rows of a live run to any number of TCP subscribers, e.g. the dashboards
+    # of a control room. The server runs an asyncio loop in its own thread; publish() only
+    # hands the rows over, so the GUI or daemon thread never waits on a network client.
+    # Each subscriber has its own bounded queue: a slow one loses its oldest rows (and is
+    # told how many), gets what is left coalesced into one write, and is dropped if it
+    # blocks for STALL_TIMEOUT. New subscribers first get the last HISTORY_ROWS rows.
+
+    def __init__(self, channel_names, start_time, host='127.0.0.1', port=8765, history_rows=HISTORY_ROWS,
+                 client_queue_rows=CLIENT_QUEUE_ROWS, stall_timeout=STALL_TIMEOUT):
+        self.host = host
+        self.port = port  # The bound port once started, if 0 was asked for
+        self.client_queue_rows = client_queue_rows
+        self.stall_timeout = stall_timeout
+        self.subscribers = set()
+        self.published_rows = 0
+        self.dropped_rows = 0  # Rows some subscriber did not get
+        self.dispatch_latency = None  # Histogram of fanning one batch out, see instrument
+
+        self._channel_names = list(channel_names)
+        self._hello = message(HELLO, binary_header(self._channel_names, start_time))
+        self._record = record_struct(len(self._channel_names))
+        self._history = deque(maxlen=history_rows)  # Encoded records
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._error = None
+
+    def start(self, timeout=5.0):
+        self._thread = threading.Thread(target=self._run, name="SamplePublisher", daemon=True)
+        self._thread.start()
+        self._started.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self, timeout=2.0):
+        self._call(self._shutdown)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def instrument(self, metrics):
+        self.dispatch_latency = metrics.histogram('publish_seconds', "Encoding one batch of rows and queueing it for every subscriber")
+        metrics.callback('subscribers', GAUGE, "Connected live-data subscribers", lambda: len(self.subscribers))
+        metrics.callback('published_rows_total', COUNTER, "Rows published to subscribers", lambda: self.published_rows)
+        metrics.callback('subscriber_dropped_rows_total', COUNTER, "Rows dropped for subscribers that fell behind",
+                         lambda: self.dropped_rows)
+
+    def publish(self, rows):
+        # [(unix timestamp, [value per channel])]; thread-safe, never blocks
+        if rows:
+            self._call(self._dispatch, rows)
+
+    def publish_event(self, event):
+        # A dict as written to the events file
+        self._call(self._send_all, message(EVENT, json.dumps(event).encode('utf-8')))
+
+    def set_channels(self, channel_names, start_time):
+        # A new set of channels (or a new run): subscribers get a new HELLO and the history restarts
+        self._call(self._set_channels, list(channel_names), start_time)
+
+    def _call(self, function, *args):
+        # Run on the server's loop; nothing to do once it has stopped
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(function, *args)
+            except RuntimeError:
+                pass  # Closed meanwhile
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._server = self._loop.run_until_complete(
+                self._loop.create_server(self._subscriber, self.host, self.port, reuse_address=True))
+        except OSError as e:
+            self._error = e
+            self._loop.close()
+            self._loop = None
+            self._started.set()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            loop, self._loop = self._loop, None
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def _shutdown(self):
+        self._server.close()
+        for subscriber in list(self.subscribers):
+            subscriber.transport.abort()
+        self._loop.stop()
+
+    def _dispatch(self, rows):
+        dispatch_start = time.perf_counter_ns()
+        records = [self._record.pack(timestamp, *values) for timestamp, values in rows]
+        self._history.extend(records)
+        data = message(ROWS, b''.join(records))
+        for subscriber in list(self.subscribers):
+            subscriber.send(data, len(records))
+        self.published_rows += len(records)
+        if self.dispatch_latency is not None:
+            self.dispatch_latency.observe(time.perf_counter_ns() - dispatch_start)
+
+    def _send_all(self, data):
+        for subscriber in list(self.subscribers):
+            subscriber.send(data)
+
+    def _set_channels(self, channel_names, start_time):
+        self._channel_names = channel_names
+        self._hello = message(HELLO, binary_header(channel_names, start_time))
+        self._record = record_struct(len(channel_names))
+        self._history.clear()
+        self._send_all(self._hello)
+
+    def _subscriber(self):
+        return Subscriber(self, self.client_queue_rows, self.stall_timeout)
+
+    def _join(self, subscriber):
+        subscriber.send(self._hello)
+        if self._history:
+            subscriber.send(message(ROWS, b''.join(self._history)), len(self._history))
+        self.subscribers.add(subscriber)
+        log.info(f"Subscriber {subscriber.address} connected ({len(self.subscribers)} connected)")
+
+    def _leave(self, subscriber):
+        self.subscribers.discard(subscriber)
+        log.info(f"Subscriber {subscriber.address} disconnected ({subscriber.dropped_total} rows dropped)")
+
+
+async def watch(host, port):
+    # Print what a station publishes, as a remote console would
+    reader, writer = await asyncio.open_connection(host, port)
+    names = []
+    while True:
+        received = await read_message(reader)
+        if received is None:
+            break
+        kind, payload = received
+        if kind == HELLO:
+            names, start_time = decode_hello(payload)
+            print(f"{', '.join(names)}, run started {start_time:%Y-%m-%d %H:%M:%S}")
+        elif kind == ROWS:
+            for timestamp, values in decode_rows(payload, len(names)):
+                print(f"{datetime.fromtimestamp(timestamp):%H:%M:%S.%f} " +
+                      "  ".join(f"{name}: {value:.2f}" for name, value in zip(names, values)))
+        elif kind == EVENT:
+            print(payload.decode('utf-8'))
+        elif kind == DROPPED:
+            print(f"... {DROP_COUNT.unpack(payload)[0]} rows dropped, too slow")
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch the live rows a logging station publishes")
+    parser.add_argument('address', help="HOST:PORT of the station (see acquisition_core.py --serve)")
+    args = parser.parse_args()
+    host, _, port = args.address.rpartition(':')
+    try:
+        asyncio.run(watch(host or 'localhost', int(port)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+import json
+import logging
+import math
+import os
+import queue
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from metrics import COUNTER, GAUGE
+from timebase import Timebase
+
+log = logging.getLogger(__name__)
+
+# Where runs are recorded while they are being acquired
+RECORDINGS_DIR = os.path.join(os.path.expanduser('~'), 'temperature_runs')
+
+FORMAT_BINARY = 'bin'
+FORMAT_CSV = 'csv'
+
+# Binary layout: header, channel names as JSON, then fixed-width little-endian records of
+# (unix timestamp, value per channel), all float64. A torn last record is ignored on read.
+# Rows arrive stamped with time.monotonic_ns(); the writer maps them to unix time through the
+# run's Timebase, so the file's time axis is monotonic even if the wall clock is stepped.
+MAGIC = b'TDAQ'
+VERSION = 1
+HEADER = struct.Struct('<4sHHdI')  # magic, version, channel count, start time, names length
+
+
+def record_struct(channel_count):
+    return struct.Struct('<d%dd' % channel_count)
+
+
+def binary_header(channel_names, start_time):
+    # Header and channel names that start a binary recording
+    names = json.dumps(list(channel_names)).encode('utf-8')
+    return HEADER.pack(MAGIC, VERSION, len(channel_names), start_time.timestamp(), len(names)) + names
+
+
+def events_path(path):
+    # Rate changes, gaps and other events of a run are written next to its samples
+    return path + '.events'
+
+
+def new_recording_path(start_time, record_format=FORMAT_BINARY, directory=RECORDINGS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"run_{start_time:%Y%m%d_%H%M%S}.{record_format}")
+
+
+class SampleRecorder:
+    # Appends every raw sample row to disk from a background thread.
+    # Rows are written in batches and fsync'd every fsync_interval seconds, so a crash loses
+    # at most that much data and the GUI thread never waits on the disk.
+
+    def __init__(self, path, channel_names, start_time, record_format=FORMAT_BINARY,
+                 batch_rows=256, flush_interval=0.5, fsync_interval=5.0, timebase=None):
+        self.path = path
+        self.channel_names = list(channel_names)
+        self.start_time = start_time
+        self.timebase = timebase or Timebase()  # Maps the monotonic stamps of rows and events to unix time
+        self.record_format = record_format
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self._record = record_struct(len(self.channel_names))
+
+        # Counters for write amplification and CPU cost
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.write_calls = 0
+        self.fsync_calls = 0
+        self.cpu_time = 0.0
+        self.write_latency = None  # Histograms set by instrument, or None
+        self.fsync_latency = None
+
+        self._rows = deque()  # Appends and pops are thread-safe; the writer polls it
+        self._events = deque()  # JSON lines for the events file
+        self._events_file = None
+        self._flush_requests = queue.Queue()
+        self._stop_event = threading.Event()
+        self._file = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.bytes_written:
+            self._file = open(self.path, 'ab')  # Started again after stop: carry on with our own file
+        else:
+            self._file = self._create_file()
+            self._write(self._file_header())
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="SampleRecorder", daemon=True)
+        self._thread.start()
+
+    def instrument(self, metrics):
+        self.write_latency = metrics.histogram('record_write_seconds', "Writing one batch of rows to the recording")
+        self.fsync_latency = metrics.histogram('record_fsync_seconds', "fsync of the recording")
+        metrics.callback('record_queue_depth', GAUGE, "Rows waiting for the recording writer", self._rows.__len__)
+        metrics.callback('recorded_rows_total', COUNTER, "Rows written to the recording", lambda: self.rows_written)
+
+    def record(self, timestamp, values):
+        # Called from the GUI thread with a monotonic ns stamp; only enqueues
+        self._rows.append((timestamp, values))
+
+    def record_event(self, timestamp, kind, **fields):
+        # Something that is not a sample but belongs to the run, e.g. a sampling rate change
+        event = {'time': self.timebase.wall_time(timestamp), 'kind': kind}
+        event.update(fields)
+        self._events.append(json.dumps(event) + '\n')
+
+    def flush(self, timeout=5.0):
+        # Block until everything recorded so far is on disk
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._flush_requests.put(done)
+        done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._events_file is not None:
+            self._events_file.close()
+            self._events_file = None
+
+    def payload_bytes(self):
+        # Bytes of actual sample data: one float64 timestamp plus one float64 per channel
+        return self.rows_written * 8 * (len(self.channel_names) + 1)
+
+    def _run(self):
+        last_fsync = time.monotonic()
+        pending = []
+        while True:
+            stopping = self._stop_event.is_set()
+            flush_waiters = []
+            while not self._flush_requests.empty():
+                flush_waiters.append(self._flush_requests.get_nowait())
+            if not (stopping or flush_waiters or len(self._rows) >= self.batch_rows):
+                # Sleep until there is a full batch, a flush request or the flush interval is up
+                try:
+                    flush_waiters.append(self._flush_requests.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    pass
+
+            cpu_start = time.thread_time()
+            try:
+                while self._rows:
+                    pending.append(self._rows.popleft())
+                if pending:
+                    write_start = time.perf_counter_ns()
+                    self._write(b''.join([self._encode(row) for row in pending]))
+                    if self.write_latency is not None:
+                        self.write_latency.observe(time.perf_counter_ns() - write_start)
+                    self.rows_written += len(pending)
+                    pending = []
+                if self._events:
+                    self._write_events()
+                now = time.monotonic()
+                if flush_waiters or stopping or now - last_fsync >= self.fsync_interval:
+                    fsync_start = time.perf_counter_ns()
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    if self._events_file is not None:
+                        self._events_file.flush()
+                        os.fsync(self._events_file.fileno())
+                    if self.fsync_latency is not None:
+                        self.fsync_latency.observe(time.perf_counter_ns() - fsync_start)
+                    self.fsync_calls += 1
+                    last_fsync = now
+            except OSError as e:
+                # Keep the rows and try again on the next pass (e.g. disk temporarily full)
+                log.error(f"Recording error on {self.path}: {e}")
+            self.cpu_time += time.thread_time() - cpu_start
+
+            for done in flush_waiters:
+                done.set()
+            if stopping and not self._rows and not pending and not self._events:
+                return
+
+    def _create_file(self):
+        # Never append to a file that is already there: a run started within the same second as
+        # the last one gets run_..._1.bin and so on, instead of rows after another run's header
+        stem, extension = os.path.splitext(self.path)
+        suffix = 0
+        while True:
+            path = f"{stem}_{suffix}{extension}" if suffix else self.path
+            try:
+                file = open(path, 'xb')
+            except FileExistsError:
+                suffix += 1
+                continue
+            self.path = path
+            return file
+
+    def _write(self, data):
+        self._file.write(data)
+        self.bytes_written += len(data)
+        self.write_calls += 1
+
+    def _write_events(self):
+        if self._events_file is None:
+            self._events_file = open(events_path(self.path), 'a')
+        while self._events:
+            self._events_file.write(self._events[0])
+            self._events.popleft()  # Only once written, so a failed write is retried
+
+    def _encode(self, row):
+        stamp, values = row
+        timestamp = self.timebase.wall_time(stamp)
+        if self.record_format == FORMAT_CSV:
+            return (f"{timestamp:.6f}," + ",".join(repr(float(value)) for value in values) + "\n").encode('ascii')
+        return self._record.pack(timestamp, *values)
+
+    def _file_header(self):
+        if self.record_format == FORMAT_CSV:
+            return ("timestamp," + ",".join(self.channel_names) + "\n").encode('utf-8')
+        return binary_header(self.channel_names, self.start_time)
+
+
+def read_header(path):
+    # (channel names, start time, offset of the first record) of a binary recording. An empty
+    # or cut-off header (a run that crashed as it started) is a ValueError like any non-recording.
+    with open(path, 'rb') as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} is not a recording (header cut off at {len(header)} bytes)")
+        magic, version, channel_count, start, names_length = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a recording")
+        names = json.loads(file.read(names_length).decode('utf-8'))
+    if len(names) != channel_count:
+        raise ValueError(f"{path} is not a recording (channel names cut off)")
+    return names, datetime.fromtimestamp(start), HEADER.size + names_length
+
+
+def read_events(path):
+    # Events recorded with a run, oldest first; a torn last line is ignored
+    try:
+        with open(events_path(path)) as file:
+            lines = file.readlines()
+    except OSError:
+        return []
+    events = []
+    for line in lines:
+        if line.endswith('\n'):
+            events.append(json.loads(line))
+    return events
+
+
+def read_recording(path):
+    # Returns (channel names, start time or None, iterator of (unix timestamp, [values]))
+    if path.endswith('.' + FORMAT_CSV):
+        with open(path) as file:
+            names = file.readline().strip().split(',')[1:]
+
+        def csv_rows():
+            with open(path) as file:
+                file.readline()
+                for line in file:
+                    if not line.endswith('\n'):
+                        return  # Torn last line
+                    fields = line.split(',')
+                    yield float(fields[0]), [float(value) for value in fields[1:]]
+        return names, None, csv_rows()
+
+    names, start_time, offset = read_header(path)
+    record = record_struct(len(names))
+
+    def binary_rows():
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            while True:
+                chunk = file.read(record.size * 4096)
+                usable = len(chunk) - len(chunk) % record.size  # Drop a torn last record
+                for fields in record.iter_unpack(chunk[:usable]):
+                    yield fields[0], list(fields[1:])
+                if len(chunk) < record.size * 4096:
+                    return
+    return names, start_time, binary_rows()
+
+
+def export_batch_csv(path, out_path, batch_value, start_time=None):
+    # Write the "SIMPAN DATA" CSV (batch averages over elapsed seconds) straight from a recording.
+    # The whole run is loaded and averaged as arrays, see run_report, so a day-long run exports
+    # in a fraction of a second; each batch is stamped with the time of its last row.
+    # numpy is only needed once something is exported, not to show the window
+    import numpy as np
+    from run_report import batch_means, load_run
+
+    names, recorded_start, times, values, _ = load_run(path)
+    origin = start_time or recorded_start
+    if origin is not None:
+        start = origin.timestamp()
+    else:
+        start = float(times[0]) if len(times) else 0.0  # CSV recordings start at their first row
+    means = np.column_stack([batch_means(values[:, channel], batch_value) for channel in range(len(names))])
+    last_rows = np.minimum(np.arange(1, len(means) + 1) * batch_value, len(times)) - 1
+    elapsed = (times[last_rows] - start).tolist()
+
+    with open(out_path, "w") as file:
+        if len(names) == 1:
+            file.write("Waktu (s),Temperatur (Celcius)\n")
+        else:
+            file.write("Waktu (s)," + ",".join(f"{name} (Celcius)" for name in names) + "\n")
+        for interval, temps in zip(elapsed, means.tolist()):
+            values = ",".join("" if math.isnan(temp) else f"{temp:.2f}" for temp in temps)
+            file.write(f"{round(interval, 6)},{values}\n")
+    return len(means)
@@ -0,0 +1,160 @@
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import deque
+
+from recorder import read_header, record_struct
+from timebase import Timebase
+
+# Every INDEX_STRIDE-th record timestamp is kept in memory for coarse seeking
+INDEX_STRIDE = 4096
+
+
+class RecordingView:
+    # Read-only, memory-mapped view of a binary recording. Rows are decoded on demand, so a
+    # month-long run is never loaded into RAM; seeking goes through a sparse time index.
+
+    def __init__(self, path):
+        self.path = path
+        self.channel_names, self.start_time, self._offset = read_header(path)
+        self._record = record_struct(len(self.channel_names))
+        self._file = open(path, 'rb')
+        size = os.path.getsize(path)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        # A torn last record from a crash is simply not counted
+        self._length = max(size - self._offset, 0) // self._record.size
+
+        self._index = array('d', (self.timestamp(i) for i in range(0, self._length, INDEX_STRIDE)))
+
+    def __len__(self):
+        return self._length
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def timestamp(self, position):
+        return self._record.unpack_from(self._map, self._offset + position * self._record.size)[0]
+
+    def row(self, position):
+        # (unix timestamp, [value per channel])
+        fields = self._record.unpack_from(self._map, self._offset + position * self._record.size)
+        return fields[0], list(fields[1:])
+
+    def rows(self, start=0, stop=None):
+        stop = self._length if stop is None else min(stop, self._length)
+        for fields in self._record.iter_unpack(self._map[self._offset + start * self._record.size:
+                                                         self._offset + stop * self._record.size]):
+            yield fields[0], list(fields[1:])
+
+    def position_at(self, timestamp):
+        # Index of the first record at or after `timestamp` (unix seconds)
+        if not self._length:
+            return 0
+        block = max(bisect_right(self._index, timestamp) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + INDEX_STRIDE, self._length)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.timestamp(middle) < timestamp:
+                lo = middle + 1
+            else:
+                hi = middle
+        return lo
+
+    def duration(self):
+        if not self._length:
+            return 0.0
+        return self.timestamp(self._length - 1) - self.timestamp(0)
+
+
+class ReplaySource:
+    # Plays a recording back through the same drain() interface as the live acquisition:
+    # at real time (speed=1), N times faster (speed=N) or as fast as possible (speed=None).
+    # Rows come out stamped like live samples, on `timebase`, which starts at the recording's start.
+
+    def __init__(self, path, speed=1.0, max_queue=10000):
+        self.view = RecordingView(path)
+        self.channel_names = self.view.channel_names
+        self.start_time = self.view.start_time
+        self.timebase = Timebase.from_wall(self.start_time)
+        self.speed = speed
+        self.max_queue = max_queue
+        self.position = 0
+
+        self._rows = deque()
+        self._space = threading.Condition()
+        self._stop_event = threading.Event()
+        self._paused = threading.Event()
+        self._seek_to = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ReplaySource", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        with self._space:
+            self._space.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.view.close()
+
+    def pause(self):
+        self._paused.set()
+
+    def resume(self):
+        self._paused.clear()
+
+    def seek(self, when):
+        # Continue playback from the first sample at or after `when` (datetime)
+        self._seek_to = self.view.position_at(when.timestamp())
+
+    def is_finished(self):
+        return self.position >= len(self.view) and not self._rows
+
+    def drain(self, max_items=None):
+        items = []
+        while self._rows and (max_items is None or len(items) < max_items):
+            timestamp, values = self._rows.popleft()
+            items.append((self.timebase.stamp(timestamp), values))
+        with self._space:
+            self._space.notify_all()
+        return items
+
+    def _run(self):
+        anchor_wall = None
+        anchor_sample = None
+        while not self._stop_event.is_set() and self.position < len(self.view):
+            if self._seek_to is not None:
+                self.position, self._seek_to = self._seek_to, None
+                anchor_wall = None
+            if self._paused.is_set():
+                self._stop_event.wait(0.05)
+                anchor_wall = None  # Restart pacing after a pause
+                continue
+
+            timestamp, values = self.view.row(self.position)
+            if self.speed:
+                if anchor_wall is None:
+                    anchor_wall, anchor_sample = time.monotonic(), timestamp
+                delay = anchor_wall + (timestamp - anchor_sample) / self.speed - time.monotonic()
+                if delay > 0 and self._stop_event.wait(delay):
+                    return
+
+            # Back-pressure instead of dropping: replay must not lose rows
+            with self._space:
+                while len(self._rows) >= self.max_queue and not self._stop_event.is_set():
+                    self._space.wait(0.1)
+            self._rows.append((timestamp, values))
+            self.position += 1
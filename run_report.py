@@ -0,0 +1,226 @@
+import argparse
+import io
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+
+from alarms import RATE_WINDOW
+from recorder import FORMAT_BINARY, FORMAT_CSV, RECORDINGS_DIR, read_header
+
+log = logging.getLogger(__name__)
+
+# Summary file written into the scanned directory unless told otherwise
+REPORT_FILE_NAME = 'run_summary.csv'
+
+# Time above this temperature (°C) is reported per channel
+THRESHOLD = 100.0
+
+# A step between rows longer than this many nominal intervals counts as a dropout
+DROPOUT_FACTOR = 2.5
+
+# Runs handed to a worker process at a time
+CHUNK_RUNS = 16
+
+SOURCE_RECORDING = 'recording'  # Raw rows as written while acquiring (run_*.bin / run_*.csv)
+SOURCE_EXPORT = 'export'  # Batch averages saved with "SIMPAN DATA"
+
+COLUMNS = ('run', 'channel', 'source', 'start', 'rows', 'duration_s', 'mean', 'min', 'max', 'batches',
+           'batch_min', 'batch_max', 'last_batch', 'max_rise_c_per_min', 'max_fall_c_per_min', 'seconds_above',
+           'dropouts', 'dropout_s')
+
+
+def load_binary(path):
+    # (channel names, start time, times, values[row, channel]) of a binary recording in one read
+    names, start_time, offset = read_header(path)
+    width = len(names) + 1
+    data = np.fromfile(path, dtype='<f8', offset=offset)
+    data = data[:len(data) - len(data) % width].reshape(-1, width)  # Drop a torn last record
+    return names, start_time, data[:, 0], data[:, 1:]
+
+
+def load_csv(path):
+    # (channel names, None, times, values[row, channel], exported) of a CSV recording or export
+    with open(path, 'rb') as file:
+        text = file.read().replace(b'\r\n', b'\n')
+    header, _, body = text.partition(b'\n')
+    fields = header.decode('utf-8').split(',')
+    if fields[0] == 'timestamp':
+        exported = False
+        names = fields[1:]
+    elif fields[0] == 'Waktu (s)':
+        exported = True
+        names = [field.removesuffix(' (Celcius)') for field in fields[1:]]
+    else:
+        raise ValueError(f"{path} is neither a recording nor an exported run")
+    body = body[:body.rfind(b'\n') + 1]  # Drop a torn last line
+    if not body:
+        data = np.empty((0, len(names) + 1))
+    else:
+        # An export leaves a batch without readings empty where a recording writes nan
+        for _ in range(2):
+            body = body.replace(b',,', b',nan,')
+        body = body.replace(b',\n', b',nan\n')
+        data = np.loadtxt(io.StringIO(body.decode('ascii')), delimiter=',', ndmin=2)
+    return names, None, data[:, 0], data[:, 1:], exported
+
+
+def load_run(path):
+    # (channel names, start time or None, times, values[row, channel], source)
+    if path.endswith('.' + FORMAT_BINARY):
+        return (*load_binary(path), SOURCE_RECORDING)
+    names, start_time, times, values, exported = load_csv(path)
+    return names, start_time, times, values, SOURCE_EXPORT if exported else SOURCE_RECORDING
+
+
+def batch_means(values, batch_size):
+    # Mean of every batch_size rows, missing readings skipped: what BatchAverager gives as
+    # each batch closes, and so what "SIMPAN DATA" exports. NaN for a batch with no readings.
+    count = -(-len(values) // batch_size)
+    padded = np.full(count * batch_size, np.nan)
+    padded[:len(values)] = values
+    padded = padded.reshape(count, batch_size)
+    valid = ~np.isnan(padded)
+    totals = np.where(valid, padded, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        return totals / valid.sum(axis=1)
+
+
+def ramp_rates(times, values, window):
+    # dT/dt in °C per minute at every reading, measured as the rise/fall alarms do: from the
+    # oldest reading within `window` seconds, once the readings span at least half of it
+    valid = ~np.isnan(values)
+    times, values = times[valid], values[valid]
+    first = np.searchsorted(times, times - window, side='left')
+    span = times - times[first]
+    usable = span * 2 >= window
+    return (values[usable] - values[first[usable]]) * 60 / span[usable]
+
+
+def extremes(values):
+    # (mean, min, max) of the readings present
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return math.nan, math.nan, math.nan
+    return float(values.mean()), float(values.min()), float(values.max())
+
+
+def summarize_run(path, batch_size, threshold, window):
+    # One summary row per channel of the run at `path`
+    names, start_time, times, values, source = load_run(path)
+    if start_time is None and source == SOURCE_RECORDING and len(times):
+        start_time = datetime.fromtimestamp(times[0])  # CSV recordings start at their first row
+    steps = np.diff(times)
+    nominal = float(np.median(steps)) if len(steps) else 0.0
+    gaps = steps > DROPOUT_FACTOR * nominal
+    gap_seconds = float((steps[gaps] - nominal).sum())
+    # Each reading holds until the next one, but never across a gap
+    held = np.minimum(np.append(steps, nominal), nominal)
+    duration = float(times[-1] - times[0]) if len(times) else 0.0
+
+    rows = []
+    for channel, name in enumerate(names):
+        column = values[:, channel]
+        batches = column if source == SOURCE_EXPORT else batch_means(column, batch_size)
+        missing = np.isnan(column)
+        missing_runs = int(np.count_nonzero(missing[1:] & ~missing[:-1])) + int(missing[:1].sum())
+        rates = ramp_rates(times, column, window)
+        rows.append((path, name, source, f"{start_time:%Y-%m-%d %H:%M:%S}" if start_time else '', len(column),
+                     duration, *extremes(column), len(batches), *extremes(batches)[1:],
+                     float(batches[-1]) if len(batches) else math.nan,
+                     float(rates.max()) if len(rates) else math.nan, float(rates.min()) if len(rates) else math.nan,
+                     float(held[column > threshold].sum()), missing_runs + int(gaps.sum()),
+                     int(missing.sum()) * nominal + gap_seconds))
+    return rows
+
+
+def _summarize(path, batch_size, threshold, window):
+    # (rows, error) so one unreadable file does not end the whole report
+    try:
+        return summarize_run(path, batch_size, threshold, window), None
+    except (OSError, ValueError) as e:
+        return [], f"{path}: {e}"
+
+
+def find_runs(directory, exclude=()):
+    # Recorded and exported runs below `directory`, in path order
+    exclude = {os.path.abspath(path) for path in exclude}
+    runs = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(('.' + FORMAT_BINARY, '.' + FORMAT_CSV)) and os.path.abspath(path) not in exclude:
+                runs.append(path)
+    return sorted(runs)
+
+
+def summarize_runs(paths, batch_size, workers=1, threshold=THRESHOLD, window=RATE_WINDOW):
+    # Summary rows of all runs, in the order of `paths`; with workers > 1 the runs are parsed
+    # by that many processes, each returning only the few rows of its runs
+    summarize = partial(_summarize, batch_size=batch_size, threshold=threshold, window=window)
+    if workers <= 1:
+        results = map(summarize, paths)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(summarize, paths, chunksize=CHUNK_RUNS)
+    rows = []
+    try:
+        for summary, error in results:
+            if error:
+                log.warning(f"Run skipped: {error}")
+            rows.extend(summary)
+    finally:
+        if workers > 1:
+            executor.shutdown()
+    return rows
+
+
+def format_field(value):
+    if isinstance(value, float):
+        return "" if math.isnan(value) else f"{value:.3f}"
+    return str(value)
+
+
+def write_report(rows, out_path, directory=None):
+    # One line per run and channel; run paths relative to `directory`, missing numbers empty
+    with open(out_path, 'w') as file:
+        file.write(",".join(COLUMNS) + "\n")
+        for path, *fields in rows:
+            run = os.path.relpath(path, directory) if directory else path
+            file.write(",".join([run] + [format_field(value) for value in fields]) + "\n")
+    return len(rows)
+
+
+def main():
+    from acquisition_core import BATCH_VALUE
+
+    parser = argparse.ArgumentParser(description="Summarize every recorded or exported run in a directory into one CSV")
+    parser.add_argument('directory', nargs='?', default=RECORDINGS_DIR)
+    parser.add_argument('--out', help=f"summary file, default {REPORT_FILE_NAME} in the directory")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes parsing runs")
+    parser.add_argument('--batch', type=int, default=BATCH_VALUE,
+                        help="samples averaged into one batch of a recording, as when it is exported")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="report the time above this temperature")
+    parser.add_argument('--ramp-window', type=float, default=RATE_WINDOW, help="seconds ramp rates are measured over")
+    args = parser.parse_args()
+
+    out_path = args.out or os.path.join(args.directory, REPORT_FILE_NAME)
+    paths = find_runs(args.directory, exclude=[out_path, os.path.join(args.directory, REPORT_FILE_NAME)])
+    if not paths:
+        print(f"No runs in {args.directory}")
+        return 1
+    started = time.perf_counter()
+    rows = summarize_runs(paths, args.batch, args.workers, args.threshold, args.ramp_window)
+    write_report(rows, out_path, args.directory)
+    print(f"Summarized {len(paths)} runs ({len(rows)} channels) in {time.perf_counter() - started:.1f} s "
+          f"with {args.workers} workers into {out_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+import math
+from bisect import bisect_left, insort
+from collections import deque
+
+from protocol import OPEN_THERMOCOUPLE
+
+SMOOTHING_NONE = None
+SMOOTHING_EMA = 'ema'
+SMOOTHING_KALMAN = 'kalman'
+
+# Median absolute deviation to standard deviation, for normally distributed noise
+MAD_SCALE = 1.4826
+
+
+class HampelFilter:
+    # Streaming Hampel identifier: a reading is an outlier when it lies more than `threshold`
+    # scaled MADs from the median of the last `window` readings. The window is kept sorted,
+    # so each reading costs O(window) however long the run is. `min_spread` stops a window
+    # of identical quantised readings (MAD 0) from rejecting the next one-step change.
+
+    def __init__(self, window=7, threshold=3.0, min_spread=2.0):
+        self.window = window
+        self.threshold = threshold
+        self.min_spread = min_spread
+        self._recent = deque()
+        self._sorted = []
+
+    def is_outlier(self, value):
+        outlier = False
+        if len(self._recent) == self.window:
+            median = self._median(self._sorted)
+            mad = self._median(sorted(abs(item - median) for item in self._sorted))
+            spread = max(MAD_SCALE * mad, self.min_spread)
+            outlier = abs(value - median) > self.threshold * spread
+            self._sorted.pop(bisect_left(self._sorted, self._recent.popleft()))
+        # Outliers stay in the window too, so a real step is accepted once it persists
+        self._recent.append(value)
+        insort(self._sorted, value)
+        return outlier
+
+    def reset(self):
+        self._recent.clear()
+        self._sorted = []
+
+    @staticmethod
+    def _median(ordered):
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class EmaSmoother:
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+
+class KalmanSmoother:
+    # One-dimensional Kalman filter for a slowly drifting temperature:
+    # random-walk process noise `process_variance`, sensor noise `measurement_variance`
+    def __init__(self, process_variance=0.01, measurement_variance=0.25):
+        self.process_variance = process_variance
+        self.measurement_variance = measurement_variance
+        self.value = None
+        self.variance = 0.0
+
+    def update(self, value):
+        if self.value is None:
+            self.value = value
+            self.variance = self.measurement_variance
+            return self.value
+        self.variance += self.process_variance
+        gain = self.variance / (self.variance + self.measurement_variance)
+        self.value += gain * (value - self.value)
+        self.variance *= 1 - gain
+        return self.value
+
+    def reset(self):
+        self.value = None
+        self.variance = 0.0
+
+
+SMOOTHERS = {SMOOTHING_EMA: EmaSmoother, SMOOTHING_KALMAN: KalmanSmoother}
+
+
+class SampleFilter:
+    # Runs between the protocol and the averaging in each engine: drops open-thermocouple
+    # readings and outliers from the raw readings, and optionally smooths the samples.
+
+    def __init__(self, hampel_window=7, hampel_threshold=3.0, min_spread=2.0, smoothing=SMOOTHING_NONE):
+        self.hampel = HampelFilter(hampel_window, hampel_threshold, min_spread) if hampel_window else None
+        self.smoother = SMOOTHERS[smoothing]() if smoothing else None
+
+        self.accepted = 0
+        self.rejected_outliers = 0
+        self.open_readings = 0
+        self.invalid_readings = 0  # NaN or infinite values that got through parsing
+        self.open_thermocouple = False  # The last reading said the thermocouple is disconnected
+
+    def filter(self, readings):
+        # Valid readings out of one block of raw readings
+        accepted = []
+        for value in readings:
+            if value == OPEN_THERMOCOUPLE:
+                self.open_readings += 1
+                self.open_thermocouple = True
+                continue
+            self.open_thermocouple = False
+            if not math.isfinite(value):
+                self.invalid_readings += 1
+                continue
+            if self.hampel is not None and self.hampel.is_outlier(value):
+                self.rejected_outliers += 1
+                continue
+            accepted.append(value)
+        self.accepted += len(accepted)
+        return accepted
+
+    def smooth(self, value):
+        if self.smoother is None or math.isnan(value):
+            return value
+        return self.smoother.update(value)
+
+    def rejected(self):
+        return self.rejected_outliers + self.open_readings + self.invalid_readings
+
+    def summary(self):
+        return (f"{self.accepted} readings accepted, {self.rejected_outliers} outliers, "
+                f"{self.open_readings} open-thermocouple, {self.invalid_readings} invalid")
@@ -0,0 +1,131 @@
+import os
+import selectors
+import time
+from collections import deque
+
+
+class FrameReader:
+    # Buffered framing reader for the "*<value>#" protocol.
+    # Blocks on the port's file descriptor instead of polling in_waiting, reads every
+    # available byte in one call and splits frames out of a reusable bytearray.
+    # Every frame is stamped with time.monotonic_ns() of the read that completed it.
+
+    def __init__(self, serial_conn, chunk_size=4096):
+        self.serial_conn = serial_conn
+        self.chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._read_stamps = deque()  # (bytes_read after a read, monotonic ns of that read)
+        self.last_frame_ns = None  # Stamp of the frame read_frame returned last
+
+        # Counters for bytes/sec, frames/sec and CPU time per frame
+        self.bytes_read = 0
+        self.frames_read = 0
+        self.cpu_time = 0.0
+        self.started_at = time.monotonic()
+
+        self._fd = None
+        self._selector = None
+        self.attach(serial_conn)
+
+    def attach(self, serial_conn):
+        # Read from this connection from now on, e.g. the same logger reopened after it was
+        # unplugged; the counters carry on
+        self.close()
+        self.clear()
+        self.serial_conn = serial_conn
+        # pyserial exposes fileno() on POSIX; on other platforms fall back to blocking reads
+        try:
+            self._fd = serial_conn.fileno()
+        except (AttributeError, OSError, ValueError):
+            self._fd = None
+        if self._fd is not None:
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self._fd, selectors.EVENT_READ)
+
+    def read_frame(self, timeout=0.3):
+        # Return the payload of the next complete frame, or None on timeout
+        cpu_start = time.thread_time()
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                payload = self._next_frame()
+                if payload is not None:
+                    return payload
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._fill(remaining)
+        finally:
+            self.cpu_time += time.thread_time() - cpu_start
+
+    def clear(self):
+        # Forget any partial frame that is still buffered
+        del self._buffer[:]
+        self._read_stamps.clear()
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            'bytes_per_sec': self.bytes_read / elapsed,
+            'frames_per_sec': self.frames_read / elapsed,
+            'cpu_per_frame_us': (self.cpu_time / self.frames_read * 1e6) if self.frames_read else 0.0,
+        }
+
+    def _fill(self, timeout):
+        if self._selector is not None:
+            if not self._selector.select(timeout):
+                return 0
+            data = os.read(self._fd, self.chunk_size)
+            if not data:
+                # Readable but empty: the device went away (pyserial raises the same way)
+                raise ConnectionError("device reports readiness to read but returned no data (disconnected?)")
+        else:
+            # The port's own read timeout bounds this call, so there is no busy loop
+            data = self.serial_conn.read(max(1, self.serial_conn.in_waiting))
+        if data:
+            stamp = time.monotonic_ns()
+            self._buffer += data
+            self.bytes_read += len(data)
+            self._read_stamps.append((self.bytes_read, stamp))
+        return len(data)
+
+    def _stamp(self, frame_end):
+        # Stamp of the read that delivered byte `frame_end` (counted like bytes_read)
+        stamps = self._read_stamps
+        while len(stamps) > 1 and stamps[0][0] < frame_end:
+            stamps.popleft()
+        return stamps[0][1] if stamps else time.monotonic_ns()
+
+    def _next_frame(self):
+        buffer = self._buffer
+        buffer_start = self.bytes_read - len(buffer)
+        end = buffer.find(b'#')
+        while end >= 0:
+            # Resynchronise on the last '*' before the terminator so garbage is skipped
+            start = buffer.rfind(b'*', 0, end)
+            if start >= 0:
+                payload = bytes(buffer[start + 1:end])
+                self.last_frame_ns = self._stamp(buffer_start + end + 1)
+                del buffer[:end + 1]
+                self.frames_read += 1
+                return payload.decode('ascii', 'replace')
+            # Terminator without a start marker: drop it and look further
+            del buffer[:end + 1]
+            buffer_start += end + 1
+            end = buffer.find(b'#')
+
+        # Keep only the tail that can still become a frame
+        start = buffer.rfind(b'*')
+        if start < 0:
+            del buffer[:]
+        elif start > 0:
+            del buffer[:start]
+        # Stamps of reads that only carried discarded bytes are no longer needed
+        while self._read_stamps and self._read_stamps[0][0] <= self.bytes_read - len(buffer):
+            self._read_stamps.popleft()
+        return None
@@ -0,0 +1,434 @@
+import argparse
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from metrics import COUNTER, GAUGE
+from recorder import RECORDINGS_DIR, read_recording
+
+log = logging.getLogger(__name__)
+
+# Every live row of every run, in one indexed database next to the recordings
+SERIES_FILE_NAME = 'temperature_series.sqlite'
+SERIES_FILE = os.path.join(RECORDINGS_DIR, SERIES_FILE_NAME)
+
+# Rollup levels kept next to the raw samples: bucket lengths in seconds, coarsest first
+LEVELS = (3600, 60, 1)
+
+# Seconds of raw samples and 1 s rollups kept; the minute and hour rollups are kept for good.
+# SQLite reuses the pages freed by a prune, so the file stops growing once it holds this much.
+SAMPLE_RETENTION = 7 * 86400
+
+# Seconds between prunes by the SeriesStore thread
+PRUNE_INTERVAL = 3600
+
+# Channels are keyed by the logger (USB serial number, or port without one), not by their
+# display name: CH1 of one run may be another logger than CH1 of the next. `name` is the
+# display name the logger last had. Samples are (channel, unix time, value), clustered by
+# channel and time so a range of one channel is one index scan. Rollups hold count, sum,
+# sum of squares, min and max of every bucket of every level, keyed by the unix second the
+# bucket starts at. Missing (NaN) samples are not stored.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, name TEXT);
+CREATE TABLE IF NOT EXISTS samples (
+    channel INTEGER NOT NULL, time REAL NOT NULL, value REAL NOT NULL,
+    PRIMARY KEY (channel, time)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    level INTEGER NOT NULL, channel INTEGER NOT NULL, start INTEGER NOT NULL,
+    count INTEGER NOT NULL, total REAL NOT NULL, total_sq REAL NOT NULL, minimum REAL, maximum REAL,
+    PRIMARY KEY (level, channel, start)) WITHOUT ROWID;
+"""
+
+# Rebuild the 1 s buckets of [lo, hi) from the samples, and coarser buckets from the level below
+ROLLUP_SAMPLES = """
+INSERT OR REPLACE INTO rollups
+SELECT 1, channel, CAST(time AS INTEGER) AS bucket, count(*), sum(value), sum(value * value), min(value), max(value)
+FROM samples WHERE channel = ?1 AND time >= ?2 AND time < ?3 GROUP BY bucket
+"""
+ROLLUP_LEVEL = """
+INSERT OR REPLACE INTO rollups
+SELECT ?1, channel, start / ?1 * ?1 AS bucket, sum(count), sum(total), sum(total_sq), min(minimum), max(maximum)
+FROM rollups WHERE level = ?2 AND channel = ?3 AND start >= ?4 AND start < ?5 GROUP BY bucket
+"""
+
+
+def level_for(step):
+    # Coarsest rollup level whose buckets add up to buckets of `step` seconds, 0 for raw samples
+    for level in LEVELS:
+        if step >= level and step % level == 0:
+            return level
+    return 0
+
+
+def _stats(count, total, total_sq, minimum, maximum):
+    # (count, mean, min, max, standard deviation) from summed moments
+    if not count:
+        return 0, math.nan, math.nan, math.nan, math.nan
+    mean = total / count
+    std = math.sqrt(max(total_sq - total * mean, 0.0) / (count - 1)) if count > 1 else math.nan
+    return count, mean, minimum, maximum, std
+
+
+class SeriesDatabase:
+    # Raw samples of every channel plus 1 s / 1 min / 1 h rollups, in SQLite. The rollups are
+    # kept up to date as samples are inserted: each insert rebuilds only the buckets it
+    # touched, level by level, in the same transaction. Queries read the coarsest level that
+    # answers them exactly. One instance per thread; readers and the writer use separate
+    # instances on the same file (WAL), so queries never wait for the writer.
+
+    def __init__(self, path=SERIES_FILE, readonly=False):
+        self.path = path
+        if readonly:
+            self.connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        else:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.connection = sqlite3.connect(path)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')  # WAL stays consistent; a crash may lose the last commit
+            self.connection.executescript(SCHEMA)
+        self.connection.execute('PRAGMA cache_size=-65536')  # 64 MB
+        self._channel_ids = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def channel_id(self, key, name=None):
+        # Id of a logger's channel, added on first use and renamed when its display name changes
+        name = name or key
+        cached = self._channel_ids.get(key)
+        if cached is None or cached[1] != name:
+            self.connection.execute('INSERT INTO channels (key, name) VALUES (?, ?) '
+                                    'ON CONFLICT (key) DO UPDATE SET name = excluded.name', (key, name))
+            channel, = self.connection.execute('SELECT id FROM channels WHERE key = ?', (key,)).fetchone()
+            cached = self._channel_ids[key] = (channel, name)
+        return cached[0]
+
+    def find_channel(self, channel):
+        # Id of a channel by logger key, or by display name for the logger with the latest
+        # samples under that name (the one that has it now); None if unknown
+        found = self.connection.execute(
+            'SELECT id FROM channels WHERE key = ?1 OR name = ?1 '
+            'ORDER BY key = ?1 AND name IS NOT ?1 DESC, (SELECT MAX(time) FROM samples WHERE channel = channels.id) DESC '
+            'LIMIT 1', (channel,)).fetchone()
+        return None if found is None else found[0]
+
+    def channels(self):
+        # [(key, display name)] in the order they were added
+        return self.connection.execute('SELECT key, name FROM channels ORDER BY id').fetchall()
+
+    def insert(self, channel_keys, rows, channel_names=None):
+        # [(unix time, [value per channel])] in one transaction, rollups included. Channels are
+        # the loggers' keys; `channel_names` are their display names in this run, if different.
+        if not rows:
+            return 0
+        with self.connection:
+            channels = [self.channel_id(key, name) for key, name in zip(channel_keys, channel_names or channel_keys)]
+            samples = [(channel, timestamp, value) for timestamp, values in rows
+                       for channel, value in zip(channels, values) if not math.isnan(value)]
+            self.connection.executemany('INSERT OR REPLACE INTO samples VALUES (?, ?, ?)', samples)
+            first = min(timestamp for timestamp, _ in rows)
+            last = max(timestamp for timestamp, _ in rows)
+            for channel in channels:
+                self._refresh(channel, first, last)
+        return len(samples)
+
+    def _refresh(self, channel, first, last):
+        lo = math.floor(first)
+        hi = math.floor(last) + 1
+        self.connection.execute(ROLLUP_SAMPLES, (channel, lo, hi))
+        finer = 1
+        for level in reversed(LEVELS[:-1]):
+            lo = lo // level * level
+            hi = -(-hi // level) * level
+            self.connection.execute(ROLLUP_LEVEL, (level, finer, channel, lo, hi))
+            finer = level
+
+    def prune(self, before):
+        # Drop the raw samples and 1 s rollups older than unix time `before` (a whole minute, so
+        # no 1 s rollup outlives half of its samples); returns the number of samples dropped
+        before = math.floor(before / 60) * 60
+        dropped = 0
+        with self.connection:
+            for channel, in self.connection.execute('SELECT id FROM channels').fetchall():
+                # One index range per channel, like the queries
+                dropped += self.connection.execute('DELETE FROM samples WHERE channel = ? AND time < ?',
+                                                   (channel, before)).rowcount
+                self.connection.execute('DELETE FROM rollups WHERE level = 1 AND channel = ? AND start < ?',
+                                        (channel, before))
+        return dropped
+
+    def time_range(self, name):
+        # (first, last) unix time of a channel (key or display name), or None if it has no samples
+        channel = self.find_channel(name)
+        if channel is None:
+            return None
+        # Two queries: each is one step along the index, min() and max() together would scan it
+        first = self.connection.execute('SELECT min(time) FROM samples WHERE channel = ?', (channel,)).fetchone()[0]
+        last = self.connection.execute('SELECT max(time) FROM samples WHERE channel = ?', (channel,)).fetchone()[0]
+        return None if first is None else (first, last)
+
+    def series(self, name, start, end, step, level=None):
+        # [(bucket start, count, mean, min, max)] of one channel for every bucket of `step`
+        # seconds (aligned to multiples of `step`) that overlaps [start, end) and has samples.
+        # Read from the coarsest level that fits `step` unless `level` says otherwise (0: raw).
+        # Everything is computed by SQLite: at tens of thousands of buckets, Python-side
+        # arithmetic per bucket would cost as much as the query. Raw samples and 1 s buckets
+        # only go back SAMPLE_RETENTION seconds.
+        channel = self.find_channel(name)
+        if channel is None:
+            return []
+        level = level_for(step) if level is None else level
+        first = math.floor(start / step) * step
+        last = math.ceil(end / step) * step
+        if level == step:
+            cursor = self.connection.execute(
+                'SELECT start, count, total / count, minimum, maximum FROM rollups '
+                'WHERE level = ? AND channel = ? AND start >= ? AND start < ? ORDER BY start',
+                (level, channel, int(first), int(last)))
+        elif level:
+            cursor = self.connection.execute(
+                'SELECT start / ?1 * ?1 AS bucket, sum(count), sum(total) / sum(count), min(minimum), max(maximum) '
+                'FROM rollups WHERE level = ?2 AND channel = ?3 AND start >= ?4 AND start < ?5 '
+                'GROUP BY bucket ORDER BY bucket', (int(step), level, channel, int(first), int(last)))
+        else:
+            cursor = self.connection.execute(
+                'SELECT CAST(time / ?1 AS INTEGER) * ?1 AS bucket, count(*), avg(value), min(value), max(value) '
+                'FROM samples WHERE channel = ?2 AND time >= ?3 AND time < ?4 '
+                'GROUP BY CAST(time / ?1 AS INTEGER) ORDER BY bucket', (step, channel, first, last))
+        return cursor.fetchall()
+
+    def summary(self, name, start, end):
+        # (count, mean, min, max, std) of one channel over [start, end): whole hours from the
+        # hourly rollups, the edges from minutes, seconds and finally raw samples
+        channel = self.find_channel(name)
+        count = 0
+        total = total_sq = 0.0
+        minimum = maximum = math.nan
+        for level, lo, hi in self.pieces(start, end) if channel is not None else []:
+            if level:
+                moments = self.connection.execute(
+                    'SELECT sum(count), sum(total), sum(total_sq), min(minimum), max(maximum) FROM rollups '
+                    'WHERE level = ? AND channel = ? AND start >= ? AND start < ?', (level, channel, lo, hi)).fetchone()
+            else:
+                moments = self.connection.execute(
+                    'SELECT count(*), sum(value), sum(value * value), min(value), max(value) FROM samples '
+                    'WHERE channel = ? AND time >= ? AND time < ?', (channel, lo, hi)).fetchone()
+            if moments[0]:
+                count += moments[0]
+                total += moments[1]
+                total_sq += moments[2]
+                minimum = moments[3] if not minimum <= moments[3] else minimum  # Also replaces NaN
+                maximum = moments[4] if not maximum >= moments[4] else maximum
+        return _stats(count, total, total_sq, minimum, maximum)
+
+    @staticmethod
+    def pieces(start, end, levels=LEVELS):
+        # [(level, lo, hi)] covering [start, end) with as few buckets as possible: the whole
+        # buckets of the coarsest level in the middle, finer levels towards the edges, raw
+        # samples (level 0) for what is left of a second
+        if start >= end:
+            return []
+        if not levels:
+            return [(0, start, end)]
+        level = levels[0]
+        lo = math.ceil(start / level) * level
+        hi = math.floor(end / level) * level
+        if lo >= hi:
+            return SeriesDatabase.pieces(start, end, levels[1:])
+        return (SeriesDatabase.pieces(start, lo, levels[1:]) + [(level, lo, hi)] +
+                SeriesDatabase.pieces(hi, end, levels[1:]))
+
+
+class SeriesStore:
+    # Feeds live rows into a SeriesDatabase from a background thread, one transaction every
+    # commit_interval seconds, so the GUI thread only enqueues. The database outlives runs:
+    # set_channels says which loggers the columns of the rows recorded from then on are. The
+    # same thread prunes raw samples older than `retention` seconds every PRUNE_INTERVAL.
+
+    def __init__(self, path=SERIES_FILE, commit_interval=1.0, batch_rows=4096, retention=SAMPLE_RETENTION):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.batch_rows = batch_rows
+        self.retention = retention  # None keeps everything
+        self.channels = ((), ())  # (logger keys, display names) of the columns
+
+        self.rows_written = 0
+        self.samples_written = 0
+        self.commits = 0
+        self.commit_latency = None  # Histogram set by instrument, or None
+
+        self._rows = deque()  # (channel names, unix time, values); appends and pops are thread-safe
+        self._flush_requests = queue.Queue()
+        self._stop_event = threading.Event()
+        self._opened = threading.Event()
+        self._error = None
+        self._thread = None
+
+    def start(self, timeout=5.0):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._opened.clear()
+        self._thread = threading.Thread(target=self._run, name="SeriesStore", daemon=True)
+        self._thread.start()
+        self._opened.wait(timeout)
+        if self._error is not None:
+            self._thread = None
+            raise self._error
+        return self
+
+    def instrument(self, metrics):
+        self.commit_latency = metrics.histogram('series_commit_seconds', "Inserting one batch of rows and its rollups")
+        metrics.callback('series_queue_depth', GAUGE, "Rows waiting for the time-series store", self._rows.__len__)
+        metrics.callback('series_rows_total', COUNTER, "Rows written to the time-series store", lambda: self.rows_written)
+
+    def set_channels(self, channel_keys, channel_names=None):
+        self.channels = (tuple(channel_keys), tuple(channel_names or channel_keys))
+
+    def record(self, timestamp, values):
+        # Unix time and one value per channel; only enqueues
+        self._rows.append((self.channels, timestamp, values))
+
+    def flush(self, timeout=5.0):
+        # Block until everything recorded so far is committed
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._flush_requests.put(done)
+        done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        try:
+            database = SeriesDatabase(self.path)
+        except sqlite3.Error as e:
+            self._error = e
+            self._opened.set()
+            return
+        self._opened.set()
+        pending = []
+        next_prune = time.monotonic()
+        try:
+            while True:
+                stopping = self._stop_event.is_set()
+                flush_waiters = []
+                while not self._flush_requests.empty():
+                    flush_waiters.append(self._flush_requests.get_nowait())
+                if not (stopping or flush_waiters or len(self._rows) >= self.batch_rows):
+                    try:
+                        flush_waiters.append(self._flush_requests.get(timeout=self.commit_interval))
+                    except queue.Empty:
+                        pass
+
+                while self._rows:
+                    pending.append(self._rows.popleft())
+                try:
+                    self._commit(database, pending)
+                    pending = []
+                except sqlite3.Error as e:
+                    # Keep the rows and try again on the next pass (e.g. disk temporarily full)
+                    log.error(f"Time-series store error on {self.path}: {e}")
+
+                if self.retention is not None and time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + PRUNE_INTERVAL
+                    try:
+                        dropped = database.prune(time.time() - self.retention)
+                    except sqlite3.Error as e:
+                        log.error(f"Time-series store error pruning {self.path}: {e}")
+                    else:
+                        if dropped:
+                            log.info(f"Pruned {dropped} samples older than {self.retention / 86400:g} days from {self.path}")
+
+                for done in flush_waiters:
+                    done.set()
+                if stopping and not self._rows and not pending:
+                    return
+        finally:
+            database.close()
+
+    def _commit(self, database, pending):
+        if not pending:
+            return
+        commit_start = time.perf_counter_ns()
+        # Consecutive rows of the same channel set go in together
+        start = 0
+        for index in range(1, len(pending) + 1):
+            if index == len(pending) or pending[index][0] is not pending[start][0]:
+                keys, names = pending[start][0]
+                self.samples_written += database.insert(keys, [(timestamp, values) for _, timestamp, values
+                                                               in pending[start:index]], names)
+                start = index
+        self.rows_written += len(pending)
+        self.commits += 1
+        if self.commit_latency is not None:
+            self.commit_latency.observe(time.perf_counter_ns() - commit_start)
+
+
+def import_recording(database, path, chunk_rows=3600):
+    # Add a recorded run (binary or CSV) to the database; returns the number of rows. A
+    # recording does not say which logger its channels were, so they are keyed by file.
+    names, _, rows = read_recording(path)
+    keys = [f"{os.path.basename(path)}:{name}" for name in names]
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            database.insert(keys, chunk, names)
+            count += len(chunk)
+            chunk = []
+    database.insert(keys, chunk, names)
+    return count + len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import recordings into the time-series store and query it")
+    parser.add_argument('--database', default=SERIES_FILE)
+    parser.add_argument('--import', dest='imports', nargs='+', default=[], metavar='RECORDING',
+                        help="add these recordings")
+    parser.add_argument('--channel', help="channel to query: a logger's serial number or port, or a name like CH1 "
+                                            "for the logger that last had it")
+    parser.add_argument('--days', type=float, default=1.0, help="query the last this many days")
+    parser.add_argument('--step', type=float, default=60.0, help="seconds per row of the query")
+    args = parser.parse_args()
+
+    if args.imports:
+        with SeriesDatabase(args.database) as database:
+            for path in args.imports:
+                print(f"{path}: {import_recording(database, path)} rows")
+    if not args.channel:
+        return 0
+    with SeriesDatabase(args.database, readonly=True) as database:
+        span = database.time_range(args.channel)
+        if span is None:
+            print(f"No samples of {args.channel}")
+            return 1
+        end = span[1] + 1
+        start = end - args.days * 86400
+        for bucket, count, mean, minimum, maximum in database.series(args.channel, start, end, args.step):
+            print(f"{datetime.fromtimestamp(bucket):%Y-%m-%d %H:%M:%S} n={count} "
+                  f"mean {mean:.2f} min {minimum:.2f} max {maximum:.2f}")
+        count, mean, minimum, maximum, std = database.summary(args.channel, start, end)
+        print(f"{args.channel}: {count} samples, mean {mean:.2f}, min {minimum:.2f}, max {maximum:.2f}, std {std:.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,121 @@
+import math
+import random
+import unittest
+from bisect import bisect_left, bisect_right
+
+from lod_pyramid import MinMaxPyramid
+
+
+def same(a, b):
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+
+def brute_envelope(xs, ys, lo, hi):
+    # (x at min, min, x at max, max) of points lo..hi-1, first occurrence wins, NaN skipped
+    valid = [(y, x) for x, y in zip(xs[lo:hi], ys[lo:hi]) if not math.isnan(y)]
+    if not valid:
+        return math.nan, math.nan, math.nan, math.nan
+    y_min, x_min = min(valid, key=lambda pair: pair[0])
+    y_max, x_max = max(valid, key=lambda pair: pair[0])
+    return x_min, y_min, x_max, y_max
+
+
+class MinMaxPyramidTest(unittest.TestCase):
+    # Every bucket and every window query checked against a brute-force min/max of the raw points
+
+    def build(self, count=5000, fanout=4, seed=1):
+        rng = random.Random(seed)
+        pyramid = MinMaxPyramid(fanout)
+        xs, ys = [], []
+        for i in range(count):
+            gap = 4 * fanout ** 2 <= i < 5 * fanout ** 2
+            if gap:
+                value = math.nan  # A whole level-2 bucket missing: the logger was unplugged
+            elif rng.random() < 0.02:
+                value = math.nan
+            else:
+                value = rng.gauss(25, 3)
+            pyramid.set_point(i, float(i), value)
+            if not gap and rng.random() < 0.3:
+                value = rng.gauss(25, 3)  # The open batch point gets revised, as in the GUI
+                pyramid.set_point(i, float(i), value)
+            xs.append(float(i))
+            ys.append(value)
+        return pyramid, xs, ys
+
+    def assert_buckets(self, pyramid, xs, ys):
+        self.assertEqual(list(pyramid.x), xs)
+        self.assertTrue(all(same(a, b) for a, b in zip(pyramid.y, ys)))
+        for level, (first, last, x_min, y_min, x_max, y_max) in enumerate(pyramid.levels, 1):
+            size = pyramid.fanout ** level
+            self.assertEqual(len(first), math.ceil(len(xs) / size))
+            for bucket in range(len(first)):
+                lo, hi = bucket * size, min((bucket + 1) * size, len(xs))
+                self.assertEqual((first[bucket], last[bucket]), (xs[lo], xs[hi - 1]))
+                got = (x_min[bucket], y_min[bucket], x_max[bucket], y_max[bucket])
+                expected = brute_envelope(xs, ys, lo, hi)
+                self.assertTrue(all(map(same, got, expected)), (level, bucket, got, expected))
+
+    def test_buckets_match_brute_force(self):
+        for fanout in (2, 4, 7):
+            pyramid, xs, ys = self.build(fanout=fanout)
+            self.assert_buckets(pyramid, xs, ys)
+
+    def test_nan_gap_gives_empty_buckets(self):
+        pyramid, xs, ys = self.build()
+        _, _, _, y_min, _, y_max = pyramid.levels[1]
+        self.assertTrue(math.isnan(y_min[4]) and math.isnan(y_max[4]))
+        self.assertFalse(math.isnan(y_min[3]) or math.isnan(y_min[5]))
+        # The envelope of a window over the gap has NaN points there, so the line breaks
+        _, ys_drawn, level = pyramid.query(0.0, 200.0, 30)
+        self.assertEqual(level, 2)
+        self.assertTrue(any(math.isnan(y) for y in ys_drawn))
+
+    def test_revising_the_last_point_updates_every_level(self):
+        pyramid, xs, ys = self.build(count=4 ** 5)
+        for value in (1000.0, -1000.0, math.nan, 25.0):
+            pyramid.replace_last(xs[-1], value)
+            ys[-1] = value
+            self.assert_buckets(pyramid, xs, ys)
+
+    def test_window_query_at_each_level(self):
+        pyramid, xs, ys = self.build()
+        for x0, x1 in ((0.0, xs[-1]), (123.5, 3210.0), (70.0, 90.0)):
+            start, stop = pyramid._raw_range(x0, x1)
+            raw_count = stop - start
+            for level in range(len(pyramid.levels) + 1):
+                max_points = raw_count if level == 0 else 2 * math.ceil(raw_count / pyramid.fanout ** level)
+                if level and max_points >= 2 * math.ceil(raw_count / pyramid.fanout ** (level - 1)):
+                    continue  # The window is too short for this level to be coarser than the one below
+                got_xs, got_ys, got_level = pyramid.query(x0, x1, max_points)
+                self.assertEqual(got_level, level)
+                if level == 0:
+                    self.assertEqual(got_xs, xs[start:stop])
+                    self.assertTrue(got_xs[0] <= x0 or start == 0)
+                    self.assertTrue(got_xs[-1] >= x1 or stop == len(xs))
+                    continue
+                # Every bucket touching the window plus one either side, min and max in time order
+                size = pyramid.fanout ** level
+                firsts = xs[::size]
+                lasts = [xs[min(first + size, len(xs)) - 1] for first in range(0, len(xs), size)]
+                buckets = range(max(bisect_left(lasts, x0) - 1, 0), min(bisect_right(firsts, x1) + 1, len(firsts)))
+                expected_xs, expected_ys = [], []
+                for bucket in buckets:
+                    x_min, y_min, x_max, y_max = brute_envelope(xs, ys, bucket * size, (bucket + 1) * size)
+                    pairs = [(x_min, y_min), (x_max, y_max)]
+                    if x_max < x_min:
+                        pairs.reverse()
+                    expected_xs.extend(x for x, _ in pairs)
+                    expected_ys.extend(y for _, y in pairs)
+                self.assertTrue(all(map(same, got_xs, expected_xs)) and len(got_xs) == len(expected_xs), level)
+                self.assertTrue(all(map(same, got_ys, expected_ys)), level)
+                self.assertLessEqual(len(got_xs), max(max_points, 2 * len(buckets)))
+
+    def test_only_the_last_point_can_be_replaced(self):
+        pyramid, xs, _ = self.build(count=10)
+        with self.assertRaises(IndexError):
+            pyramid.set_point(3, 3.0, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
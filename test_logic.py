@@ -5,6 +5,7 @@ from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from datetime import datetime
 import random
+from batch_stats import BatchAverager
 
 class TemperaturePlotter(QMainWindow):
     def __init__(self):
@@ -12,7 +13,7 @@ class TemperaturePlotter(QMainWindow):
         self.setWindowTitle('Temperature Data Viewer')
         self.setGeometry(100, 100, 800, 600)
 
-        self.temperature_data = []  # Store raw temperature data
+        self.batches = BatchAverager(100)  # Running average of the current batch
         self.plot_data = []  # Store data points for plotting
         self.start_time = datetime.now()  # Record start time
 
@@ -64,29 +65,21 @@ class TemperaturePlotter(QMainWindow):
         # calibrated_temp = 0.3015250701388389 * average_temperature - 21.798755485216873
         calibrated_temp = average_temperature
 
-        # Add calibrated temperature to the list
-        self.temperature_data.append(calibrated_temp)
-
         # Display the temperature with 2 decimal places
         self.temp_display.setText(f"{calibrated_temp:.2f} °C")
 
         # Determine current time in seconds since start
         elapsed_time = (datetime.now() - self.start_time).total_seconds()
 
-        # Calculate the index for the current batch (0 for the first 100, 1 for the next 100, etc.)
-        batch_index = len(self.temperature_data) // 100
-
-        # Calculate running average for the current batch
-        current_batch_start = batch_index * 100
-        current_batch_data = self.temperature_data[current_batch_start:]
-        if len(current_batch_data) > 0:  # Ensure we have data to avoid division by zero
-            running_avg_temp = sum(current_batch_data) / len(current_batch_data)
+        # Update the running statistics of the current batch of 100 in O(1)
+        batch_index, batch_stats = self.batches.add([calibrated_temp])
+        running_avg_temp = batch_stats[0].mean
 
-            # Ensure there's a plot data point for each batch, including the current incomplete one
-            if len(self.plot_data) <= batch_index:
-                self.plot_data.append((elapsed_time, running_avg_temp))
-            else:
-                self.plot_data[batch_index] = (elapsed_time, running_avg_temp)
+        # Ensure there's a plot data point for each batch, including the current incomplete one
+        if len(self.plot_data) <= batch_index:
+            self.plot_data.append((elapsed_time, running_avg_temp))
+        else:
+            self.plot_data[batch_index] = (elapsed_time, running_avg_temp)
 
         # Update the plot with the latest data
         self.update_plot()
@@ -111,7 +104,7 @@ class TemperaturePlotter(QMainWindow):
 
     def simulate_new_data(self):
         # Determine the batch we're currently generating data for
-        self.batch_number = len(self.temperature_data) // 100
+        self.batch_number = self.batches.sample_count // 100
 
         # Cycle through different mean values for each batch by changing the range of generated temperatures
         if self.batch_number % 4 == 0:
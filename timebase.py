@@ -0,0 +1,105 @@
+import math
+import time
+from collections import deque
+from datetime import datetime
+
+NS_PER_SECOND = 1_000_000_000
+
+# The firmware's millis() is an unsigned 32-bit counter and wraps after about 49.7 days
+DEVICE_CLOCK_WRAP = 2 ** 32
+
+
+class Timebase:
+    # Samples are stamped with time.monotonic_ns(); this maps those stamps to wall-clock time
+    # through one (wall, monotonic) pair read together at the start of a run. A wall-clock
+    # step during the run (NTP, DST, someone setting the clock) therefore moves no sample.
+
+    def __init__(self, wall_ns=None, monotonic_ns=None):
+        if wall_ns is None:
+            # Bracket the wall-clock read so the pair is off by at most half the bracket
+            before = time.monotonic_ns()
+            wall_ns = time.time_ns()
+            monotonic_ns = (before + time.monotonic_ns()) // 2
+        self.wall_ns = wall_ns
+        self.monotonic_ns = monotonic_ns if monotonic_ns is not None else 0
+
+    @classmethod
+    def from_wall(cls, wall_time):
+        # Time base of a recorded run: its monotonic stamps count from 0 at `wall_time` (datetime)
+        return cls(round(wall_time.timestamp() * NS_PER_SECOND), 0)
+
+    def wall_time(self, stamp_ns):
+        # Unix seconds of a monotonic stamp
+        return (self.wall_ns + stamp_ns - self.monotonic_ns) / NS_PER_SECOND
+
+    def wall_datetime(self, stamp_ns):
+        return datetime.fromtimestamp(self.wall_time(stamp_ns))
+
+    def stamp(self, wall_time):
+        # Monotonic stamp of unix seconds `wall_time`, the inverse of wall_time()
+        return self.monotonic_ns + round(wall_time * NS_PER_SECOND) - self.wall_ns
+
+
+class ClockDrift:
+    # Host-vs-device clock drift of one logger, from "*T#" probes answered with the device's
+    # millis(). Each probe pairs the host's monotonic time at sending with the device time:
+    # the firmware reads millis() as soon as the fixed-length request is in, whereas the answer
+    # gets longer as millis() grows. A least-squares line through the probes gives the rate of
+    # the device clock against the host's (ppm) and the scatter around it. Probes whose round
+    # trip was slow (the host or the link stalled) are left out of the fit.
+
+    def __init__(self, max_probes=360, min_span=1.0):
+        self.max_probes = max_probes
+        self.min_span = min_span  # Seconds of probes needed before a rate is reported
+        self.probes = deque(maxlen=max_probes)  # (host ns at sending, device ms unwrapped, round trip ns)
+        self.restarts = 0  # Times the device clock started over: the logger was reset or reopened
+
+        self._last_device_ms = None
+        self._wraps = 0
+
+    def add(self, sent_ns, received_ns, device_ms):
+        if self._last_device_ms is not None:
+            if device_ms < self._last_device_ms - DEVICE_CLOCK_WRAP // 2:
+                self._wraps += 1
+            elif device_ms < self._last_device_ms:
+                self.restart()
+        self._last_device_ms = device_ms
+        self.probes.append((sent_ns, device_ms + self._wraps * DEVICE_CLOCK_WRAP, received_ns - sent_ns))
+
+    def restart(self):
+        # The logger was reset (or may have been, e.g. reopened after a cable blip): its clock
+        # starts from zero and the old probes say nothing about it
+        self.probes.clear()
+        self._last_device_ms = None
+        self._wraps = 0
+        self.restarts += 1
+
+    def estimate(self):
+        # (drift in ppm, positive when the device clock runs fast; scatter in ms; probes used),
+        # or None while there are too few probes
+        if not self.probes:
+            return None
+        fastest = min(rtt for _, _, rtt in self.probes)
+        limit = fastest + max(fastest, 2_000_000)
+        probes = [(host, device) for host, device, rtt in self.probes if rtt <= limit]
+        count = len(probes)
+        if count < 3:
+            return None
+        host0, device0 = probes[0]
+        xs = [(host - host0) / NS_PER_SECOND for host, _ in probes]
+        ys = [(device - device0) / 1000 for _, device in probes]
+        mean_x = sum(xs) / count
+        mean_y = sum(ys) / count
+        s_xx = sum((x - mean_x) ** 2 for x in xs)
+        if xs[-1] - xs[0] < self.min_span or s_xx <= 0:
+            return None
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / s_xx
+        residual = sum((y - mean_y - slope * (x - mean_x)) ** 2 for x, y in zip(xs, ys))
+        return (slope - 1) * 1e6, math.sqrt(residual / max(count - 2, 1)) * 1000, count
+
+    def summary(self):
+        estimate = self.estimate()
+        if estimate is None:
+            return f"device clock: {len(self.probes)} probes, no estimate yet"
+        ppm, scatter, count = estimate
+        return f"device clock {ppm:+.0f} ppm vs host (scatter {scatter:.1f} ms, {count} probes)"